@@ -1,50 +1,80 @@
-import json
-
-BLOCKED_ROADS_FILE = "blocked_roads.json"
-
-def load_blocked_roads():
-    """Load blocked roads from a JSON file."""
-    try:
-        with open(BLOCKED_ROADS_FILE, "r") as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {}
-
-def save_blocked_roads(blocked_roads):
-    """Save blocked roads to a JSON file."""
-    with open(BLOCKED_ROADS_FILE, "w") as file:
-        json.dump(blocked_roads, file, indent=4)
-
-def add_blocked_road(source, destination, blocked_road):
-    """Block a specific road between two locations."""
-    blocked_roads = load_blocked_roads()
-    
-    route_key = f"{source.lower()}_{destination.lower()}"
-    
-    if route_key not in blocked_roads:
-        blocked_roads[route_key] = []
-
-    blocked_roads[route_key].append(blocked_road.lower())  # Store in lowercase
-
-    save_blocked_roads(blocked_roads)
-    print(f"Road '{blocked_road}' is now BLOCKED between {source} and {destination}.")
+from traffic_core.blocked_roads_store import get_store, route_key as make_route_key
+from datetime import datetime, timezone
+from traffic_core.spatial_index import DEFAULT_BUFFER_M, block_window, parse_path, parse_time, road_name
+from traffic_core.traffic_history import get_history
+
+def add_blocked_road(source, destination, blocked_road, path=None, buffer_m=DEFAULT_BUFFER_M,
+                     starts_at=None, ends_at=None):
+    """Block a specific road between two locations, optionally with its [lat, lng] path and a schedule."""
+    route_key = make_route_key(source, destination)
+
+    if get_store().block(route_key, blocked_road.lower(), path, buffer_m, starts_at, ends_at):  # Store in lowercase
+        print(f"Road '{blocked_road}' is now BLOCKED between {source} and {destination}.")
+    else:
+        print(f" Road '{blocked_road}' is already blocked on this route.")
 
 def remove_blocked_road(source, destination, blocked_road):
     """Unblock a road between two locations."""
-    blocked_roads = load_blocked_roads()
-    route_key = f"{source.lower()}_{destination.lower()}"
-
-    if route_key in blocked_roads and blocked_road.lower() in blocked_roads[route_key]:
-        blocked_roads[route_key].remove(blocked_road.lower())
+    route_key = make_route_key(source, destination)
 
-        if not blocked_roads[route_key]:  
-            del blocked_roads[route_key]  
-
-        save_blocked_roads(blocked_roads)
+    if get_store().unblock(route_key, blocked_road):
         print(f"Road '{blocked_road}' is now UNBLOCKED between {source} and {destination}.")
     else:
         print(f" Road '{blocked_road}' is NOT blocked on this route.")
 
+def schedule_text(entry):
+    """Human-readable schedule of a blocked road entry ("" if it is always on)."""
+    def fmt(t):
+        return datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+    starts_at, ends_at = block_window(entry)
+    if starts_at is None and ends_at is None:
+        return ""
+    if ends_at is None:
+        return f"from {fmt(starts_at)} UTC"
+    if starts_at is None:
+        return f"until {fmt(ends_at)} UTC"
+    return f"{fmt(starts_at)} – {fmt(ends_at)} UTC"
+
+def apply_admin_form(form):
+    """Apply a block/unblock form from the web admin panel; returns the message to show."""
+    action = form.get('action')
+    source = form.get('source', '').strip()
+    destination = form.get('destination', '').strip()
+    road = form.get('road', '').strip()
+    path_text = form.get('path', '').strip()
+
+    store = get_store()
+    route_key = make_route_key(source, destination)
+
+    if action == 'block':
+        try:
+            path = parse_path(path_text) if path_text else None
+            buffer_m = float(form.get('buffer_m') or DEFAULT_BUFFER_M)
+        except ValueError as e:
+            return f"Invalid coordinates: {e}"
+        try:
+            starts_at = parse_time(form.get('starts_at', '').strip())
+            ends_at = parse_time(form.get('ends_at', '').strip())
+            added = store.block(route_key, road, path, buffer_m, starts_at, ends_at)
+        except ValueError as e:
+            return f"Invalid schedule: {e}"
+        if added:
+            return f"Road '{road}' blocked between {source} and {destination}"
+        return f"Road '{road}' is already blocked on this route"
+
+    if action == 'unblock':
+        if store.unblock(route_key, road):
+            return f"Road '{road}' unblocked between {source} and {destination}"
+        return f"Road '{road}' is not blocked on this route"
+
+    return f"Unknown action '{action}'"
+
+def congestion_trends():
+    """Per-corridor travel-time trends for the admin panel ([] when history is off)."""
+    history = get_history()
+    return history.trends() if history is not None else []
+
 def admin_interface():
     """Admin panel to block or unblock roads."""
     while True:
@@ -60,7 +90,19 @@ def admin_interface():
             source = input("Enter Source Location: ")
             destination = input("Enter Destination Location: ")
             blocked_road = input("Enter the road to block: ")
-            add_blocked_road(source, destination, blocked_road)
+            path_text = input("Enter road coordinates 'lat,lng; lat,lng' (optional): ").strip()
+            try:
+                path = parse_path(path_text) if path_text else None
+            except ValueError as e:
+                print(f" Invalid coordinates: {e}")
+                continue
+            try:
+                starts_at = parse_time(input("Blocked from, UTC 'YYYY-MM-DD HH:MM' (optional): ").strip())
+                ends_at = parse_time(input("Blocked until, UTC 'YYYY-MM-DD HH:MM' (optional): ").strip())
+                add_blocked_road(source, destination, blocked_road, path, starts_at=starts_at, ends_at=ends_at)
+            except ValueError as e:
+                print(f" Invalid schedule: {e}")
+                continue
 
         elif choice == "2":
             source = input("Enter Source Location: ")
@@ -69,12 +111,13 @@ def admin_interface():
             remove_blocked_road(source, destination, blocked_road)
 
         elif choice == "3":
-            blocked_roads = load_blocked_roads()
+            blocked_roads = get_store().load()
             if blocked_roads:
                 print("\n BLOCKED ROADS LIST:")
                 for route, roads in blocked_roads.items():
                     src, dest = route.split("_")
-                    print(f" {src.capitalize()} → {dest.capitalize()}: {', '.join(roads)}")
+                    names = [f"{road_name(r)} ({schedule_text(r)})" if schedule_text(r) else road_name(r) for r in roads]
+                    print(f" {src.capitalize()} → {dest.capitalize()}: {', '.join(names)}")
             else:
                 print(" No roads are currently blocked.")
 
@@ -1,48 +1,54 @@
 from flask import Flask, render_template, request, jsonify
-import os
+import io
 import json
-import polyline
-import folium
-from datetime import datetime, timedelta
-import requests
-from flask import Flask, render_template, Response
-from vehicle_parking.parking_detector import ParkingDetector
-import cv2
+import os
+import time
+from flask import Flask, render_template, Response, g, stream_with_context
+from vehicle_parking import get_pipeline  # OpenCV loads on the first parking request
+from traffic_core import config, instrumentation
+from traffic_core.route_planner import FETCH_FAILED, INVALID_DEPARTURE, parse_departure, plan_route
+from traffic_core.rendering import render_folium, route_feature_collection
+from traffic_core.blocked_roads_store import get_store
+from traffic_core.block_feed import get_feed
+from admin import apply_admin_form, congestion_trends, schedule_text
+from traffic_core.batch_routing import FORMATS, MODES, read_pairs, run_batch
+from traffic_core.warmer import get_warmer
 
 app = Flask(__name__)
+app.add_template_filter(schedule_text)
+
+if config.WARMER_ENABLED:
+    get_warmer().start()
 
-#
-# Configuration
-API_KEY = "Add yours"
-BLOCKED_ROADS_FILE = "blocked_roads.json"
 from flask import send_from_directory
 
+@app.before_request
+def start_request_timing():
+    g.request_start = time.perf_counter()
+    g.profiler = instrumentation.start_profile(request.headers)
+
+@app.after_request
+def finish_request_timing(response):
+    view = request.endpoint or 'unknown'
+    instrumentation.observe('http_request_seconds', time.perf_counter() - g.request_start, view=view)
+    instrumentation.count('http_requests_total', view=view, status=response.status_code)
+    if g.profiler is not None:
+        response.headers['X-Profile-File'] = instrumentation.finish_profile(g.profiler, request.path)
+        g.profiler = None
+    return response
+
+@app.teardown_request
+def stop_profiler(error):
+    # A view that raised never reached after_request
+    if g.get('profiler') is not None:
+        instrumentation.finish_profile(g.profiler, request.path)
+        g.profiler = None
+
 @app.route('/favicon.ico')
 def favicon():
     return send_from_directory(os.path.join(app.root_path, 'static'),
                              'favicon.ico', mimetype='image/vnd.microsoft.icon')
 
-# Helper functions (from your existing code)
-def load_blocked_roads():
-    try:
-        with open(BLOCKED_ROADS_FILE, "r") as file:
-            return json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
-
-def save_blocked_roads(blocked_roads):
-    with open(BLOCKED_ROADS_FILE, "w") as file:
-        json.dump(blocked_roads, file, indent=4)
-
-def get_coordinates(location_name):
-    geo_url = f"https://maps.googleapis.com/maps/api/geocode/json?address={location_name}&key={API_KEY}"
-    response = requests.get(geo_url)
-    geo_data = response.json()
-    
-    if geo_data['status'] == "OK":
-        return geo_data['results'][0]['geometry']['location']['lat'], geo_data['results'][0]['geometry']['location']['lng']
-    return None, None
-
 # Routes
 @app.route('/')
 def home():
@@ -55,126 +61,140 @@ def map_route():
     
     if not source or not destination:
         return render_template('error.html', message="Please provide both source and destination")
-    
-    src_lat, src_lng = get_coordinates(source)
-    dest_lat, dest_lng = get_coordinates(destination)
-
-    if src_lat is None or dest_lat is None:
-        return render_template('error.html', message="Invalid source or destination location")
-
-    # Get routes from Google Maps API
-    url = "https://routes.googleapis.com/directions/v2:computeRoutes"
-    headers = {
-        "Content-Type": "application/json",
-        "X-Goog-Api-Key": API_KEY,
-        "X-Goog-FieldMask": "routes.duration,routes.distanceMeters,routes.polyline.encodedPolyline"
-    }
-    payload = {
-        "origin": {"location": {"latLng": {"latitude": src_lat, "longitude": src_lng}}},
-        "destination": {"location": {"latLng": {"latitude": dest_lat, "longitude": dest_lng}}},
-        "travelMode": "DRIVE",
-        "routingPreference": "TRAFFIC_AWARE",
-        "departureTime": (datetime.utcnow() + timedelta(minutes=5)).isoformat() + "Z",
-        "computeAlternativeRoutes": True
-    }
-
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
-    
-    if response.status_code != 200:
-        return render_template('error.html', message="Failed to fetch route data from Google Maps")
-
-    data = response.json()
-    routes = data.get("routes", [])
 
-    if not routes:
-        return render_template('error.html', message="No routes found for the given locations")
-
-    # Create map
-    route_map = folium.Map(location=[src_lat, src_lng], zoom_start=10)
-    
-    # Process routes and blocked roads
-    blocked_roads = load_blocked_roads()
-    route_key = f"{source.lower()}_{destination.lower()}"
-    blocked_segments = blocked_roads.get(route_key, [])
-    
-    # Add routes to map
-    for index, route in enumerate(routes):
-        encoded_polyline = route['polyline']['encodedPolyline']
-        decoded_coordinates = polyline.decode(encoded_polyline)
-        
-        # Check if this route has blocked segments
-        has_blocked = any(segment in str(decoded_coordinates) for segment in blocked_segments)
-        
-        # Style based on blocked status
-        color = "red" if has_blocked else "blue" if index == 0 else "gray"
-        weight = 8 if has_blocked else 6 if index == 0 else 4
-        
-        folium.PolyLine(
-            decoded_coordinates,
-            color=color,
-            weight=weight,
-            opacity=0.8 if index == 0 else 0.5,
-            tooltip="Blocked Route" if has_blocked else f"Route {index + 1}"
-        ).add_to(route_map)
-
-    # Add markers
-    folium.Marker(
-        [src_lat, src_lng],
-        popup=f"<b>Start: {source}</b>",
-        icon=folium.Icon(color="green", icon="play")
-    ).add_to(route_map)
-
-    folium.Marker(
-        [dest_lat, dest_lng],
-        popup=f"<b>End: {destination}</b>",
-        icon=folium.Icon(color="red", icon="stop")
-    ).add_to(route_map)
-
-    # Save map to HTML string
-    map_html = route_map._repr_html_()
-    
+    try:
+        departure_time = parse_departure(request.args.get('departure'))
+    except ValueError:
+        return render_template('error.html', message=INVALID_DEPARTURE)
+    departure = departure_time.isoformat() + 'Z' if departure_time else ''
+
+    renderer = request.args.get('render', config.MAP_RENDERER)
+    if renderer != 'folium':
+        # The page is a static shell; the browser fetches /api/route and draws the GeoJSON
+        return render_template('map.html', source=source, destination=destination, departure=departure)
+
+    plan, error = plan_route(source, destination, departure_time=departure_time)
+    if error:
+        return render_template('error.html', message=error)
+
+    with instrumentation.span('render_folium'):
+        map_html = render_folium(plan)
     return render_template('map.html', 
                          map_html=map_html,
                          source=source,
                          destination=destination,
-                         blocked_roads=blocked_segments)
+                         departure=departure,
+                         blocked_roads=plan.blocked_roads,
+                         recommended=plan.chosen.explanation)
+
+@app.route('/api/route')
+def api_route():
+    source = request.args.get('source', '').strip()
+    destination = request.args.get('destination', '').strip()
+    
+    if not source or not destination:
+        return jsonify({"error": "Please provide both source and destination"}), 400
+
+    # Unparseable values fall back to None: fit the routes / use the zoom's level
+    zoom = request.args.get('zoom', type=int)
+    tolerance_m = request.args.get('tolerance', type=float)
+    try:
+        departure_time = parse_departure(request.args.get('departure'))
+    except ValueError:
+        return jsonify({"error": INVALID_DEPARTURE}), 400
+
+    # Popular corridors at the fitted zoom, leaving now, were planned and rendered by the warmer
+    body = None
+    if config.WARMER_ENABLED and zoom is None and tolerance_m is None and departure_time is None:
+        body = get_warmer().geojson(source, destination)
+    if body is not None:
+        response = app.response_class(body, mimetype='application/json')
+    else:
+        plan, error = plan_route(source, destination, departure_time=departure_time)
+        if error:
+            return jsonify({"error": error}), 502 if error == FETCH_FAILED else 404
+
+        with instrumentation.span('render_geojson'):
+            response = jsonify(route_feature_collection(plan, zoom, tolerance_m))
+    # Identical plans (same routes, same blocked roads version) get the same ETag
+    response.cache_control.public = True
+    response.cache_control.max_age = config.ROUTE_API_MAX_AGE
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/metrics')
+def metrics():
+    return Response(instrumentation.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/blocks/events')
+def api_block_events():
+    # Resume from the blocked_version the page already has, or start with a snapshot
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    return Response(get_feed().stream(since), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/batch', methods=['POST'])
+def api_batch():
+    # Body: CSV (source,destination[,id]) or JSON Lines; results stream back as NDJSON
+    mode = request.args.get('mode', 'routes')
+    fmt = request.args.get('format') or ('jsonl' if 'json' in request.mimetype else 'csv')
+    if mode not in MODES or fmt not in FORMATS:
+        return jsonify({"error": f"mode must be one of {', '.join(MODES)}; format one of {', '.join(FORMATS)}"}), 400
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    results = run_batch(read_pairs(lines, fmt), mode)
+    return Response(stream_with_context(json.dumps(result) + "\n" for result in results),
+                    mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+@app.route('/parking')
+def parking():
+    return render_template('parking.html', cameras=list(get_pipeline().cameras))
+
+@app.route('/video_feed', defaults={'camera': None})
+@app.route('/video_feed/<camera>')
+def video_feed(camera):
+    feed = get_pipeline().camera(camera)
+    if feed is None:
+        return render_template('error.html', message=f"Unknown camera: {camera}"), 404
+    return Response(feed.mjpeg(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/api/parking')
+def api_parking():
+    return jsonify({"cameras": [camera.summary() for camera in get_pipeline().cameras.values()]})
+
+@app.route('/api/parking/<camera>')
+def api_parking_camera(camera):
+    feed = get_pipeline().camera(camera)
+    if feed is None:
+        return jsonify({"error": f"Unknown camera: {camera}"}), 404
+    snapshot = feed.snapshot()
+    if snapshot is None:
+        return jsonify({"error": "Camera has not produced a frame yet"}), 503
+    response = jsonify(snapshot)
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/parking/<camera>/events')
+def api_parking_events(camera):
+    feed = get_pipeline().camera(camera)
+    if feed is None:
+        return jsonify({"error": f"Unknown camera: {camera}"}), 404
+    last_version = request.headers.get('Last-Event-ID', type=int)
+    return Response(feed.occupancy_stream(last_version), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/admin', methods=['GET', 'POST'])
 def admin_panel():
     if request.method == 'POST':
-        action = request.form.get('action')
-        source = request.form.get('source', '').strip()
-        destination = request.form.get('destination', '').strip()
-        road = request.form.get('road', '').strip()
-        
-        blocked_roads = load_blocked_roads()
-        route_key = f"{source.lower()}_{destination.lower()}"
-        
-        if action == 'block':
-            if route_key not in blocked_roads:
-                blocked_roads[route_key] = []
-            if road.lower() not in [r.lower() for r in blocked_roads[route_key]]:
-                blocked_roads[route_key].append(road)
-                save_blocked_roads(blocked_roads)
-                message = f"Road '{road}' blocked between {source} and {destination}"
-            else:
-                message = f"Road '{road}' is already blocked on this route"
-        
-        elif action == 'unblock':
-            if route_key in blocked_roads and road in blocked_roads[route_key]:
-                blocked_roads[route_key].remove(road)
-                if not blocked_roads[route_key]:
-                    del blocked_roads[route_key]
-                save_blocked_roads(blocked_roads)
-                message = f"Road '{road}' unblocked between {source} and {destination}"
-            else:
-                message = f"Road '{road}' is not blocked on this route"
-        
+        message = apply_admin_form(request.form)
         return render_template('admin.html', 
-                             blocked_roads=blocked_roads,
+                             blocked_roads=get_store().load(),
+                             trends=congestion_trends(),
                              message=message)
     
-    return render_template('admin.html', blocked_roads=load_blocked_roads())
+    return render_template('admin.html', blocked_roads=get_store().load(), trends=congestion_trends())
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Development server only; see asgi.py for the production serving mode
+    app.run(debug=config.DEBUG)
\ No newline at end of file
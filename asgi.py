@@ -0,0 +1,199 @@
+"""Production serving mode: the map, route API and admin views as an ASGI app.
+
+Same pages and templates as app.py, but the views are coroutines on Quart and
+all outbound Google calls go through the async HTTP client, so a request that
+is waiting on geocoding or computeRoutes holds no thread. Blocking work
+(SQLite reads and writes, polyline decoding, the blocked-roads check, GeoJSON
+and folium rendering) runs on a small thread pool of ASGI_CPU_THREADS per
+process, never on the event loop.
+
+Run it under a real ASGI server (debug is always off):
+
+    pip install quart httpx uvicorn
+    uvicorn asgi:app --workers 4 --host 0.0.0.0 --port 8000
+
+or `hypercorn asgi:app --workers 4 --bind 0.0.0.0:8000`, or `python asgi.py`,
+which starts uvicorn with ASGI_WORKERS, ASGI_HOST and ASGI_PORT from config.
+Request timings and /metrics work as in app.py. A profiled request (PROFILING)
+records the event loop thread while it is open, so other requests running
+on the loop at the same time show up in its profile too.
+
+The camera/parking views and the batch routing API (/api/batch) still need the
+threaded Flask app (app.py).
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Quart, Response, g, make_response, render_template, request, jsonify, send_from_directory
+
+from traffic_core import config, http_client, instrumentation
+from admin import apply_admin_form, congestion_trends, schedule_text
+from traffic_core.block_feed import get_feed
+from traffic_core.blocked_roads_store import get_store
+from traffic_core.rendering import render_folium, route_feature_collection
+from traffic_core.route_planner import FETCH_FAILED, INVALID_DEPARTURE, parse_departure, plan_route_async
+from traffic_core.warmer import get_warmer
+
+app = Quart(__name__)
+app.add_template_filter(schedule_text)
+
+
+@app.before_serving
+async def startup():
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=config.ASGI_CPU_THREADS, thread_name_prefix="asgi-cpu"))
+    if config.WARMER_ENABLED:
+        # Loads the snapshot; one worker warms, the others follow its snapshot
+        (await asyncio.to_thread(get_warmer)).start()
+
+
+@app.after_serving
+async def shutdown():
+    await http_client.close_async_client()
+
+
+@app.before_request
+async def start_request_timing():
+    g.request_start = time.perf_counter()
+    g.profiler = instrumentation.start_profile(request.headers)
+
+
+@app.after_request
+async def finish_request_timing(response):
+    view = request.endpoint or 'unknown'
+    instrumentation.observe('http_request_seconds', time.perf_counter() - g.request_start, view=view)
+    instrumentation.count('http_requests_total', view=view, status=response.status_code)
+    if g.profiler is not None:
+        # Stop on the loop thread that started it; writing the file can go to a worker
+        instrumentation.stop_profile(g.profiler)
+        response.headers['X-Profile-File'] = await asyncio.to_thread(instrumentation.save_profile, g.profiler,
+                                                                     request.path)
+        g.profiler = None
+    return response
+
+
+@app.teardown_request
+async def stop_profiler(error):
+    if g.get('profiler') is not None:
+        instrumentation.stop_profile(g.profiler)
+        await asyncio.to_thread(instrumentation.save_profile, g.profiler, request.path)
+        g.profiler = None
+
+
+@app.route('/favicon.ico')
+async def favicon():
+    return await send_from_directory(os.path.join(app.root_path, 'static'),
+                                     'favicon.ico', mimetype='image/vnd.microsoft.icon')
+
+
+@app.route('/')
+async def home():
+    return await render_template('index.html')
+
+
+@app.route('/map')
+async def map_route():
+    source = request.args.get('source', '')
+    destination = request.args.get('destination', '')
+
+    if not source or not destination:
+        return await render_template('error.html', message="Please provide both source and destination")
+
+    try:
+        departure_time = parse_departure(request.args.get('departure'))
+    except ValueError:
+        return await render_template('error.html', message=INVALID_DEPARTURE)
+    departure = departure_time.isoformat() + 'Z' if departure_time else ''
+
+    renderer = request.args.get('render', config.MAP_RENDERER)
+    if renderer != 'folium':
+        return await render_template('map.html', source=source, destination=destination, departure=departure)
+
+    plan, error = await plan_route_async(source, destination, departure_time=departure_time)
+    if error:
+        return await render_template('error.html', message=error)
+
+    with instrumentation.span('render_folium'):
+        map_html = await asyncio.to_thread(render_folium, plan)
+    return await render_template('map.html',
+                                 map_html=map_html,
+                                 source=source,
+                                 destination=destination,
+                                 departure=departure,
+                                 blocked_roads=plan.blocked_roads,
+                                 recommended=plan.chosen.explanation)
+
+
+@app.route('/api/route')
+async def api_route():
+    source = request.args.get('source', '').strip()
+    destination = request.args.get('destination', '').strip()
+
+    if not source or not destination:
+        return jsonify({"error": "Please provide both source and destination"}), 400
+
+    zoom = request.args.get('zoom', type=int)
+    tolerance_m = request.args.get('tolerance', type=float)
+    try:
+        departure_time = parse_departure(request.args.get('departure'))
+    except ValueError:
+        return jsonify({"error": INVALID_DEPARTURE}), 400
+
+    body = None
+    if config.WARMER_ENABLED and zoom is None and tolerance_m is None and departure_time is None:
+        body = await asyncio.to_thread(get_warmer().geojson, source, destination)
+    if body is not None:
+        response = Response(body, mimetype='application/json')
+    else:
+        plan, error = await plan_route_async(source, destination, departure_time=departure_time)
+        if error:
+            return jsonify({"error": error}), 502 if error == FETCH_FAILED else 404
+
+        with instrumentation.span('render_geojson'):
+            response = jsonify(await asyncio.to_thread(route_feature_collection, plan, zoom, tolerance_m))
+    response.cache_control.public = True
+    response.cache_control.max_age = config.ROUTE_API_MAX_AGE
+    await response.add_etag()
+    await response.make_conditional(request)
+    return response
+
+
+@app.route('/metrics')
+async def metrics():
+    return Response(instrumentation.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/blocks/events')
+async def api_block_events():
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    feed = await asyncio.to_thread(get_feed)
+    response = await make_response(feed.stream_async(since), {
+        'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Live stream: no response timeout
+    response.timeout = None
+    return response
+
+
+@app.route('/admin', methods=['GET', 'POST'])
+async def admin_panel():
+    if request.method == 'POST':
+        form = await request.form
+        message = await asyncio.to_thread(apply_admin_form, form)
+        return await render_template('admin.html',
+                                     blocked_roads=await asyncio.to_thread(lambda: get_store().load()),
+                                     trends=await asyncio.to_thread(congestion_trends),
+                                     message=message)
+
+    return await render_template('admin.html', blocked_roads=await asyncio.to_thread(lambda: get_store().load()),
+                                 trends=await asyncio.to_thread(congestion_trends))
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run("asgi:app", host=config.ASGI_HOST, port=config.ASGI_PORT,
+                workers=config.ASGI_WORKERS)
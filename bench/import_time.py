@@ -0,0 +1,78 @@
+"""Import-time budget check for the web workers and CLIs.
+
+Imports every entry point in a fresh interpreter (best of --runs), reports
+the time to import it and the whole process time, and fails (exit 1) when
+one takes longer than --budget seconds or loads a heavy dependency it does
+not need at startup (OpenCV, folium, the parking pipeline):
+
+    python bench/import_time.py --budget 0.75
+
+Entry points whose own dependencies are missing (e.g. quart for asgi) are
+reported as skipped.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINTS = ("app", "asgi", "traffic_map", "user", "admin", "traffic_core.batch_routing", "traffic_core.warmer")
+# Loaded on first use only: a camera view, a folium map, the local road graph
+LAZY_MODULES = ("cv2", "folium", "vehicle_parking.pipeline", "traffic_core.local_routing")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, runs):
+    """(import seconds, process seconds, eager heavy modules) of the best run, or None if it cannot be imported."""
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", PROBE.format(module=module, lazy=LAZY_MODULES)],
+                                cwd=REPO_DIR, capture_output=True, text=True)
+        wall = time.perf_counter() - started
+        if result.returncode != 0:
+            if "ModuleNotFoundError" in result.stderr:
+                return None
+            raise RuntimeError(f"importing {module} failed:\n{result.stderr}")
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        if best is None or wall < best[1]:
+            best = probe["seconds"], wall, probe["loaded"]
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that every entry point imports within a time budget.")
+    parser.add_argument("--budget", type=float, default=0.75, help="seconds allowed per process (default 0.75)")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per entry point; the best counts")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'entry point':32} {'import':>8} {'process':>8}")
+    for module in args.modules:
+        result = measure(module, args.runs)
+        if result is None:
+            print(f"{module:32} skipped (missing dependency)")
+            continue
+        seconds, wall, loaded = result
+        problems = []
+        if wall > args.budget:
+            problems.append(f"over the {args.budget:.2f}s budget")
+        if loaded:
+            problems.append(f"loads {', '.join(loaded)} at import")
+        failed = failed or bool(problems)
+        print(f"{module:32} {seconds * 1000:6.0f}ms {wall * 1000:6.0f}ms  {'; '.join(problems) or 'ok'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Load generator and latency report for the map/route/admin views and the traffic_map CLI.
+
+Starts bench/stub_google.py in-process, runs the app under test in a
+subprocess pointed at the stub (bench/serve.py), drives each scenario at a
+fixed concurrency and writes p50/p95/p99 latency, throughput, error count and
+the server's peak RSS to a JSON file:
+
+    python bench/load.py --server flask --scenario api --scenario map \
+        --concurrency 32 --requests 2000 --latency-ms 80 --polyline-points 20000
+
+Scenarios:
+- map:   GET /map?render=folium (server-side folium page)
+- api:   GET /api/route (GeoJSON)
+- admin: GET /admin
+- cli:   `python traffic_map.py` fed a source and destination on stdin
+
+Requests cycle over the pairs of --places distinct place names, so the first
+pass misses the geocode and route caches and later passes mostly hit them.
+Use --compare with an earlier results file to fail (exit 1) when a scenario's
+p95 latency grew by more than --threshold.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import permutations
+from urllib.parse import urlencode
+
+import numpy as np
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import stub_google  # noqa: E402
+
+SCENARIOS = ("map", "api", "admin", "cli")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def place_pairs(count):
+    names = [f"Bench Place {i}" for i in range(count)]
+    return list(permutations(names, 2))
+
+
+def scenario_path(scenario, source, destination):
+    if scenario == "map":
+        return "/map?" + urlencode({"source": source, "destination": destination, "render": "folium"})
+    if scenario == "api":
+        return "/api/route?" + urlencode({"source": source, "destination": destination})
+    return "/admin"
+
+
+def peak_rss_kb(pid):
+    """Peak resident set size of a live process in KiB (Linux /proc), or None."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = np.asarray(latencies) * 1000
+    result = {"requests": int(len(latencies)) + errors, "errors": errors,
+              "elapsed_s": round(elapsed, 3),
+              "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0}
+    if len(latencies):
+        p50, p95, p99 = (float(v) for v in np.percentile(latencies, (50, 95, 99)))
+        result.update(p50_ms=round(p50, 2), p95_ms=round(p95, 2), p99_ms=round(p99, 2),
+                      mean_ms=round(float(latencies.mean()), 2), max_ms=round(float(latencies.max()), 2))
+    return result
+
+
+def drive(call, total, concurrency):
+    """Run call(i) for i in range(total) on `concurrency` threads; returns (latencies, errors, elapsed)."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        ok = call(i)
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors[0] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    return latencies, errors[0], time.perf_counter() - start
+
+
+def wait_until_up(base_url, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            requests.get(base_url + "/", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError("server did not come up")
+
+
+def run_http_scenarios(args, env, scenarios, pairs):
+    """Start the app, run every HTTP scenario against it; returns {scenario: result}."""
+    base_url = f"http://127.0.0.1:{args.port}"
+    process = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "serve.py"),
+                                "--server", args.server, "--port", str(args.port)],
+                               env=env, cwd=env["BENCH_WORKDIR"])
+    results = {}
+    try:
+        wait_until_up(base_url, process)
+        session = requests.Session()
+        session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+        for scenario in scenarios:
+            def call(i, scenario=scenario):
+                source, destination = pairs[i % len(pairs)]
+                try:
+                    response = session.get(base_url + scenario_path(scenario, source, destination), timeout=60)
+                    return response.status_code == 200
+                except requests.RequestException:
+                    return False
+
+            latencies, errors, elapsed = drive(call, args.requests, args.concurrency)
+            results[scenario] = summarize(latencies, errors, elapsed)
+            results[scenario]["server_peak_rss_kb"] = peak_rss_kb(process.pid)
+            print(f"{scenario}: {results[scenario]}")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return results
+
+
+def run_cli_scenario(args, env, pairs):
+    """Run the traffic_map CLI end to end; each run is one sample."""
+    peak_rss = [0]
+
+    def call(i):
+        source, destination = pairs[i % len(pairs)]
+        process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, "traffic_map.py")],
+                                   stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                   text=True, env=env, cwd=env["BENCH_WORKDIR"])
+        process.stdin.write(f"{source}\n{destination}\n")
+        process.stdin.close()
+        # wait4 reports the child's own rusage; ru_maxrss is in KiB on Linux
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        peak_rss[0] = max(peak_rss[0], usage.ru_maxrss)
+        return process.returncode == 0
+
+    latencies, errors, elapsed = drive(call, args.cli_runs, min(args.concurrency, args.cli_runs))
+    result = summarize(latencies, errors, elapsed)
+    result["peak_rss_kb"] = peak_rss[0]
+    print(f"cli: {result}")
+    return result
+
+
+def compare(results, baseline_path, threshold):
+    """Print p95 ratios against a baseline file; returns the scenarios that regressed."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["scenarios"]
+    regressed = []
+    for scenario, result in results.items():
+        old = baseline.get(scenario, {}).get("p95_ms")
+        new = result.get("p95_ms")
+        if not old or new is None:
+            continue
+        ratio = new / old
+        print(f"{scenario}: p95 {old} ms -> {new} ms ({ratio:.2f}x)")
+        if ratio > threshold:
+            regressed.append(scenario)
+    return regressed
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=("flask", "asgi"), default="flask")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="repeatable; default: map, api and admin")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="requests per HTTP scenario")
+    parser.add_argument("--cli-runs", type=int, default=5)
+    parser.add_argument("--places", type=int, default=10, help="distinct place names to cycle through")
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--stub-port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50, help="added latency of every stub call")
+    parser.add_argument("--polyline-points", type=int, default=2000)
+    parser.add_argument("--alternatives", type=int, default=2)
+    parser.add_argument("--places-results", type=int, default=5)
+    parser.add_argument("--output", help="results file (default bench/results/bench-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare p95 against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="allowed p95 growth for --compare")
+    args = parser.parse_args()
+    scenarios = args.scenario or ["map", "api", "admin"]
+
+    stub_settings = {"latency_ms": args.latency_ms, "polyline_points": args.polyline_points,
+                     "alternatives": args.alternatives, "places_results": args.places_results}
+    stub, stub_state = stub_google.make_server("127.0.0.1", args.stub_port, **stub_settings)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    env = dict(os.environ, **stub_google.endpoint_env("127.0.0.1", args.stub_port))
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])),
+        "BENCH_WORKDIR": workdir,
+        "GEOCODE_CACHE_FILE": os.path.join(workdir, "geocode_cache.sqlite3"),
+        "BLOCKED_ROADS_DB": os.path.join(workdir, "blocked_roads.sqlite3"),
+        "BLOCKED_ROADS_SEED_FILE": os.path.join(REPO_DIR, "blocked_roads.json"),
+    })
+    pairs = place_pairs(args.places)
+
+    results = {}
+    try:
+        http = [s for s in scenarios if s != "cli"]
+        if http:
+            results.update(run_http_scenarios(args, env, http, pairs))
+        if "cli" in scenarios:
+            results["cli"] = run_cli_scenario(args, env, pairs)
+    finally:
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "git_revision": git_revision(),
+        "server": args.server,
+        "settings": {"concurrency": args.concurrency, "requests": args.requests,
+                     "cli_runs": args.cli_runs, "places": args.places, **stub_settings},
+        "upstream_calls": dict(stub_state.counts),
+        "scenarios": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench-{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        regressed = compare(results, args.compare, args.threshold)
+        if regressed:
+            print(f"p95 regression over {args.threshold}x in: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""CPU cost of parking detection with and without motion gating, on video files.
+
+Runs every frame of each recorded video through the camera pipeline's
+per-frame path (detection, occupancy tracking, annotation and JPEG encode)
+twice, once on every frame in full and once behind the MotionGate, and
+reports CPU time per frame, frames skipped, slots re-evaluated and how often
+the debounced slot states of the two runs agree (on whole frames and per slot):
+
+    python bench/parking_motion.py lot_night.mp4 lot_day.mp4 --slots parking_slots.json
+
+Without recorded footage, --synthetic writes a mostly static test clip
+(textured cars, slow lighting drift, a car arriving and leaving, a pedestrian
+crossing) and measures that instead. Results go to
+bench/results/parking-motion-<time>.json unless --output is given.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from traffic_core import config  # noqa: E402
+from vehicle_parking.parking_detector import frame_size_of, load_slots, slot_polygon  # noqa: E402
+from vehicle_parking.pipeline import Camera  # noqa: E402
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def write_synthetic_clip(path, slots_file, frames=750, fps=25):
+    """Mostly static lot video matching the slot layout of slots_file."""
+    with open(slots_file) as f:
+        layout = json.load(f)
+    width, height = layout.get("frame_size", (1100, 720))
+    polygons = [slot_polygon(slot) for slot in layout["slots"]]
+    rng = np.random.default_rng(0)
+    background = rng.normal(150, 6, (height, width, 3)).clip(0, 255).astype(np.uint8)
+    parked = background.copy()
+    for i, polygon in enumerate(polygons):
+        if i % 3:
+            continue
+        x, y, w, h = cv2.boundingRect(polygon)
+        parked[y + 4:y + h - 4, x + 6:x + w - 6] = rng.integers(0, 255, (h - 8, w - 12, 3), dtype=np.uint8)
+    arriving = cv2.boundingRect(polygons[1]) if len(polygons) > 1 else None
+    car = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    for n in range(frames):
+        frame = cv2.convertScaleAbs(parked, alpha=1.0, beta=-8 * n / frames)
+        if arriving and frames // 3 <= n < 2 * frames // 3:
+            x, y, w, h = arriving
+            frame[y + 4:y + h - 4, x + 6:x + w - 6] = car[y + 4:y + h - 4, x + 6:x + w - 6]
+        if frames // 2 <= n < frames // 2 + fps * 2:
+            px = int((n - frames // 2) / (fps * 2) * width)
+            cv2.rectangle(frame, (px, height // 2), (px + 20, height // 2 + 50), (40, 40, 40), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def run(path, slots_file, motion_gating, max_frames):
+    """Process a video; returns (result dict, per-frame occupied states)."""
+    capture = cv2.VideoCapture(path)
+    camera = Camera("bench", path, slots_file, pool=None, motion_gating=motion_gating)
+    camera.prepare(frame_size_of(capture))
+    states = []
+    cpu = 0.0
+    encoded = 0
+    while len(states) < max_frames:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        start = time.process_time()
+        if camera.process_frame(frame) is not None:
+            encoded += 1
+        cpu += time.process_time() - start
+        states.append(camera.tracker.occupied.copy())
+    capture.release()
+    frames = len(states)
+    result = {"frames": frames, "encoded": encoded, "skipped": camera.stats["skipped"],
+              "cpu_s": round(cpu, 3), "cpu_ms_per_frame": round(1000 * cpu / frames, 3) if frames else None,
+              "slots": len(camera.detector), "occupancy_changes": len(camera.events)}
+    result["slots_evaluated"] = camera.motion.stats["slots_evaluated"] if camera.motion else frames * len(camera.detector)
+    return result, np.array(states)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("videos", nargs="*", help="recorded video files")
+    parser.add_argument("--slots", default=config.PARKING_SLOTS_FILE, help="slot layout JSON")
+    parser.add_argument("--max-frames", type=int, default=3000)
+    parser.add_argument("--synthetic", action="store_true", help="also measure a generated static-lot clip")
+    parser.add_argument("--output", help="results file (default bench/results/parking-motion-<time>.json)")
+    args = parser.parse_args()
+
+    # Single-threaded OpenCV so CPU time compares like with like
+    cv2.setNumThreads(1)
+    videos = list(args.videos)
+    workdir = None
+    if args.synthetic or not videos:
+        workdir = tempfile.mkdtemp(prefix="parking-bench-")
+        clip = os.path.join(workdir, "synthetic.avi")
+        write_synthetic_clip(clip, args.slots)
+        videos.append(clip)
+
+    report = {"timestamp": datetime.utcnow().isoformat() + "Z", "slots_file": args.slots,
+              "slot_count": len(load_slots(args.slots)), "videos": {}}
+    for path in videos:
+        full, full_states = run(path, args.slots, False, args.max_frames)
+        gated, gated_states = run(path, args.slots, True, args.max_frames)
+        same = full_states == gated_states
+        agreement = float(same.all(axis=1).mean()) if len(same) else None
+        slot_agreement = float(same.mean()) if len(same) else None
+        speedup = full["cpu_s"] / gated["cpu_s"] if gated["cpu_s"] else None
+        report["videos"][os.path.basename(path)] = {
+            "full": full, "gated": gated, "state_agreement": agreement, "slot_agreement": slot_agreement,
+            "cpu_speedup": round(speedup, 2) if speedup else None}
+        print(f"{os.path.basename(path)}: {full['cpu_ms_per_frame']} -> {gated['cpu_ms_per_frame']} ms/frame, "
+              f"{gated['skipped']}/{gated['frames']} frames skipped, "
+              f"{gated['slots_evaluated']}/{full['slots_evaluated']} slot evaluations, "
+              f"states agree on {agreement:.1%} of frames ({slot_agreement:.2%} of slot-frames)")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"parking-motion-{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    if workdir:
+        os.remove(clip)
+        os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    main()
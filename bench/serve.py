@@ -0,0 +1,38 @@
+"""Run the web app for a benchmark: the threaded Flask app or the ASGI app.
+
+    python bench/serve.py --server flask --port 5050
+    python bench/serve.py --server asgi --port 5050
+
+Unlike `python app.py` this never enables the reloader or debug mode, so the
+process measured is the one serving requests.
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=("flask", "asgi"), default="flask")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5050)
+    args = parser.parse_args()
+
+    if args.server == "flask":
+        from werkzeug.serving import make_server
+        from app import app
+
+        # Per-request access logging would dominate the measurement
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        make_server(args.host, args.port, app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+
+        uvicorn.run("asgi:app", host=args.host, port=args.port, workers=1, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Local stand-in for the Google APIs used by the app, for load tests.
+
+Serves the four endpoints the app calls, with a fixed added latency and
+configurable payload sizes:
+
+    GET  /geocode          Geocoding API (coordinates derived from the address hash)
+    POST /routes           Routes API computeRoutes (polylines of --polyline-points vertices)
+    GET  /places           Places nearbysearch (--places-results results per call)
+    GET  /distancematrix   Distance Matrix
+
+Point the app at it through config:
+
+    python bench/stub_google.py --port 8765 --latency-ms 80 --polyline-points 20000
+    GEOCODE_URL=http://127.0.0.1:8765/geocode ROUTES_URL=http://127.0.0.1:8765/routes \
+    PLACES_URL=http://127.0.0.1:8765/places DISTANCE_MATRIX_URL=http://127.0.0.1:8765/distancematrix \
+    python app.py
+
+bench/load.py starts one itself and sets those variables for the server under test.
+"""
+import argparse
+import hashlib
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Addresses containing this marker geocode to ZERO_RESULTS
+UNKNOWN_MARKER = "nowhere"
+
+
+def encode_polyline(points, precision=5):
+    """Google encoded polyline of (lat, lng) points."""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        ilat, ilng = round(lat * factor), round(lng * factor)
+        for value in (ilat - prev_lat, ilng - prev_lng):
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        prev_lat, prev_lng = ilat, ilng
+    return "".join(out)
+
+
+def address_location(address):
+    """Deterministic (lat, lng) for an address, spread over southern India."""
+    digest = hashlib.sha1(address.strip().lower().encode()).digest()
+    return 8.0 + digest[0] / 255 * 12.0, 73.0 + digest[1] / 255 * 7.0
+
+
+def route_points(origin, destination, n):
+    """n vertices from origin to destination with a gentle wiggle, like a real road."""
+    (lat0, lng0), (lat1, lng1) = origin, destination
+    points = []
+    for i in range(n):
+        t = i / max(n - 1, 1)
+        wiggle = 0.002 * ((i % 7) - 3) / 3
+        points.append((lat0 + (lat1 - lat0) * t + wiggle, lng0 + (lng1 - lng0) * t - wiggle))
+    return points
+
+
+class StubState:
+    """Settings and request counters shared by the handler threads."""
+
+    def __init__(self, latency_ms=50, polyline_points=2000, alternatives=2, places_results=5):
+        self.latency_ms = latency_ms
+        self.polyline_points = polyline_points
+        self.alternatives = alternatives
+        self.places_results = places_results
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def hit(self, endpoint):
+        with self._lock:
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # set by make_server
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, status=200):
+        data = json.dumps(body).encode()
+        time.sleep(self.state.latency_ms / 1000)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/geocode":
+            self.state.hit("geocode")
+            address = query.get("address", "")
+            if UNKNOWN_MARKER in address.lower():
+                return self._send({"status": "ZERO_RESULTS", "results": []})
+            lat, lng = address_location(address)
+            return self._send({"status": "OK", "results": [{"geometry": {"location": {"lat": lat, "lng": lng}}}]})
+        if url.path == "/places":
+            self.state.hit("places")
+            lat, lng = (float(v) for v in query.get("location", "0,0").split(","))
+            results = [{"place_id": f"{lat:.4f},{lng:.4f},{i}", "name": f"Signal {i}",
+                        "geometry": {"location": {"lat": lat + i * 1e-4, "lng": lng}}}
+                       for i in range(self.state.places_results)]
+            return self._send({"status": "OK", "results": results})
+        if url.path == "/distancematrix":
+            self.state.hit("distancematrix")
+            origins = [tuple(map(float, p.split(","))) for p in query.get("origins", "").split("|") if p]
+            destinations = [tuple(map(float, p.split(","))) for p in query.get("destinations", "").split("|") if p]
+            rows = []
+            for origin in origins:
+                elements = []
+                for destination in destinations:
+                    # ~111 km per degree, driven at 60 km/h, plus 15% traffic
+                    meters = int(111000 * math.dist(origin, destination))
+                    elements.append({"status": "OK", "distance": {"value": meters},
+                                     "duration": {"value": meters * 60 // 1000},
+                                     "duration_in_traffic": {"value": meters * 69 // 1000}})
+                rows.append({"elements": elements})
+            return self._send({"status": "OK", "rows": rows})
+        self._send({"error": "not found"}, 404)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if urlparse(self.path).path != "/routes":
+            return self._send({"error": "not found"}, 404)
+        self.state.hit("routes")
+        origin = body["origin"]["location"]["latLng"]
+        destination = body["destination"]["location"]["latLng"]
+        origin = origin["latitude"], origin["longitude"]
+        destination = destination["latitude"], destination["longitude"]
+        count = 1 + (self.state.alternatives if body.get("computeAlternativeRoutes") else 0)
+        routes = []
+        for i in range(count):
+            # Alternatives detour through a shifted midpoint
+            shift = 0.05 * i
+            middle = ((origin[0] + destination[0]) / 2 + shift, (origin[1] + destination[1]) / 2 - shift)
+            half = self.state.polyline_points // 2
+            points = route_points(origin, middle, half) + route_points(middle, destination, half)[1:]
+            routes.append({"duration": f"{3600 + 300 * i}s", "staticDuration": f"{3300 + 200 * i}s",
+                           "distanceMeters": 100000 + 5000 * i,
+                           "polyline": {"encodedPolyline": encode_polyline(points)}})
+        self._send({"routes": routes})
+
+
+def make_server(host="127.0.0.1", port=8765, **settings):
+    """Build (not start) a stub server; settings go to StubState. Returns (server, state)."""
+    state = StubState(**settings)
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server, state
+
+
+def endpoint_env(host, port):
+    """Environment variables that point config at a stub on host:port."""
+    base = f"http://{host}:{port}"
+    return {
+        "GEOCODE_URL": f"{base}/geocode",
+        "ROUTES_URL": f"{base}/routes",
+        "PLACES_URL": f"{base}/places",
+        "DISTANCE_MATRIX_URL": f"{base}/distancematrix",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--polyline-points", type=int, default=2000)
+    parser.add_argument("--alternatives", type=int, default=2)
+    parser.add_argument("--places-results", type=int, default=5)
+    args = parser.parse_args()
+    server, _ = make_server(args.host, args.port, latency_ms=args.latency_ms,
+                            polyline_points=args.polyline_points, alternatives=args.alternatives,
+                            places_results=args.places_results)
+    print(f"Stub Google APIs on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
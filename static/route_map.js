@@ -0,0 +1,378 @@
+// Draws the GeoJSON returned by /api/route on a Leaflet map, refetching the
+// routes at a finer level of detail when the user zooms past the current one.
+// Road blocks and unblocks pushed by /api/blocks/events are checked against
+// the routes already drawn, which are then restyled and re-ranked in place.
+(function () {
+    var container = document.getElementById("route-map");
+    var status = document.getElementById("route-status");
+    if (!container) {
+        return;
+    }
+
+    function escapeHtml(text) {
+        var div = document.createElement("div");
+        div.textContent = text;
+        return div.innerHTML;
+    }
+
+    function showStatus(kind, html) {
+        status.className = "alert alert-" + kind;
+        status.innerHTML = html;
+    }
+
+    function showBlockedRoads(roads) {
+        if (!roads.length) {
+            showStatus("success", '<i class="fas fa-check-circle"></i> No blocked roads detected on this route.');
+            return;
+        }
+        var items = roads.map(function (road) {
+            return '<li class="blocked-road">' + escapeHtml(road) + "</li>";
+        }).join("");
+        showStatus("warning",
+            '<h4><i class="fas fa-exclamation-triangle"></i> Blocked Roads Detected</h4>' +
+            "<ul>" + items + "</ul><p>Routes with blocked segments are shown in red.</p>");
+    }
+
+    function showRecommendation(data) {
+        var chosen = data.features.filter(function (f) {
+            return f.properties.kind === "route" && f.properties.chosen;
+        })[0];
+        if (!chosen || !chosen.properties.explanation) {
+            return;
+        }
+        var e = chosen.properties.explanation;
+        status.insertAdjacentHTML("beforeend",
+            '<p class="mb-0"><b>Recommended: Route ' + (e.index + 1) + "</b> &mdash; " +
+            escapeHtml(e.summary) + " (" + escapeHtml(e.reason) + ")</p>");
+    }
+
+    function markerIcon(color) {
+        return L.divIcon({
+            className: "",
+            html: '<div style="background:' + color + ';width:14px;height:14px;border-radius:7px;border:2px solid #fff"></div>',
+            iconSize: [18, 18]
+        });
+    }
+
+    function styleFeature(feature) {
+        var p = feature.properties;
+        if (p.kind === "blocked") {
+            return {color: "darkred", weight: 10, opacity: 0.9};
+        }
+        return {color: p.color, weight: p.weight, opacity: p.opacity};
+    }
+
+    function lodLevel(levels, zoom) {
+        for (var i = 0; i < levels.length; i++) {
+            if (levels[i] >= zoom) {
+                return levels[i];
+            }
+        }
+        return null;
+    }
+
+    function drawRoutes(map, data) {
+        var features = data.features.slice().sort(function (a, b) {
+            // Worst-ranked routes first so the chosen route and blocked stretches end up on top
+            var kind = {route: 0, blocked: 1, start: 2, end: 2};
+            var ra = kind[a.properties.kind] * 100 - (a.properties.rank || 0);
+            var rb = kind[b.properties.kind] * 100 - (b.properties.rank || 0);
+            return ra - rb;
+        });
+        var layer = L.geoJSON({type: "FeatureCollection", features: features}, {
+            style: styleFeature,
+            pointToLayer: function (feature, latlng) {
+                var color = feature.properties.kind === "start" ? "green" : "red";
+                return L.marker(latlng, {icon: markerIcon(color)});
+            },
+            onEachFeature: function (feature, layer) {
+                var p = feature.properties;
+                if (p.kind === "route") {
+                    layer.bindTooltip(escapeHtml(p.tooltip));
+                } else if (p.kind === "blocked") {
+                    layer.bindTooltip("Blocked Road");
+                } else {
+                    var label = p.kind === "start" ? "Start: " : "End: ";
+                    layer.bindPopup("<b>" + label + escapeHtml(p.name) + "</b>");
+                }
+            }
+        }).addTo(map);
+        return layer;
+    }
+
+    var METERS_PER_DEG = 111320;
+
+    function blockKey(block) {
+        return block.route_key + "|" + block.road.toLowerCase();
+    }
+
+    // Local equirectangular projection to meters around latitude lat0
+    function project(lat, lng, lat0) {
+        return [lng * METERS_PER_DEG * Math.cos(lat0 * Math.PI / 180), lat * METERS_PER_DEG];
+    }
+
+    function pointSegmentDistance(p, a, b) {
+        var dx = b[0] - a[0], dy = b[1] - a[1];
+        var lengthSq = dx * dx + dy * dy;
+        var t = lengthSq > 0 ? ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / lengthSq : 0;
+        t = Math.max(0, Math.min(1, t));
+        return Math.hypot(p[0] - a[0] - t * dx, p[1] - a[1] - t * dy);
+    }
+
+    function cross(u, v) {
+        return u[0] * v[1] - u[1] * v[0];
+    }
+
+    function segmentDistance(a1, a2, b1, b2) {
+        var da = [a2[0] - a1[0], a2[1] - a1[1]], db = [b2[0] - b1[0], b2[1] - b1[1]];
+        var d1 = cross(db, [a1[0] - b1[0], a1[1] - b1[1]]), d2 = cross(db, [a2[0] - b1[0], a2[1] - b1[1]]);
+        var d3 = cross(da, [b1[0] - a1[0], b1[1] - a1[1]]), d4 = cross(da, [b2[0] - a1[0], b2[1] - a1[1]]);
+        if (d1 * d2 < 0 && d3 * d4 < 0) {
+            return 0;
+        }
+        return Math.min(pointSegmentDistance(a1, b1, b2), pointSegmentDistance(a2, b1, b2),
+                        pointSegmentDistance(b1, a1, a2), pointSegmentDistance(b2, a1, a2));
+    }
+
+    // Same test as the server's BlockIndex, against the drawn (simplified) line:
+    // its tolerance is added to the buffer so a block on the real route is never missed
+    function routeTouches(route, block) {
+        var coords = route.geometry.coordinates;
+        var reach = block.buffer_m + (route.properties.tolerance_m || 0);
+        var lat0 = block.path[0][0];
+        var path = block.path.map(function (p) { return project(p[0], p[1], lat0); });
+        if (path.length === 1) {
+            path.push(path[0]);
+        }
+        var minX = Infinity, minY = Infinity, maxX = -Infinity, maxY = -Infinity;
+        path.forEach(function (p) {
+            minX = Math.min(minX, p[0]); maxX = Math.max(maxX, p[0]);
+            minY = Math.min(minY, p[1]); maxY = Math.max(maxY, p[1]);
+        });
+        var prev = project(coords[0][1], coords[0][0], lat0);
+        for (var i = 1; i < coords.length; i++) {
+            var next = project(coords[i][1], coords[i][0], lat0);
+            if (Math.max(prev[0], next[0]) >= minX - reach && Math.min(prev[0], next[0]) <= maxX + reach &&
+                    Math.max(prev[1], next[1]) >= minY - reach && Math.min(prev[1], next[1]) <= maxY + reach) {
+                for (var j = 1; j < path.length; j++) {
+                    if (segmentDistance(prev, next, path[j - 1], path[j]) <= reach) {
+                        return true;
+                    }
+                }
+            }
+            prev = next;
+        }
+        return false;
+    }
+
+    // Trip window [departure, arrival] of a route in epoch seconds; departure null means now
+    function tripWindow(route) {
+        var departure = current.departure !== null && current.departure !== undefined
+            ? current.departure : Date.now() / 1000;
+        var duration = route ? parseFloat(route.properties.duration) || 0 : 0;
+        return [departure, departure + duration];
+    }
+
+    // Same test as spatial_index.is_active: a scheduled block only counts while it is on
+    function activeDuring(block, window) {
+        return (block.starts_at === null || block.starts_at === undefined || block.starts_at <= window[1]) &&
+            (block.ends_at === null || block.ends_at === undefined || block.ends_at > window[0]);
+    }
+
+    function blocksRoute(route, block) {
+        return activeDuring(block, tripWindow(route)) && routeTouches(route, block);
+    }
+
+    var map = L.map(container).setView([20, 78], 5);
+    L.tileLayer("https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png", {
+        maxZoom: 19,
+        attribution: "&copy; OpenStreetMap contributors"
+    }).addTo(map);
+
+    var routeLayer = null;
+    var lod = null;
+    var current = null;
+    var blocks = {};  // blockKey -> block affecting this page's routes
+    var events = null;
+
+    function routeFeatures() {
+        return current.features.filter(function (f) { return f.properties.kind === "route"; });
+    }
+
+    // Blocks the server reported with the routes: geometric ones that touch them
+    // plus the names blocked for this source/destination
+    function initialBlocks(data) {
+        blocks = {};
+        data.blocks.forEach(function (block) {
+            blocks[blockKey(block)] = block;
+        });
+        var geometric = data.blocks.map(function (block) { return block.road; });
+        data.blocked_roads.forEach(function (road) {
+            if (geometric.indexOf(road) < 0) {
+                var block = {route_key: data.route_key, road: road, path: null, buffer_m: null};
+                blocks[blockKey(block)] = block;
+            }
+        });
+    }
+
+    function applyBlock(block, action) {
+        var key = blockKey(block);
+        if (action === "unblock") {
+            delete blocks[key];
+            return;
+        }
+        var routes = routeFeatures();
+        var touches = block.path && routes.some(function (route) { return blocksRoute(route, block); });
+        var named = block.route_key === current.route_key &&
+            routes.some(function (route) { return activeDuring(block, tripWindow(route)); });
+        if (touches || named) {
+            blocks[key] = block;
+        }
+    }
+
+    function styleRoute(p) {
+        // Same palette as rendering.route_style
+        if (p.blocked) {
+            p.color = "red"; p.weight = 8; p.opacity = p.chosen ? 0.8 : 0.5;
+        } else if (p.chosen) {
+            p.color = "blue"; p.weight = 6; p.opacity = 0.8;
+        } else {
+            p.color = "gray"; p.weight = 4; p.opacity = 0.5;
+        }
+    }
+
+    // Re-evaluate blocked status, ranking and styling of the drawn routes after a block update
+    function reevaluate() {
+        var routes = routeFeatures();
+        var geometric = Object.keys(blocks).map(function (key) { return blocks[key]; })
+            .filter(function (block) { return block.path; });
+        var changed = false;
+        routes.forEach(function (route) {
+            var p = route.properties;
+            var blocked = geometric.some(function (block) { return blocksRoute(route, block); });
+            changed = changed || blocked !== p.blocked;
+            p.blocked = blocked;
+            var e = p.explanation;
+            if (e && current.blocked_cost !== null) {
+                e.cost = e.cost - e.terms.blocked + (p.blocked ? current.blocked_cost : 0);
+                e.terms.blocked = p.blocked ? current.blocked_cost : 0;
+                e.summary = e.summary.replace(/, blocked$/, "") + (p.blocked ? ", blocked" : "");
+            }
+        });
+        var order = routes.slice().sort(function (a, b) {
+            var ea = a.properties.explanation, eb = b.properties.explanation;
+            var ca = ea ? ea.cost : 0, cb = eb ? eb.cost : 0;
+            return ca - cb || a.properties.index - b.properties.index;
+        });
+        order.forEach(function (route, rank) {
+            var p = route.properties;
+            var wasChosen = p.chosen;
+            p.rank = rank;
+            p.chosen = rank === 0;
+            if (p.explanation) {
+                p.explanation.rank = rank;
+                p.explanation.chosen = p.chosen;
+                if (changed && (p.chosen !== wasChosen || rank > 0)) {
+                    p.explanation.reason = p.chosen ? "chosen after a live road block update"
+                        : "ranked " + (rank + 1) + " after a live road block update";
+                }
+                p.tooltip = (p.chosen ? "Recommended" : "Route " + (p.index + 1)) + ": " + p.explanation.summary;
+            }
+            styleRoute(p);
+        });
+
+        // Blocked stretches are now drawn as the blocks' own paths
+        var features = current.features.filter(function (f) { return f.properties.kind !== "blocked"; });
+        geometric.forEach(function (block) {
+            if (routes.some(function (route) { return blocksRoute(route, block); })) {
+                features.push({
+                    type: "Feature",
+                    geometry: {type: "LineString", coordinates: block.path.map(function (p) { return [p[1], p[0]]; })},
+                    properties: {kind: "blocked"}
+                });
+            }
+        });
+        current.features = features;
+        current.blocked_roads = Object.keys(blocks).map(function (key) { return blocks[key].road; })
+            .filter(function (road, i, all) { return all.indexOf(road) === i; });
+        current.chosen = order[0].properties.index;
+        show(current);
+    }
+
+    function show(data) {
+        if (routeLayer) {
+            map.removeLayer(routeLayer);
+        }
+        showBlockedRoads(data.blocked_roads);
+        showRecommendation(data);
+        routeLayer = drawRoutes(map, data);
+        return routeLayer;
+    }
+
+    // Follow block/unblock events from the version these routes were checked at
+    function listen(version) {
+        if (events) {
+            events.close();
+        }
+        events = new EventSource("/api/blocks/events?since=" + version);
+        events.addEventListener("blocks", function (message) {
+            JSON.parse(message.data).changes.forEach(function (change) {
+                applyBlock(change, change.action);
+            });
+            reevaluate();
+        });
+        events.addEventListener("snapshot", function (message) {
+            blocks = {};
+            JSON.parse(message.data).blocks.forEach(function (block) {
+                applyBlock(block, "block");
+            });
+            reevaluate();
+        });
+    }
+
+    function loadRoutes(zoom) {
+        var params = new URLSearchParams({
+            source: container.dataset.source,
+            destination: container.dataset.destination
+        });
+        if (zoom !== undefined) {
+            params.set("zoom", zoom);
+        }
+        if (container.dataset.departure) {
+            params.set("departure", container.dataset.departure);
+        }
+        return fetch("/api/route?" + params.toString())
+            .then(function (response) {
+                return response.json().then(function (data) {
+                    if (!response.ok) {
+                        throw new Error(data.error || "Failed to load route");
+                    }
+                    return data;
+                });
+            })
+            .then(function (data) {
+                lod = data.lod;
+                current = data;
+                initialBlocks(data);
+                listen(data.blocked_version);
+                return show(data);
+            });
+    }
+
+    function showError(error) {
+        showStatus("danger", '<i class="fas fa-exclamation-circle"></i> ' + escapeHtml(error.message));
+    }
+
+    loadRoutes()
+        .then(function (layer) {
+            map.fitBounds(layer.getBounds(), {padding: [20, 20]});
+            map.on("zoomend", function () {
+                // Only refetch when the zoom needs a finer level than the one drawn
+                var needed = lodLevel(lod.levels, map.getZoom());
+                if (lod.level !== null && (needed === null || needed < lod.level)) {
+                    loadRoutes(map.getZoom()).catch(showError);
+                }
+            });
+        })
+        .catch(showError);
+})();
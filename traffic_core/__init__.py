@@ -0,0 +1,9 @@
+"""Shared core of the traffic route system: geocoding, routing, the blocked roads
+store, caches, ranking and rendering, used by the web apps (app.py, asgi.py) and
+the CLIs (traffic_map.py, user.py, admin.py).
+
+Importing it loads nothing; import the modules you need (from traffic_core
+import config). Heavy optional dependencies load only where they are used:
+folium when a map is rendered server-side, the local road graph in
+ROUTING_MODE = "local", OpenCV with vehicle_parking.pipeline.
+"""
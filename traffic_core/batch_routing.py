@@ -0,0 +1,294 @@
+"""Batch routing: ETAs and blocked-road status for many origin/destination pairs.
+
+Pairs are read lazily from CSV (columns source, destination and optionally
+id) or JSON Lines ({"source": ..., "destination": ..., "id": ...}), and
+results are yielded as soon as each one is ready, not in input order. Every
+result carries its pair's id (the input line number when none is given).
+Memory stays flat whatever the batch size: only a bounded number of pairs
+is read ahead, and place names are remembered in a bounded LRU.
+
+Two modes:
+- "routes": every pair is planned like /map does (cached routes, blocked
+  roads check, ranking) on BATCH_CONCURRENCY threads, with at most twice
+  that many pairs in flight.
+- "eta": BATCH_WINDOW pairs at a time are priced with as few Distance Matrix
+  calls as its limits allow. Origins that share their set of destinations
+  (every depot to every zone) are tiled into full matrices. No geometry is
+  fetched, so only blocks recorded for the place names are reported.
+
+Within a batch each distinct place name is geocoded once, even when several
+workers ask for it at the same time.
+
+    python -m traffic_core.batch_routing pairs.csv --mode eta --output results.jsonl
+"""
+import argparse
+import csv
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+
+from traffic_core import config
+from traffic_core.blocked_roads_store import get_store, route_key
+from traffic_core.geocoding import get_cache, normalize_key
+from traffic_core.route_planner import INVALID_LOCATION, plan_between
+from traffic_core.route_ranking import format_duration, parse_duration
+from traffic_core.routing import MATRIX_MAX_DESTINATIONS, MATRIX_MAX_ELEMENTS, MATRIX_MAX_ORIGINS, distance_matrix
+
+MODES = ("routes", "eta")
+FORMATS = ("csv", "jsonl")
+CSV_COLUMNS = ("id", "source", "destination", "status", "error", "eta_s", "eta_text", "distance_m",
+               "blocked", "blocked_roads", "route", "alternatives")
+MATRIX_FAILED = "Failed to fetch the distance matrix"
+
+
+def read_pairs(lines, fmt="csv"):
+    """Yield {"id", "source", "destination"} per input pair, lazily.
+
+    Malformed rows are yielded as {"id", "error"} so that they show up in the
+    results instead of aborting the batch.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown batch format: {fmt}")
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        rows = ((reader.line_num, row) for row in reader)
+    else:
+        rows = ((number, line) for number, line in enumerate(lines, 1) if line.strip())
+
+    for number, row in rows:
+        if fmt == "jsonl":
+            try:
+                row = json.loads(row)
+            except ValueError as e:
+                yield {"id": number, "error": f"Invalid JSON: {e}"}
+                continue
+            if not isinstance(row, dict):
+                yield {"id": number, "error": "Expected a JSON object"}
+                continue
+        source = (row.get("source") or "").strip()
+        destination = (row.get("destination") or "").strip()
+        pair_id = row.get("id") or number
+        if not source or not destination:
+            yield {"id": pair_id, "error": "Missing source or destination"}
+            continue
+        yield {"id": pair_id, "source": source, "destination": destination}
+
+
+class BatchGeocoder:
+    """Geocodes each distinct place name of a batch once.
+
+    Concurrent lookups of the same name wait for the first one instead of
+    calling the geocoder again. Results (including failures, for the rest of
+    the batch) stay in an LRU of max_entries names in front of the shared
+    GeocodeCache.
+    """
+
+    def __init__(self, cache=None, max_entries=None):
+        self.cache = cache or get_cache()
+        self.max_entries = max_entries or config.BATCH_GEOCODE_MEMO
+        self._lock = threading.Lock()
+        self._names = OrderedDict()  # normalized name -> Future of (lat, lng)
+        self.stats = {"lookups": 0, "geocoded": 0}
+
+    def coordinates(self, name):
+        """(lat, lng) of a place name, or (None, None)."""
+        key = normalize_key(name)
+        with self._lock:
+            self.stats["lookups"] += 1
+            future = self._names.get(key)
+            owner = future is None
+            if owner:
+                future = self._names[key] = Future()
+                self.stats["geocoded"] += 1
+                while len(self._names) > self.max_entries:
+                    self._names.popitem(last=False)
+            else:
+                self._names.move_to_end(key)
+        if owner:
+            try:
+                future.set_result(self.cache.get_coordinates(name))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+
+def _result(pair, error=None, **fields):
+    result = {"id": pair["id"], "source": pair.get("source"), "destination": pair.get("destination")}
+    if error:
+        result.update(status="error", error=error)
+    else:
+        result.update(status="OK", **fields)
+    return result
+
+
+def _eta_fields(seconds, distance_m):
+    return {"eta_s": int(round(seconds)), "eta_text": format_duration(seconds), "distance_m": distance_m}
+
+
+def _route_pair(pair, geocoder, alternatives):
+    """Plan one pair; returns its result."""
+    try:
+        src = geocoder.coordinates(pair["source"])
+        dest = geocoder.coordinates(pair["destination"])
+        if None in src or None in dest:
+            return _result(pair, INVALID_LOCATION)
+        plan, error = plan_between(pair["source"], pair["destination"], src, dest, alternatives)
+        if error:
+            return _result(pair, error)
+        chosen = plan.chosen
+        return _result(pair, **_eta_fields(parse_duration(chosen.duration), chosen.distance_m),
+                       blocked=chosen.blocked, blocked_roads=plan.blocked_roads,
+                       route=chosen.index, alternatives=len(plan.routes))
+    except Exception as e:
+        print(f"Error routing {pair['source']} -> {pair['destination']}: {e}")
+        return _result(pair, str(e))
+
+
+def _run_routes(pairs, pool, geocoder, alternatives, in_flight):
+    pending = set()
+    for pair in pairs:
+        if "error" in pair:
+            yield _result(pair, pair["error"])
+            continue
+        pending.add(pool.submit(_route_pair, pair, geocoder, alternatives))
+        # Hand back whatever finished; block only when the window is full
+        done, pending = wait(pending, timeout=None if len(pending) >= in_flight else 0,
+                             return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+def matrix_tiles(cells):
+    """Split {(origin, destination): value} into Distance Matrix sized requests.
+
+    Origins with the same set of destinations form one full matrix, tiled to
+    the per-request limits. Yields (origins, destinations) lists of points;
+    every element of every tile is one of the requested cells.
+    """
+    wanted = defaultdict(set)
+    for origin, destination in cells:
+        wanted[origin].add(destination)
+    groups = defaultdict(list)
+    for origin, destinations in wanted.items():
+        groups[frozenset(destinations)].append(origin)
+    for destinations, origins in groups.items():
+        destinations = sorted(destinations)
+        # Even column chunks (40 -> 2 x 20 rather than 25 + 15) leave room for more rows
+        columns = -(-len(destinations) // -(-len(destinations) // MATRIX_MAX_DESTINATIONS))
+        rows = max(min(len(origins), MATRIX_MAX_ORIGINS, MATRIX_MAX_ELEMENTS // columns), 1)
+        for i in range(0, len(origins), rows):
+            for j in range(0, len(destinations), columns):
+                yield origins[i:i + rows], destinations[j:j + columns]
+
+
+def _price_tile(origins, destinations, cells):
+    """Results of the pairs in one Distance Matrix tile."""
+    rows = distance_matrix(origins, destinations)
+    results = []
+    for i, origin in enumerate(origins):
+        for j, destination in enumerate(destinations):
+            element = rows[i][j] if rows is not None else {"status": MATRIX_FAILED}
+            for pair, blocked_roads in cells[origin, destination]:
+                if element["status"] != "OK":
+                    results.append(_result(pair, element["status"]))
+                    continue
+                duration = element.get("duration_in_traffic") or element["duration"]
+                results.append(_result(pair, **_eta_fields(duration["value"], element["distance"]["value"]),
+                                       blocked=bool(blocked_roads), blocked_roads=blocked_roads))
+    return results
+
+
+def _run_eta(pairs, pool, geocoder, window):
+    pairs = iter(pairs)
+    while True:
+        chunk = list(islice(pairs, window))
+        if not chunk:
+            return
+        names = list(dict.fromkeys(name for pair in chunk if "error" not in pair
+                                   for name in (pair["source"], pair["destination"])))
+        coordinates = dict(zip(names, pool.map(geocoder.coordinates, names)))
+        blocked = get_store().snapshot()
+
+        cells = defaultdict(list)
+        for pair in chunk:
+            if "error" in pair:
+                yield _result(pair, pair["error"])
+                continue
+            src, dest = coordinates[pair["source"]], coordinates[pair["destination"]]
+            if None in src or None in dest:
+                yield _result(pair, INVALID_LOCATION)
+                continue
+            cells[src, dest].append((pair, blocked.roads_for(route_key(pair["source"], pair["destination"]))))
+
+        pending = {pool.submit(_price_tile, origins, destinations, cells)
+                   for origins, destinations in matrix_tiles(cells)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def run_batch(pairs, mode="routes", concurrency=None, alternatives=True, window=None):
+    """Yield one result dict per pair of `pairs` (from read_pairs), in completion order.
+
+    Results have id, source, destination and status ("OK" or "error" with an
+    error message); OK ones add eta_s, eta_text, distance_m, blocked and
+    blocked_roads, and in "routes" mode the chosen route's index and the
+    number of alternatives. With ROUTING_MODE = "local" there is no Distance
+    Matrix, so "eta" runs as "routes".
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown batch mode: {mode}")
+    concurrency = concurrency or config.BATCH_CONCURRENCY
+    geocoder = BatchGeocoder()
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+    try:
+        if mode == "eta" and config.ROUTING_MODE != "local":
+            yield from _run_eta(pairs, pool, geocoder, window or config.BATCH_WINDOW)
+        else:
+            yield from _run_routes(pairs, pool, geocoder, alternatives, concurrency * 2)
+    finally:
+        # An abandoned batch (client gone) drops the queued pairs
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Route many origin/destination pairs from a CSV or JSONL file.")
+    parser.add_argument("pairs", help="input file (columns/keys: source, destination, optional id); - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="input format (default: from the file extension)")
+    parser.add_argument("--mode", choices=MODES, default="routes")
+    parser.add_argument("--concurrency", type=int, default=config.BATCH_CONCURRENCY)
+    parser.add_argument("--output", help="results file, .jsonl or .csv (default: JSONL on stdout)")
+    args = parser.parse_args()
+
+    fmt = args.format or ("jsonl" if args.pairs.endswith((".jsonl", ".ndjson")) else "csv")
+    source = sys.stdin if args.pairs == "-" else open(args.pairs, newline="")
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    writer = None
+    if args.output and args.output.endswith(".csv"):
+        writer = csv.DictWriter(output, CSV_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+
+    started = time.monotonic()
+    counts = {"OK": 0, "error": 0}
+    with source, output:
+        for result in run_batch(read_pairs(source, fmt), args.mode, args.concurrency):
+            counts[result["status"]] += 1
+            if writer:
+                writer.writerow(dict(result, blocked_roads="; ".join(result.get("blocked_roads") or ())))
+            else:
+                output.write(json.dumps(result) + "\n")
+    print(f"{counts['OK']} routed, {counts['error']} failed in {time.monotonic() - started:.1f}s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
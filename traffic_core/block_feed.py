@@ -0,0 +1,191 @@
+"""Live feed of road blocks and unblocks for open map pages.
+
+The blocked roads store reports every change, made in this process or picked
+up from another one, with the store version it led to. BlockFeed keeps the
+last BLOCK_FEED_HISTORY changes as versioned Server-Sent Events:
+
+    event: blocks    {"version", "changes": [{"action", "route_key", "road", "path", "buffer_m",
+                                             "starts_at", "ends_at"}]}
+    event: snapshot  {"version", "blocks": [{"route_key", "road", "path", "buffer_m", "starts_at", "ends_at"}]}
+
+A stream resumes from the version the page already has (Last-Event-ID or
+?since=, e.g. the blocked_version of /api/route) and gets only the deltas;
+a client too far behind gets one snapshot instead. The map page re-checks
+its routes against them itself, so nothing is geocoded or routed again;
+scheduled blocks carry their window and only count for trips that reach them
+while they are on.
+
+Every message is serialized once and the same string goes to all viewers.
+A watcher thread looks at the store every BLOCKED_ROADS_CHECK_INTERVAL, so
+writes from other processes (admin.py, other workers) are pushed without
+waiting for a page request. app.py's streams wait on a Condition (one thread
+per viewer); asgi.py's await one future per event loop, so thousands of
+viewers cost no threads.
+"""
+import asyncio
+import threading
+from collections import deque
+
+from traffic_core import config
+from traffic_core.blocked_roads_store import get_store
+from traffic_core.spatial_index import block_record
+from traffic_core.sse import KEEPALIVE, SSE_KEEPALIVE, sse_message
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class BlockFeed:
+    """Versioned change events of a BlockedRoadsStore and the streams that serve them.
+
+    Args:
+    - store: the BlockedRoadsStore to follow
+    - history: change events kept for resuming clients
+    - poll_interval: seconds between checks for other processes' writes
+      (default: the store's check_interval)
+    """
+
+    def __init__(self, store, history=None, poll_interval=None):
+        self.store = store
+        self.poll_interval = store.check_interval if poll_interval is None else poll_interval
+        self.events = deque(maxlen=history or config.BLOCK_FEED_HISTORY)  # (from version, version, message)
+        self.version = store.snapshot().version
+        self._changed = threading.Condition()
+        self._waiters = {}  # event loop -> future resolved at the next change
+        self._snapshot = None  # (version, message)
+        self._stopped = threading.Event()
+        self._watcher = None
+        store.subscribe(self.on_blocks_changed)
+
+    def start(self):
+        self._watcher = threading.Thread(target=self._watch, name="block-feed", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stopped.set()
+        with self._changed:
+            self._changed.notify_all()
+
+    def _watch(self):
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                # Picks up other processes' writes; listeners (us included) hear about them
+                self.store.snapshot()
+            except Exception as e:
+                print(f"Error checking blocked roads: {e}")
+
+    def on_blocks_changed(self, changes, version):
+        """Store listener: record one event and wake every stream."""
+        data = {"version": version,
+                "changes": [dict(block_record(key, entry), action=action) for action, key, entry in changes]}
+        message = sse_message("blocks", data, version)
+        with self._changed:
+            self.events.append((self.version, version, message))
+            self.version = version
+            self._changed.notify_all()
+            waiters, self._waiters = self._waiters, {}
+        for loop, future in waiters.items():
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:  # loop already closed
+                pass
+
+    def snapshot_message(self):
+        """The "snapshot" event of the current version, built once per version."""
+        snapshot = self.store.snapshot()
+        cached = self._snapshot
+        if cached is not None and cached[0] == snapshot.version:
+            return cached
+        blocks = [block_record(key, entry) for key, entries in snapshot.blocked_roads.items() for entry in entries]
+        self._snapshot = snapshot.version, sse_message("snapshot", {"version": snapshot.version, "blocks": blocks},
+                                                       snapshot.version)
+        return self._snapshot
+
+    def _deltas(self, after):
+        """(messages, version) past version `after` from the kept events, or None if a snapshot is needed."""
+        with self._changed:
+            if after is not None and after == self.version:
+                return [], after
+            # A version from the future (recreated database, another deployment) needs a snapshot too
+            if after is None or after > self.version or not self.events or self.events[0][0] > after:
+                return None
+            return [message for _, version, message in self.events if version > after], self.version
+
+    def messages_since(self, after):
+        """(messages, version) that bring a client at version `after` up to date.
+
+        A client with no version, one older than the kept history, or one ahead
+        of the store gets the snapshot. Returns no messages when there is nothing new.
+        """
+        deltas = self._deltas(after)
+        if deltas is not None:
+            return deltas
+        version, message = self.snapshot_message()
+        return [message], version
+
+    def wait(self, after, timeout=None):
+        """Block until there is a change past version `after` (or timeout); returns messages_since(after)."""
+        with self._changed:
+            self._changed.wait_for(lambda: after is None or self.version != after or self._stopped.is_set(),
+                                   timeout)
+        return self.messages_since(after)
+
+    async def wait_async(self, after, timeout=None):
+        """wait() for event-loop callers: waits on the loop's shared future, not a thread.
+
+        Only building a snapshot (which reads the store) leaves the loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._changed:
+            future = None
+            if after is not None and self.version == after:
+                future = self._waiters.get(loop)
+                if future is None:
+                    future = self._waiters[loop] = loop.create_future()
+        if future is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                pass
+        deltas = self._deltas(after)
+        if deltas is not None:
+            return deltas
+        version, message = await asyncio.to_thread(self.snapshot_message)
+        return [message], version
+
+    def stream(self, since=None):
+        """Server-Sent Events for a client that has seen version `since` (None: send a snapshot first)."""
+        version = since
+        while not self._stopped.is_set():
+            messages, version = self.wait(version, timeout=SSE_KEEPALIVE)
+            yield "".join(messages) if messages else KEEPALIVE
+
+    async def stream_async(self, since=None):
+        """stream() as an async generator for asgi.py."""
+        version = since
+        while not self._stopped.is_set():
+            messages, version = await self.wait_async(version, timeout=SSE_KEEPALIVE)
+            yield "".join(messages) if messages else KEEPALIVE
+
+
+_default_feed = None
+_default_feed_lock = threading.Lock()
+
+
+def get_feed():
+    """Return the process-wide feed over get_store(), starting its watcher on first use."""
+    global _default_feed
+    with _default_feed_lock:
+        if _default_feed is None:
+            _default_feed = BlockFeed(get_store())
+            _default_feed.start()
+        return _default_feed
+
+
+def set_feed(feed):
+    """Replace the process-wide feed (the caller starts it)."""
+    global _default_feed
+    with _default_feed_lock:
+        _default_feed = feed
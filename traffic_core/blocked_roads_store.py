@@ -0,0 +1,398 @@
+"""Blocked roads repository shared by app.py, admin.py and user.py.
+
+Blocks are rows in a SQLite database in WAL mode, one row per
+(source_destination, road) pair, so blocking or unblocking a road is a single
+atomic statement instead of a read-modify-write of the whole JSON file. A new
+database is seeded once from blocked_roads.json.
+
+Readers get an in-memory Snapshot (the {source_destination: [entries]}
+mapping plus its BlockIndex) that is only rebuilt when the data changed:
+writes from this process update it directly, and changes made by other
+processes are picked up by stat()-ing the database files at most once per
+BLOCKED_ROADS_CHECK_INTERVAL seconds. In steady state a read does no file I/O.
+
+Callables registered with subscribe() are told about every change, whether
+it was made here or picked up from another process, together with the
+version it led to, in version order.
+
+Blocks may be scheduled (starts_at / ends_at). A snapshot keeps every block,
+scheduled or not, and answers "which blocks are active during this window"
+through an IntervalTree over the windows of the geometric blocks; the
+BlockIndex for such a window is a view of the full one restricted to the
+active ids. Looking up "blocks active at T touching this bbox" is a tree
+query (O(log n + active)) plus the grid lookup of the bbox, whose candidates
+are intersected with those ids; no step scans every scheduled closure.
+Nothing has to be written when a scheduled block starts or ends.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from traffic_core import config
+from traffic_core.interval_tree import IntervalTree
+from traffic_core.spatial_index import (DEFAULT_BUFFER_M, BlockIndex, block_window, is_active, make_block,
+                                        parse_time, road_name)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    id INTEGER PRIMARY KEY,
+    route_key TEXT NOT NULL,
+    road_key TEXT NOT NULL,
+    road TEXT NOT NULL,
+    path TEXT,
+    buffer_m REAL,
+    starts_at REAL,
+    ends_at REAL,
+    UNIQUE (route_key, road_key)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def route_key(source, destination):
+    """Key under which blocks between two places are stored."""
+    return f"{source.lower()}_{destination.lower()}"
+
+
+def diff_blocks(old, new):
+    """List the (action, route_key, entry) changes between two route_key -> {road_key: entry} maps."""
+    changes = []
+    for key, roads in old.items():
+        for road_key, entry in roads.items():
+            if new.get(key, {}).get(road_key) != entry:
+                changes.append(("unblock", key, entry))
+    for key, roads in new.items():
+        for road_key, entry in roads.items():
+            if old.get(key, {}).get(road_key) != entry:
+                changes.append(("block", key, entry))
+    return changes
+
+
+class Snapshot:
+    """Immutable view of the blocked roads at one version.
+
+    Time windows are [start, end] in epoch seconds; start defaults to now and
+    end to start.
+    """
+
+    def __init__(self, version, blocked_roads, cache_size=None):
+        self.version = version
+        self.blocked_roads = blocked_roads
+        geometric = [(key, entry) for key, entries in blocked_roads.items() for entry in entries
+                     if isinstance(entry, dict) and entry.get("path")]
+        self._all = BlockIndex([((key, entry["road"]), entry["road"], entry["path"],
+                                 entry.get("buffer_m", DEFAULT_BUFFER_M)) for key, entry in geometric])
+        windows = [block_window(entry) for _, entry in geometric]
+        self.scheduled = any(window != (None, None) for window in windows)
+        self.schedule = IntervalTree(windows)
+        self._indexes = OrderedDict()  # window_key -> BlockIndex view
+        self._cache_size = cache_size or config.BLOCK_WINDOW_CACHE_SIZE
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _window(start, end):
+        start = time.time() if start is None else start
+        return start, start if end is None else end
+
+    @property
+    def index(self):
+        """BlockIndex of the geometric blocks active now."""
+        return self.index_at()
+
+    def index_at(self, start=None, end=None):
+        """BlockIndex of the geometric blocks active at some moment of the window."""
+        if not self.scheduled:
+            return self._all
+        start, end = self._window(start, end)
+        key = self.schedule.window_key(start, end)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+        index = self._all.only(self.schedule.overlapping(start, end))
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self._cache_size:
+                self._indexes.popitem(last=False)
+        return index
+
+    def window_key(self, start=None, end=None):
+        """Key equal for two windows exactly when the same geometric blocks are active in both."""
+        return self.schedule.window_key(*self._window(start, end))
+
+    def stable_for(self, start=None, end=None):
+        """Seconds the window can slide forward before a geometric block starts or ends (inf if never)."""
+        return self.schedule.stable_for(*self._window(start, end))
+
+    def blocks_touching(self, bbox, start=None, end=None):
+        """(block_id, road) of the blocks active in the window whose buffered geometry meets a bbox."""
+        return self.index_at(start, end).touching(bbox)
+
+    def roads_for(self, key, start=None, end=None):
+        """Road names blocked under a source_destination key at some moment of the window."""
+        start, end = self._window(start, end)
+        return [road_name(entry) for entry in self.blocked_roads.get(key, []) if is_active(entry, start, end)]
+
+
+class BlockedRoadsStore:
+    """SQLite-backed blocked roads with a cached in-memory snapshot.
+
+    Args:
+    - path: SQLite database file
+    - seed_file: JSON file imported when the database is first created
+    - check_interval: seconds between checks for other processes' writes
+    """
+
+    def __init__(self, path, seed_file=None, check_interval=1.0, clock=time.monotonic):
+        self.path = path
+        self.check_interval = check_interval
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._migrate()
+
+        self._blocks = {}  # route_key -> {road_key: entry}, insertion ordered
+        self._version = None
+        self._snapshot = None
+        self._signature = None
+        self._next_check = 0.0
+        self._listeners = []
+        self._pending = []  # changes not yet delivered to listeners
+        self._delivering = threading.RLock()  # keeps deliveries in version order
+
+        with self._lock:
+            if self._read_version() is None:
+                self._seed(seed_file)
+            self._reload(notify=False)
+
+    # -- persistence -------------------------------------------------------
+
+    def _migrate(self):
+        """Add the schedule columns to a database created before blocks could be scheduled."""
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(blocks)")}
+        for column in ("starts_at", "ends_at"):
+            if column not in columns:
+                try:
+                    self._db.execute(f"ALTER TABLE blocks ADD COLUMN {column} REAL")
+                except sqlite3.OperationalError:
+                    pass  # another process added it meanwhile
+
+    def _read_version(self):
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+        return row[0] if row else None
+
+    def _bump_version(self):
+        self._db.execute(
+            "INSERT INTO meta (name, value) VALUES ('version', 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1"
+        )
+        return self._read_version()
+
+    def _seed(self, seed_file):
+        blocked_roads = {}
+        if seed_file and os.path.exists(seed_file):
+            try:
+                with open(seed_file, "r") as file:
+                    blocked_roads = {
+                        key: [make_block(entry["road"], entry.get("path"), entry.get("buffer_m", DEFAULT_BUFFER_M),
+                                         parse_time(entry.get("starts_at")), parse_time(entry.get("ends_at")))
+                              if isinstance(entry, dict) else entry for entry in entries]
+                        for key, entries in json.load(file).items()
+                    }
+            except json.JSONDecodeError:
+                print(f"Error: Invalid JSON format in {seed_file}")
+                blocked_roads = {}
+            except ValueError as e:
+                print(f"Error: Invalid block schedule in {seed_file}: {e}")
+                blocked_roads = {}
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            if self._read_version() is None:  # another process may have seeded meanwhile
+                for key, entries in blocked_roads.items():
+                    for entry in entries:
+                        self._insert(key, entry)
+                self._bump_version()
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def _insert(self, key, entry):
+        road = road_name(entry)
+        path, buffer_m = None, None
+        if isinstance(entry, dict) and entry.get("path"):
+            path, buffer_m = json.dumps(entry["path"]), entry.get("buffer_m", DEFAULT_BUFFER_M)
+        starts_at, ends_at = block_window(entry)
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO blocks (route_key, road_key, road, path, buffer_m, starts_at, ends_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, road.lower(), road, path, buffer_m, starts_at, ends_at),
+        )
+        return cursor.rowcount == 1
+
+    def _reload(self, notify=True):
+        """Rebuild the in-memory state from the database; caller holds the lock."""
+        blocks = {}
+        for key, road, path, buffer_m, starts_at, ends_at in self._db.execute(
+                "SELECT route_key, road, path, buffer_m, starts_at, ends_at FROM blocks ORDER BY id"):
+            entry = make_block(road, json.loads(path) if path else None, buffer_m, starts_at, ends_at)
+            blocks.setdefault(key, {})[road.lower()] = entry
+        if notify:
+            self._pending.extend(diff_blocks(self._blocks, blocks))
+        self._blocks = blocks
+        self._version = self._read_version()
+        self._snapshot = None
+
+    def _file_signature(self):
+        signature = []
+        for suffix in ("", "-wal"):
+            try:
+                st = os.stat(self.path + suffix)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _check_external_changes(self):
+        """Reload if another process committed since our last look; caller holds the lock."""
+        now = self.clock()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        self._signature = signature
+        if self._read_version() != self._version:
+            self._reload()
+
+    # -- public API --------------------------------------------------------
+
+    def snapshot(self):
+        """Return the current Snapshot, rebuilding it only after a change."""
+        with self._lock:
+            self._check_external_changes()
+            if self._snapshot is None:
+                blocked_roads = {key: list(entries.values()) for key, entries in self._blocks.items()}
+                self._snapshot = Snapshot(self._version, blocked_roads)
+            snapshot = self._snapshot
+        self._notify()
+        return snapshot
+
+    def subscribe(self, callback):
+        """Call callback(changes, version) after every change.
+
+        changes is a list of (action, route_key, entry) tuples where action is
+        "block" or "unblock", and version the store version they led to.
+        Changes picked up from another process arrive as one batch that may
+        span several versions. Callbacks run outside the store's lock.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def _notify(self):
+        with self._delivering:
+            with self._lock:
+                if not self._pending:
+                    return
+                changes, self._pending = self._pending, []
+                version = self._version
+                listeners = list(self._listeners)
+            for callback in listeners:
+                callback(changes, version)
+
+    def load(self):
+        """Return the {source_destination: [entries]} mapping (treat as read-only)."""
+        return self.snapshot().blocked_roads
+
+    def block(self, key, road, path=None, buffer_m=DEFAULT_BUFFER_M, starts_at=None, ends_at=None):
+        """Block a road under a route key, optionally only from starts_at until ends_at (epoch seconds).
+
+        Returns False if it was already blocked (scheduled or not). Raises
+        ValueError if the schedule ends before it starts.
+        """
+        entry = make_block(road, path, buffer_m, starts_at, ends_at)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                inserted = self._insert(key, entry)
+                version = self._bump_version() if inserted else None
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            if inserted:
+                self._apply(version, key, road.lower(), entry)
+        self._notify()
+        return inserted
+
+    def unblock(self, key, road):
+        """Unblock a road (case-insensitive) under a route key; returns False if it was not blocked."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._db.execute(
+                    "DELETE FROM blocks WHERE route_key = ? AND road_key = ?", (key, road.lower())
+                )
+                deleted = cursor.rowcount == 1
+                version = self._bump_version() if deleted else None
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            if deleted:
+                self._apply(version, key, road.lower(), None)
+        self._notify()
+        return deleted
+
+    def _apply(self, version, key, road_key, entry):
+        """Apply our own committed change in memory; caller holds the lock."""
+        if self._version is not None and version != self._version + 1:
+            # Someone else wrote in between: resync instead of patching
+            self._reload()
+            return
+        if entry is None:
+            roads = self._blocks.get(key, {})
+            removed = roads.pop(road_key, None)
+            if not roads:
+                self._blocks.pop(key, None)
+            if removed is not None:
+                self._pending.append(("unblock", key, removed))
+        else:
+            self._blocks.setdefault(key, {})[road_key] = entry
+            self._pending.append(("block", key, entry))
+        self._version = version
+        self._snapshot = None
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide store, opening it from config on first use."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = BlockedRoadsStore(
+                config.BLOCKED_ROADS_DB,
+                seed_file=config.BLOCKED_ROADS_SEED_FILE,
+                check_interval=config.BLOCKED_ROADS_CHECK_INTERVAL,
+            )
+        return _default_store
+
+
+def set_store(store):
+    """Replace the process-wide store (e.g. with one on a temporary database)."""
+    global _default_store
+    with _default_store_lock:
+        _default_store = store
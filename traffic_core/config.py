@@ -0,0 +1,132 @@
+"""Shared configuration for the traffic route system.
+
+Every value can be overridden with an environment variable of the same name.
+"""
+import os
+
+# Google API Key (Please replace with your own or set GOOGLE_MAPS_API_KEY)
+API_KEY = os.environ.get("GOOGLE_MAPS_API_KEY", "Add yours")
+
+# Google API endpoints (point them at bench/stub_google.py for load tests)
+GEOCODE_URL = os.environ.get("GEOCODE_URL", "https://maps.googleapis.com/maps/api/geocode/json")
+ROUTES_URL = os.environ.get("ROUTES_URL", "https://routes.googleapis.com/directions/v2:computeRoutes")
+PLACES_URL = os.environ.get("PLACES_URL", "https://maps.googleapis.com/maps/api/place/nearbysearch/json")
+DISTANCE_MATRIX_URL = os.environ.get("DISTANCE_MATRIX_URL", "https://maps.googleapis.com/maps/api/distancematrix/json")
+
+# Geocode cache: in-memory LRU in front of a SQLite file
+GEOCODE_CACHE_FILE = os.environ.get("GEOCODE_CACHE_FILE", "geocode_cache.sqlite3")
+GEOCODE_CACHE_SIZE = int(os.environ.get("GEOCODE_CACHE_SIZE", "1024"))
+GEOCODE_TTL = float(os.environ.get("GEOCODE_TTL", str(30 * 24 * 3600)))
+GEOCODE_NEGATIVE_TTL = float(os.environ.get("GEOCODE_NEGATIVE_TTL", "3600"))
+
+# Outbound HTTP: pooled session, bounded retries with exponential backoff
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "32"))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "2"))
+HTTP_BACKOFF = float(os.environ.get("HTTP_BACKOFF", "0.3"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "3.05"))
+# Worker threads used to run independent outbound calls concurrently
+OUTBOUND_WORKERS = int(os.environ.get("OUTBOUND_WORKERS", "16"))
+
+# Upper bound on Places searches per route when looking for traffic signals
+JUNCTION_MAX_QUERIES = int(os.environ.get("JUNCTION_MAX_QUERIES", "200"))
+
+# Blocked roads: SQLite (WAL) store, seeded once from the JSON file
+BLOCKED_ROADS_DB = os.environ.get("BLOCKED_ROADS_DB", "blocked_roads.sqlite3")
+BLOCKED_ROADS_SEED_FILE = os.environ.get("BLOCKED_ROADS_SEED_FILE", "blocked_roads.json")
+# Seconds between checks for changes made by other processes; also bounds how late
+# the live block feed (/api/blocks/events) pushes them
+BLOCKED_ROADS_CHECK_INTERVAL = float(os.environ.get("BLOCKED_ROADS_CHECK_INTERVAL", "0.5"))
+# Block/unblock events kept for map pages resuming the live feed
+BLOCK_FEED_HISTORY = int(os.environ.get("BLOCK_FEED_HISTORY", "256"))
+# Active-block indexes kept per snapshot for distinct departure windows of scheduled closures
+BLOCK_WINDOW_CACHE_SIZE = int(os.environ.get("BLOCK_WINDOW_CACHE_SIZE", "64"))
+
+# Route cache: computeRoutes responses keyed by rounded coordinates and departure window
+ROUTE_CACHE_TTL = float(os.environ.get("ROUTE_CACHE_TTL", "300"))
+ROUTE_CACHE_SIZE = int(os.environ.get("ROUTE_CACHE_SIZE", "512"))
+# Decimal places kept from lat/lng in the key (4 ~ 11 m)
+ROUTE_CACHE_PRECISION = int(os.environ.get("ROUTE_CACHE_PRECISION", "4"))
+ROUTE_DEPARTURE_BUCKET = int(os.environ.get("ROUTE_DEPARTURE_BUCKET", "300"))
+
+# Routing backend: "google" (Routes API) or "local" (road graph file, no network)
+ROUTING_MODE = os.environ.get("ROUTING_MODE", "google")
+# CSV edge list, GeoJSON LineStrings or an OSM XML extract
+ROAD_GRAPH_FILE = os.environ.get("ROAD_GRAPH_FILE", "road_graph.csv")
+
+# Route choice: cost model of route_ranking.py ("balanced", "fastest", "shortest")
+ROUTE_COST_MODEL = os.environ.get("ROUTE_COST_MODEL", "balanced")
+
+# Travel-time history (traffic_history.py): one binary file per day in TRAFFIC_HISTORY_DIR.
+# Corridors are origin/destination rounded to TRAFFIC_HISTORY_PRECISION decimals.
+TRAFFIC_HISTORY_ENABLED = os.environ.get("TRAFFIC_HISTORY_ENABLED", "1").lower() in ("1", "true", "yes")
+TRAFFIC_HISTORY_DIR = os.environ.get("TRAFFIC_HISTORY_DIR", "traffic_history")
+TRAFFIC_HISTORY_PRECISION = int(os.environ.get("TRAFFIC_HISTORY_PRECISION", "3"))
+TRAFFIC_HISTORY_FLUSH_RECORDS = int(os.environ.get("TRAFFIC_HISTORY_FLUSH_RECORDS", "256"))
+TRAFFIC_HISTORY_FLUSH_SECONDS = float(os.environ.get("TRAFFIC_HISTORY_FLUSH_SECONDS", "5"))
+# Observations a time bucket needs before predictions use it; period of the admin trends
+TRAFFIC_HISTORY_MIN_SAMPLES = int(os.environ.get("TRAFFIC_HISTORY_MIN_SAMPLES", "3"))
+TRAFFIC_HISTORY_TREND_DAYS = int(os.environ.get("TRAFFIC_HISTORY_TREND_DAYS", "7"))
+
+# Batch routing (batch_routing.py, POST /api/batch): worker threads per batch, pairs per
+# Distance Matrix window in "eta" mode, and distinct place names remembered per batch
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+BATCH_WINDOW = int(os.environ.get("BATCH_WINDOW", "500"))
+BATCH_GEOCODE_MEMO = int(os.environ.get("BATCH_GEOCODE_MEMO", "10000"))
+
+# Corridor warmer (warmer.py): keeps routes, GeoJSON and traffic signals of popular corridors
+# precomputed. Corridors come from WARM_CORRIDORS_FILE (JSON list of [source, destination]),
+# else from the blocked roads' route keys. Each one is refreshed every WARM_INTERVAL seconds,
+# the visits spread over the interval, with at most WARM_RATE upstream calls per second
+WARMER_ENABLED = os.environ.get("WARMER_ENABLED", "0").lower() in ("1", "true", "yes")
+WARM_CORRIDORS_FILE = os.environ.get("WARM_CORRIDORS_FILE", "warm_corridors.json")
+WARM_INTERVAL = float(os.environ.get("WARM_INTERVAL", str(ROUTE_DEPARTURE_BUCKET)))
+WARM_RATE = float(os.environ.get("WARM_RATE", "1"))
+# Signals along a warm route are searched again after this many seconds (0: not warmed)
+WARM_JUNCTION_TTL = float(os.environ.get("WARM_JUNCTION_TTL", str(24 * 3600)))
+# Snapshot written by the warmer and memory-mapped at startup (empty: none)
+WARM_SNAPSHOT_FILE = os.environ.get("WARM_SNAPSHOT_FILE", "warm_snapshot.json")
+
+# Per-request cProfile (instrumentation.py): "off", "header" (requests sending X-Profile: 1)
+# or "all"; profiles are saved to PROFILE_DIR
+PROFILING = os.environ.get("PROFILING", "off")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+# Map page: "client" (static page drawing /api/route GeoJSON) or "folium" (server-side HTML)
+MAP_RENDERER = os.environ.get("MAP_RENDERER", "client")
+# Browser cache lifetime of /api/route responses, in seconds
+ROUTE_API_MAX_AGE = int(os.environ.get("ROUTE_API_MAX_AGE", "60"))
+# Zoom levels with a precomputed level of detail for route lines; past the last one the
+# full polyline is sent. ROUTE_LOD_PIXELS is the allowed on-screen error at each level.
+ROUTE_LOD_ZOOMS = tuple(int(z) for z in os.environ.get("ROUTE_LOD_ZOOMS", "5,8,11,14").split(","))
+ROUTE_LOD_PIXELS = float(os.environ.get("ROUTE_LOD_PIXELS", "1.0"))
+
+# Flask debug mode for `python app.py` (never on in production)
+DEBUG = os.environ.get("FLASK_DEBUG", "0").lower() in ("1", "true", "yes")
+# ASGI serving mode (asgi.py): server processes, bind address, threads for CPU-bound work
+ASGI_WORKERS = int(os.environ.get("ASGI_WORKERS", str(os.cpu_count() or 1)))
+ASGI_HOST = os.environ.get("ASGI_HOST", "0.0.0.0")
+ASGI_PORT = int(os.environ.get("ASGI_PORT", "8000"))
+ASGI_CPU_THREADS = int(os.environ.get("ASGI_CPU_THREADS", "4"))
+
+# Parking detection: video source (camera index or file/stream URL) and slot layout
+PARKING_VIDEO_SOURCE = os.environ.get("PARKING_VIDEO_SOURCE", "carPark.mp4")
+PARKING_SLOTS_FILE = os.environ.get("PARKING_SLOTS_FILE", "parking_slots.json")
+PARKING_OCCUPIED_RATIO = float(os.environ.get("PARKING_OCCUPIED_RATIO", "0.12"))
+PARKING_JPEG_QUALITY = int(os.environ.get("PARKING_JPEG_QUALITY", "80"))
+# Optional JSON list of cameras ({"cameras": [{"id", "source", "slots_file"}]});
+# without it the single camera above is used
+PARKING_CAMERAS_FILE = os.environ.get("PARKING_CAMERAS_FILE", "parking_cameras.json")
+# Threads running detection and JPEG encoding, shared by all cameras
+PARKING_DETECTION_WORKERS = int(os.environ.get("PARKING_DETECTION_WORKERS", "2"))
+# Occupancy changes: a slot flips only when its edge ratio is PARKING_HYSTERESIS past the
+# threshold for PARKING_DEBOUNCE_FRAMES processed frames in a row
+PARKING_HYSTERESIS = float(os.environ.get("PARKING_HYSTERESIS", "0.03"))
+PARKING_DEBOUNCE_FRAMES = int(os.environ.get("PARKING_DEBOUNCE_FRAMES", "5"))
+# Motion gating: re-evaluate only slots whose downscaled pixels changed by more than
+# PARKING_MOTION_THRESHOLD gray levels over PARKING_MOTION_FRACTION of their area, and
+# skip encoding static frames; every PARKING_FULL_REFRESH_FRAMES all slots are re-evaluated
+PARKING_MOTION_GATING = os.environ.get("PARKING_MOTION_GATING", "0").lower() in ("1", "true", "yes")
+PARKING_MOTION_SCALE = float(os.environ.get("PARKING_MOTION_SCALE", "0.25"))
+PARKING_MOTION_THRESHOLD = int(os.environ.get("PARKING_MOTION_THRESHOLD", "20"))
+PARKING_MOTION_FRACTION = float(os.environ.get("PARKING_MOTION_FRACTION", "0.02"))
+PARKING_FULL_REFRESH_FRAMES = int(os.environ.get("PARKING_FULL_REFRESH_FRAMES", "250"))
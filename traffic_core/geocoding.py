@@ -0,0 +1,299 @@
+"""Shared geocoding layer.
+
+Place names are normalized and looked up in an in-memory LRU first, then in a
+SQLite file, and only then sent to the geocoder. Successful lookups are kept
+for GEOCODE_TTL seconds, failed ones ("no such place") for GEOCODE_NEGATIVE_TTL.
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from traffic_core import config, http_client, instrumentation
+
+GEOCODE_URL = config.GEOCODE_URL
+
+# Statuses that mean "this address does not resolve" and are safe to cache
+NEGATIVE_STATUSES = ("ZERO_RESULTS", "INVALID_REQUEST")
+
+
+class GeocodeError(Exception):
+    """Raised by a geocoder when a lookup failed for a transient reason."""
+
+
+def normalize_key(location_name):
+    """Normalize a place name so that 'Chennai ', 'chennai' and 'CHENNAI' share an entry."""
+    return " ".join(location_name.lower().split())
+
+
+def _parse_geocode(geo_data):
+    """(lat, lng) from a Geocoding API response, None for no result, GeocodeError otherwise."""
+    if geo_data['status'] == "OK":
+        location = geo_data['results'][0]['geometry']['location']
+        return location['lat'], location['lng']
+    if geo_data['status'] in NEGATIVE_STATUSES:
+        return None
+    raise GeocodeError(geo_data['status'])
+
+
+def google_geocoder(location_name):
+    """Fetch (lat, lng) from the Google Geocoding API.
+
+    Returns None when the address has no result and raises GeocodeError for
+    anything that should not be cached (quota, auth, transport errors).
+    """
+    try:
+        response = http_client.get("geocode", GEOCODE_URL, params={"address": location_name, "key": config.API_KEY})
+        geo_data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        raise GeocodeError(str(e)) from e
+    return _parse_geocode(geo_data)
+
+
+async def google_geocoder_async(location_name):
+    """google_geocoder on the async HTTP client."""
+    import httpx
+
+    try:
+        response = await http_client.aget("geocode", GEOCODE_URL, params={"address": location_name, "key": config.API_KEY})
+        geo_data = response.json()
+    except (httpx.HTTPError, ValueError) as e:
+        raise GeocodeError(str(e)) from e
+    return _parse_geocode(geo_data)
+
+
+class GeocodeCache:
+    """Two-level (memory LRU + SQLite) cache in front of a geocoder callable.
+
+    Args:
+    - path: SQLite file, ":memory:" or None to disable the disk level
+    - max_entries: size of the in-memory LRU
+    - ttl / negative_ttl: lifetime in seconds of found / not-found entries
+    - geocoder: callable(location_name) -> (lat, lng) | None, may raise GeocodeError
+    - async_geocoder: coroutine function with the same contract, used by
+      get_coordinates_async; None runs `geocoder` in a worker thread instead
+    - clock: time source, injectable for tests
+    """
+
+    def __init__(self, path=None, max_entries=1024, ttl=30 * 24 * 3600,
+                 negative_ttl=3600, geocoder=google_geocoder, async_geocoder=None, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.geocoder = geocoder
+        self.async_geocoder = async_geocoder
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (expires_at, (lat, lng) or None)
+        self._stats = {"hits": 0, "misses": 0, "disk_hits": 0,
+                       "negative_hits": 0, "errors": 0}
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                "key TEXT PRIMARY KEY, lat REAL, lng REAL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _remember(self, key, expires_at, coords):
+        self._memory[key] = (expires_at, coords)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _lookup_cached(self, key, now):
+        """Return (found, coords) from memory or disk; caller holds the lock."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                return True, entry[1]
+            del self._memory[key]
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT lat, lng, expires_at FROM geocode WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[2] > now:
+                coords = (row[0], row[1]) if row[0] is not None else None
+                self._remember(key, row[2], coords)
+                self._stats["disk_hits"] += 1
+                return True, coords
+        return False, None
+
+    def _store(self, key, coords, now):
+        expires_at = now + (self.ttl if coords is not None else self.negative_ttl)
+        with self._lock:
+            self._remember(key, expires_at, coords)
+            if self._db is not None:
+                lat, lng = coords if coords is not None else (None, None)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO geocode (key, lat, lng, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, lat, lng, expires_at),
+                )
+                self._db.commit()
+
+    def _check(self, key, now):
+        """Look a key up and count the hit or miss; returns (found, coords)."""
+        with self._lock:
+            found, coords = self._lookup_cached(key, now)
+            if found:
+                self._stats["hits"] += 1
+                if coords is None:
+                    self._stats["negative_hits"] += 1
+            else:
+                self._stats["misses"] += 1
+        return found, coords
+
+    def _failed(self, location_name, error):
+        with self._lock:
+            self._stats["errors"] += 1
+        print(f"Error fetching coordinates for {location_name}: {error}")
+        return None, None
+
+    def get_coordinates(self, location_name):
+        """Return (lat, lng) for a place name, or (None, None) if it cannot be resolved."""
+        key = normalize_key(location_name)
+        now = self.clock()
+        found, coords = self._check(key, now)
+        if not found:
+            try:
+                coords = self.geocoder(location_name)
+            except GeocodeError as e:
+                return self._failed(location_name, e)
+            self._store(key, coords, now)
+        return coords if coords is not None else (None, None)
+
+    async def get_coordinates_async(self, location_name):
+        """get_coordinates for event-loop callers: a miss awaits the async geocoder.
+
+        The memory/SQLite lookup and the write-back hold the cache lock and may
+        touch disk, so they run in a worker thread rather than on the loop.
+        """
+        key = normalize_key(location_name)
+        now = self.clock()
+        found, coords = await asyncio.to_thread(self._check, key, now)
+        if not found:
+            try:
+                if self.async_geocoder is not None:
+                    coords = await self.async_geocoder(location_name)
+                else:
+                    coords = await asyncio.to_thread(self.geocoder, location_name)
+            except GeocodeError as e:
+                return self._failed(location_name, e)
+            await asyncio.to_thread(self._store, key, coords, now)
+        return coords if coords is not None else (None, None)
+
+    def expires_at(self, location_name):
+        """When the cached answer for a place name expires (memory or disk), or None if it is not cached."""
+        key = normalize_key(location_name)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                return entry[0]
+            if self._db is not None:
+                row = self._db.execute("SELECT expires_at FROM geocode WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    return row[0]
+        return None
+
+    def seed(self, location_name, coords, expires_at):
+        """Remember (lat, lng) found elsewhere (e.g. a warm snapshot) in memory until expires_at.
+
+        Names already cached keep their entry, and nothing is written to disk,
+        so seeding never extends an expiry.
+        """
+        key = normalize_key(location_name)
+        now = self.clock()
+        if expires_at is None or expires_at <= now:
+            return
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                return
+            if self._db is not None and self._db.execute(
+                    "SELECT 1 FROM geocode WHERE key = ? AND expires_at > ?", (key, now)).fetchone():
+                return
+            self._remember(key, expires_at, tuple(coords))
+
+    def purge_expired(self):
+        """Drop expired rows from memory and disk."""
+        now = self.clock()
+        with self._lock:
+            for key in [k for k, (expires_at, _) in self._memory.items() if expires_at <= now]:
+                del self._memory[key]
+            if self._db is not None:
+                self._db.execute("DELETE FROM geocode WHERE expires_at <= ?", (now,))
+                self._db.commit()
+
+    def stats(self):
+        """Return a copy of the hit/miss counters plus the current memory size."""
+        with self._lock:
+            return dict(self._stats, size=len(self._memory))
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide cache, creating it from config on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = GeocodeCache(
+                path=config.GEOCODE_CACHE_FILE,
+                max_entries=config.GEOCODE_CACHE_SIZE,
+                ttl=config.GEOCODE_TTL,
+                negative_ttl=config.GEOCODE_NEGATIVE_TTL,
+                async_geocoder=google_geocoder_async,
+            )
+        return _default_cache
+
+
+def _cache_metrics():
+    cache = _default_cache
+    if cache is None:
+        return []
+    stats = cache.stats()
+    # disk_hits and negative_hits are subsets of hits, so they get counters of their own
+    return [("geocode_cache_lookups_total", {"result": name}, stats[name], "counter")
+            for name in ("hits", "misses", "errors")] + \
+        [("geocode_cache_disk_hits_total", {}, stats["disk_hits"], "counter"),
+         ("geocode_cache_negative_hits_total", {}, stats["negative_hits"], "counter"),
+         ("geocode_cache_entries", {}, stats["size"], "gauge")]
+
+
+instrumentation.add_collector(_cache_metrics)
+instrumentation.describe("geocode_cache_disk_hits_total", "Geocode cache hits served from SQLite (part of hits).")
+instrumentation.describe("geocode_cache_negative_hits_total", "Geocode cache hits on a remembered failure (part of hits).")
+
+
+def set_cache(cache):
+    """Replace the process-wide cache (e.g. with one wrapping a stub geocoder)."""
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = cache
+
+
+def get_coordinates(location_name):
+    """Fetch latitude and longitude for a given location through the shared cache."""
+    return get_cache().get_coordinates(location_name)
+
+
+def get_coordinates_many(location_names):
+    """Resolve several place names concurrently; returns a list of (lat, lng) pairs in order."""
+    cache = get_cache()
+    with instrumentation.span("geocode"):
+        return http_client.fan_out(cache.get_coordinates, location_names)
+
+
+async def get_coordinates_many_async(location_names):
+    """Resolve several place names concurrently on the event loop."""
+    cache = get_cache()
+    with instrumentation.span("geocode"):
+        return await asyncio.gather(*(cache.get_coordinates_async(name) for name in location_names))
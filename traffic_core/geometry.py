@@ -0,0 +1,291 @@
+"""NumPy-backed route geometry.
+
+RouteGeometry wraps an (N, 2) float64 array of lat/lng vertices. Encoded
+polylines are decoded straight into that array without building per-point
+Python tuples, and distance, midpoint, resampling, bbox and Douglas-Peucker
+simplification are all vectorized.
+
+For drawing at several zoom levels a route computes its per-vertex
+Douglas-Peucker significance once; every level of detail after that is a
+boolean mask (see RouteGeometry.lod).
+"""
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+# Web Mercator ground resolution at zoom 0 on the equator, meters per pixel (256 px tiles)
+METERS_PER_PIXEL_Z0 = 2 * np.pi * EARTH_RADIUS_M / 256
+# Below this deviation (meters) vertices are only drawn at full detail
+MIN_SIGNIFICANCE_M = 0.5
+SMALL_SPAN = 32
+# Whole-route levels of detail kept per geometry (one per configured zoom level)
+MAX_CACHED_LODS = 8
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters; works on scalars and NumPy arrays."""
+    lat1, lng1, lat2, lng2 = (np.radians(v) for v in (lat1, lng1, lat2, lng2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def decode_polyline(encoded, precision=5):
+    """Decode a Google encoded polyline into an (N, 2) lat/lng float array.
+
+    Every character carries 5 bits of a value and a continuation flag (0x20);
+    the characters are split into values with cumulative sums, the 5-bit
+    groups of each value are summed with np.add.reduceat, zig-zag decoded,
+    and the per-axis deltas are accumulated.
+    """
+    if not encoded:
+        return np.empty((0, 2))
+    chars = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    is_last = (chars & 0x20) == 0
+    starts = np.flatnonzero(np.concatenate(([True], is_last[:-1])))
+    position = np.arange(len(chars)) - np.repeat(starts, np.diff(np.append(starts, len(chars))))
+    values = np.add.reduceat((chars & 0x1F) << (5 * position), starts)
+    values = np.where(values & 1, ~(values >> 1), values >> 1)
+    if len(values) % 2:
+        raise ValueError("Encoded polyline has an odd number of values")
+    coords = np.cumsum(values.reshape(-1, 2), axis=0) / (10 ** precision)
+    return coords
+
+
+def meters_per_pixel(zoom, lat):
+    """Ground size of one map pixel at a zoom level and latitude."""
+    return METERS_PER_PIXEL_Z0 * np.cos(np.radians(lat)) / (2 ** zoom)
+
+
+def _perpendicular_distances(points, start, end):
+    """Distance from each point to the segment start-end, in the points' units."""
+    direction = end - start
+    length_sq = float(direction @ direction)
+    if length_sq == 0.0:
+        return np.hypot(*(points - start).T)
+    t = np.clip(((points - start) @ direction) / length_sq, 0.0, 1.0)
+    projection = start + t[:, None] * direction
+    return np.hypot(*(points - projection).T)
+
+
+def douglas_peucker_mask(xy, tolerance):
+    """Boolean mask of the vertices kept by Douglas-Peucker on planar (N, 2) points."""
+    n = len(xy)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        distances = _perpendicular_distances(xy[first + 1:last], xy[first], xy[last])
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return keep
+
+
+def douglas_peucker_significance(xy, min_tolerance=MIN_SIGNIFICANCE_M):
+    """Per-vertex tolerance up to which Douglas-Peucker keeps each vertex.
+
+    Douglas-Peucker with tolerance t keeps exactly the vertices whose
+    significance is > t: a vertex is kept when its own split distance and
+    those of all the splits above it exceed t, so its significance is the
+    minimum along that chain. Ends are infinite; segments that deviate less
+    than `min_tolerance` are not split further and their vertices get 0.
+
+    Most splits happen on short spans where NumPy call overhead dominates,
+    so spans of up to SMALL_SPAN vertices are scanned in plain Python.
+    """
+    n = len(xy)
+    if n == 0:
+        return np.zeros(0)
+    x, y = xy[:, 0], xy[:, 1]
+    xs, ys = x.tolist(), y.tolist()
+    significance = [0.0] * n
+    stack = [(0, n - 1, float("inf"))]
+    while stack:
+        first, last, parent = stack.pop()
+        if last - first < 2:
+            continue
+        x0, y0 = xs[first], ys[first]
+        dx, dy = xs[last] - x0, ys[last] - y0
+        length_sq = dx * dx + dy * dy
+        if last - first <= SMALL_SPAN:
+            best, split = -1.0, first
+            for k in range(first + 1, last):
+                px, py = xs[k] - x0, ys[k] - y0
+                if length_sq:
+                    t = min(max((px * dx + py * dy) / length_sq, 0.0), 1.0)
+                    px, py = px - t * dx, py - t * dy
+                d_sq = px * px + py * py
+                if d_sq > best:
+                    best, split = d_sq, k
+        else:
+            px, py = x[first + 1:last] - x0, y[first + 1:last] - y0
+            if length_sq:
+                t = np.clip((px * dx + py * dy) / length_sq, 0.0, 1.0)
+                px, py = px - t * dx, py - t * dy
+            d_sq = px * px + py * py
+            i = int(d_sq.argmax())
+            best, split = float(d_sq[i]), first + 1 + i
+        distance = best ** 0.5
+        if distance <= min_tolerance:
+            continue
+        value = min(distance, parent)
+        significance[split] = value
+        stack.append((first, split, value))
+        stack.append((split, last, value))
+    significance = np.array(significance)
+    significance[0] = significance[-1] = np.inf
+    return significance
+
+
+class RouteGeometry:
+    """Immutable polyline of (lat, lng) vertices backed by a float64 array."""
+
+    __slots__ = ("coords", "_cumulative", "_significance", "_lods")
+
+    def __init__(self, coords):
+        coords = np.array(coords, dtype=np.float64).reshape(-1, 2)
+        coords.flags.writeable = False
+        self.coords = coords
+        self._cumulative = None
+        self._significance = None
+        self._lods = {}
+
+    @classmethod
+    def wrap(cls, coords, significance=None):
+        """Geometry over an existing read-only (N, 2) array, without copying it.
+
+        Used for the memory-mapped warm snapshot; significance is the array's
+        precomputed douglas_peucker_significance, if known.
+        """
+        geometry = cls.__new__(cls)
+        geometry.coords = coords
+        geometry._cumulative = None
+        geometry._significance = significance
+        geometry._lods = {}
+        return geometry
+
+    @classmethod
+    def from_encoded(cls, encoded, precision=5):
+        """Decode an encoded polyline."""
+        return cls(decode_polyline(encoded, precision))
+
+    def __len__(self):
+        return len(self.coords)
+
+    def __getitem__(self, index):
+        return self.coords[index]
+
+    def __array__(self, dtype=None, copy=None):
+        return self.coords if dtype is None else self.coords.astype(dtype)
+
+    def tolist(self):
+        """[[lat, lng], ...] for consumers that need plain lists (folium, JSON)."""
+        return self.coords.tolist()
+
+    @property
+    def start(self):
+        return self.coords[0]
+
+    @property
+    def end(self):
+        return self.coords[-1]
+
+    def segment_lengths(self):
+        """(N-1,) haversine length of every segment in meters."""
+        c = self.coords
+        return haversine_m(c[:-1, 0], c[:-1, 1], c[1:, 0], c[1:, 1])
+
+    def cumulative_distance(self):
+        """(N,) distance in meters from the first vertex to every vertex."""
+        if self._cumulative is None:
+            cumulative = np.concatenate(([0.0], np.cumsum(self.segment_lengths())))
+            cumulative.flags.writeable = False
+            self._cumulative = cumulative
+        return self._cumulative
+
+    @property
+    def length_m(self):
+        """Total length in meters."""
+        return float(self.cumulative_distance()[-1]) if len(self.coords) else 0.0
+
+    def point_at(self, distances):
+        """Interpolate lat/lng at one or more distances (meters) along the route."""
+        cumulative = self.cumulative_distance()
+        distances = np.asarray(distances, dtype=float)
+        lat = np.interp(distances, cumulative, self.coords[:, 0])
+        lng = np.interp(distances, cumulative, self.coords[:, 1])
+        return np.stack((lat, lng), axis=-1)
+
+    def midpoint(self):
+        """Point halfway along the route by distance (not by vertex count)."""
+        return self.point_at(self.length_m / 2)
+
+    def resample(self, spacing):
+        """Points every `spacing` meters along the route, including both ends."""
+        if len(self.coords) < 2:
+            return self.coords.copy()
+        total = self.length_m
+        targets = np.append(np.arange(0.0, total, spacing), total)
+        return self.point_at(targets)
+
+    def bbox(self):
+        """[min_lat, min_lng, max_lat, max_lng]."""
+        return np.concatenate((self.coords.min(axis=0), self.coords.max(axis=0)))
+
+    def projected(self):
+        """Vertices as planar meters (local equirectangular projection around the route)."""
+        lat0 = np.radians(self.coords[:, 0].mean())
+        y = np.radians(self.coords[:, 0]) * EARTH_RADIUS_M
+        x = np.radians(self.coords[:, 1]) * EARTH_RADIUS_M * np.cos(lat0)
+        return np.column_stack((x, y))
+
+    def simplify(self, tolerance_m):
+        """Douglas-Peucker simplification with a tolerance in meters."""
+        if len(self.coords) < 3 or tolerance_m <= 0:
+            return self
+        return RouteGeometry(self.coords[douglas_peucker_mask(self.projected(), tolerance_m)])
+
+    def significance(self):
+        """(N,) Douglas-Peucker significance of every vertex in meters, computed once."""
+        if self._significance is None:
+            significance = douglas_peucker_significance(self.projected())
+            significance.flags.writeable = False
+            self._significance = significance
+        return self._significance
+
+    def lod(self, tolerance_m, start=0, stop=None, cache=False):
+        """Level of detail for a tolerance in meters, optionally of the vertex slice [start:stop].
+
+        Uses the precomputed significance, so each level costs one comparison.
+        With cache=True a whole-route level is kept for reuse; pass it only for
+        the fixed zoom levels, never for caller-chosen tolerances. At most
+        MAX_CACHED_LODS levels are kept. A tolerance <= 0 is full detail.
+        """
+        whole = start == 0 and stop is None
+        if tolerance_m <= 0 or len(self.coords) < 3:
+            return self if whole else RouteGeometry(self.coords[start:stop])
+        cache = cache and whole
+        if cache:
+            level = self._lods.get(tolerance_m)
+            if level is not None:
+                return level
+        keep = self.significance()[start:stop] > tolerance_m
+        if len(keep):
+            keep[0] = keep[-1] = True
+        level = RouteGeometry(self.coords[start:stop][keep])
+        if cache:
+            # Copy and swap: geometries are shared between request threads by the route cache
+            lods = dict(self._lods)
+            if len(lods) >= MAX_CACHED_LODS:
+                lods.pop(next(iter(lods), None), None)
+            lods[tolerance_m] = level
+            self._lods = lods
+        return level
@@ -0,0 +1,186 @@
+"""Outbound HTTP client shared by every Google API call.
+
+All requests go through one pooled requests.Session with per-endpoint
+timeouts and bounded retries (exponential backoff on connection errors,
+429 and 5xx). Independent calls can be run concurrently with fan_out().
+
+The ASGI app (asgi.py) uses aget()/apost() instead: the same timeouts and
+retry policy on a pooled httpx.AsyncClient, so waiting on Google holds no
+thread. httpx is only imported when those are first used.
+
+Every call is counted by endpoint and status, and timed, in instrumentation.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from traffic_core import config, instrumentation
+
+# Read timeout in seconds per endpoint; computeRoutes is the slowest of them
+READ_TIMEOUTS = {
+    "geocode": 5,
+    "routes": 10,
+    "places": 5,
+    "distancematrix": 5,
+}
+DEFAULT_READ_TIMEOUT = 10
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+WORKER_PREFIX = "outbound"
+
+_session = None
+_session_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _build_session():
+    retry = Retry(
+        total=config.HTTP_RETRIES,
+        connect=config.HTTP_RETRIES,
+        read=config.HTTP_RETRIES,
+        status=config.HTTP_RETRIES,
+        backoff_factor=config.HTTP_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "POST"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=config.HTTP_POOL_SIZE,
+                          pool_maxsize=config.HTTP_POOL_SIZE,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    """Return the process-wide pooled session."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _build_session()
+        return _session
+
+
+def timeout_for(endpoint):
+    """Return the (connect, read) timeout tuple for an endpoint name."""
+    return config.HTTP_CONNECT_TIMEOUT, READ_TIMEOUTS.get(endpoint, DEFAULT_READ_TIMEOUT)
+
+
+def _record(endpoint, start, status):
+    instrumentation.observe("outbound_seconds", time.perf_counter() - start, endpoint=endpoint)
+    instrumentation.count("outbound_requests_total", endpoint=endpoint, status=status)
+
+
+def _send(endpoint, method, url, **kwargs):
+    kwargs.setdefault("timeout", timeout_for(endpoint))
+    start = time.perf_counter()
+    status = "error"
+    try:
+        response = get_session().request(method, url, **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        _record(endpoint, start, status)
+
+
+def get(endpoint, url, **kwargs):
+    """GET through the shared session with the endpoint's timeout."""
+    return _send(endpoint, "GET", url, **kwargs)
+
+
+def post(endpoint, url, **kwargs):
+    """POST through the shared session with the endpoint's timeout."""
+    return _send(endpoint, "POST", url, **kwargs)
+
+
+_async_clients = {}
+
+
+def get_async_client():
+    """Return the pooled httpx.AsyncClient of the running event loop."""
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        limits = httpx.Limits(max_connections=config.HTTP_POOL_SIZE,
+                              max_keepalive_connections=config.HTTP_POOL_SIZE)
+        client = _async_clients[loop] = httpx.AsyncClient(limits=limits)
+    return client
+
+
+async def close_async_client():
+    """Close the running loop's client (on server shutdown)."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def arequest(endpoint, method, url, **kwargs):
+    """Send a request on the async client with the endpoint's timeout and the retry policy.
+
+    Transport errors and RETRY_STATUSES are retried up to HTTP_RETRIES times
+    with exponential backoff; the last response is returned (or the last
+    httpx error raised) like the sync session does.
+    """
+    import httpx
+
+    connect, read = timeout_for(endpoint)
+    kwargs.setdefault("timeout", httpx.Timeout(read, connect=connect))
+    client = get_async_client()
+    start = time.perf_counter()
+    status = "error"
+    try:
+        for attempt in range(config.HTTP_RETRIES + 1):
+            last_attempt = attempt == config.HTTP_RETRIES
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                if last_attempt:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    status = response.status_code
+                    return response
+            await asyncio.sleep(config.HTTP_BACKOFF * (2 ** attempt))
+    finally:
+        _record(endpoint, start, status)
+
+
+async def aget(endpoint, url, **kwargs):
+    """Async GET with the endpoint's timeout."""
+    return await arequest(endpoint, "GET", url, **kwargs)
+
+
+async def apost(endpoint, url, **kwargs):
+    """Async POST with the endpoint's timeout."""
+    return await arequest(endpoint, "POST", url, **kwargs)
+
+
+def get_executor():
+    """Return the shared worker pool for outbound calls."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=config.OUTBOUND_WORKERS,
+                                           thread_name_prefix=WORKER_PREFIX)
+        return _executor
+
+
+def fan_out(fn, items):
+    """Call fn on every item concurrently and return the results in order.
+
+    When called from one of the pool's own threads the calls run inline, so
+    nested fan-outs can never deadlock by waiting on a saturated pool.
+    """
+    items = list(items)
+    if len(items) < 2 or threading.current_thread().name.startswith(WORKER_PREFIX):
+        return [fn(item) for item in items]
+    return list(get_executor().map(fn, items))
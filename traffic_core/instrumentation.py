@@ -0,0 +1,213 @@
+"""Request-path timing, counters and an opt-in per-request profiler.
+
+Stages are timed with span():
+
+    with span("geocode"):
+        ...
+
+which adds the elapsed wall time to the traffic_stage_seconds histogram of
+that stage. count() bumps a labelled counter (outbound calls by endpoint and
+status, requests by view). Cache hit/miss numbers are not counted twice:
+collectors registered with add_collector() read the caches' own stats() when
+/metrics is scraped. render_metrics() writes everything in the Prometheus
+text format. Every process (and every ASGI worker) has its own registry.
+
+A span costs about 2 microseconds (two perf_counter() calls and a short
+locked update), so it stays on in production. The profiler is off unless PROFILING is "header" (requests
+sending X-Profile: 1 are profiled) or "all". A profiled request runs under
+cProfile; its stats are written to PROFILE_DIR and the top functions are
+printed. Only one request is profiled at a time, others run normally.
+"""
+import cProfile
+import functools
+import io
+import os
+import pstats
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from traffic_core import config
+
+PREFIX = "traffic_"
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILE_HEADER = "X-Profile"
+PROFILE_TOP = 15
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bucket counts..., count, sum]
+_counters = {}  # (name, labels) -> value
+_help = {}
+_collectors = []
+_profile_lock = threading.Lock()
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def describe(name, text):
+    """HELP text of a metric (without the prefix)."""
+    _help[name] = text
+
+
+def observe(name, seconds, **labels):
+    """Add one observation to a histogram."""
+    _observe((name, _labels(labels)), seconds)
+
+
+def _observe(key, seconds):
+    index = bisect_left(BUCKETS, seconds)
+    with _lock:
+        values = _histograms.get(key)
+        if values is None:
+            values = _histograms[key] = [0] * (len(BUCKETS) + 2) + [0.0]
+        values[index] += 1
+        values[-2] += 1
+        values[-1] += seconds
+
+
+def count(name, amount=1, **labels):
+    """Increase a counter."""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+class span:
+    """Time the enclosed block as one observation of traffic_stage_seconds{stage=...}."""
+
+    __slots__ = ("labels", "start")
+
+    def __init__(self, stage):
+        self.labels = (("stage", stage),)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _observe(("stage_seconds", self.labels), time.perf_counter() - self.start)
+
+
+def timed(stage):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def add_collector(collect):
+    """Register collect() -> iterable of (name, labels dict, value, type) read at every scrape."""
+    _collectors.append(collect)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {key: list(values) for key, values in _histograms.items()}
+        counters = dict(_counters)
+    samples = {}  # name -> (type, [lines])
+
+    def add(name, kind, line):
+        samples.setdefault(name, (kind, []))[1].append(line)
+
+    for (name, labels), values in sorted(counters.items()):
+        add(name, "counter", f"{PREFIX}{name}{_format_labels(labels)} {values}")
+    for (name, labels), values in sorted(histograms.items()):
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS + ("+Inf",), values):
+            cumulative += bucket
+            add(name, "histogram", f"{PREFIX}{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+        add(name, "histogram", f"{PREFIX}{name}_count{_format_labels(labels)} {values[-2]}")
+        add(name, "histogram", f"{PREFIX}{name}_sum{_format_labels(labels)} {values[-1]:.6f}")
+    for collect in _collectors:
+        try:
+            for name, labels, value, kind in collect():
+                add(name, kind, f"{PREFIX}{name}{_format_labels(_labels(labels))} {value}")
+        except Exception as e:
+            print(f"Error collecting metrics: {e}")
+
+    out = []
+    for name, (kind, lines) in samples.items():
+        if name in _help:
+            out.append(f"# HELP {PREFIX}{name} {_help[name]}")
+        out.append(f"# TYPE {PREFIX}{name} {kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+def reset():
+    """Drop every recorded value (collectors stay registered)."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+# -- profiler ---------------------------------------------------------------
+
+def wants_profile(headers):
+    """Whether a request with these headers should be profiled under PROFILING."""
+    if config.PROFILING == "all":
+        return True
+    return config.PROFILING == "header" and headers.get(PROFILE_HEADER, "") not in ("", "0")
+
+
+def start_profile(headers):
+    """Start a cProfile for this request if asked and none is running; returns it or None."""
+    if not wants_profile(headers) or not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiler is active in this interpreter
+        _profile_lock.release()
+        return None
+    return profiler
+
+
+def stop_profile(profiler):
+    """Stop a profile from start_profile(), on the thread that started it."""
+    profiler.disable()
+    _profile_lock.release()
+
+
+def save_profile(profiler, name):
+    """Write a stopped profile to PROFILE_DIR, print its top functions and return the file path."""
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() // 1000000 % 1000:03d}"
+    path = os.path.join(config.PROFILE_DIR, f"{stamp}-{re.sub(r'[^A-Za-z0-9]+', '_', name)}.prof")
+    profiler.dump_stats(path)
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(PROFILE_TOP)
+    print(f"Profile of {name} saved to {path}\n{summary.getvalue()}")
+    return path
+
+
+def finish_profile(profiler, name):
+    """stop_profile() then save_profile(); returns the file path."""
+    stop_profile(profiler)
+    return save_profile(profiler, name)
+
+
+describe("stage_seconds", "Wall time of request-path stages.")
+describe("outbound_requests_total", "Outbound Google API calls by endpoint and HTTP status.")
+describe("outbound_seconds", "Latency of outbound Google API calls.")
+describe("http_requests_total", "Requests served by view and status.")
+describe("http_request_seconds", "Time to produce a response by view.")
@@ -0,0 +1,100 @@
+"""Static interval tree over the validity windows of scheduled blocks.
+
+Each interval is a half-open [start, end) window in epoch seconds; None
+means open-ended (always started / never ending). The tree is a centered
+interval tree: every node keeps the intervals containing its center twice,
+sorted by start and by end, so a query visits O(log n) nodes and takes a
+contiguous slice at each one instead of scanning every closure.
+
+A window query [t0, t1] returns the intervals with start <= t1 and
+end > t0, i.e. the blocks active at some moment of the window; t1 = t0 asks
+about a single instant.
+"""
+import numpy as np
+
+INF = float("inf")
+
+
+def _bounds(start, end):
+    return -INF if start is None else float(start), INF if end is None else float(end)
+
+
+class _Node:
+    __slots__ = ("center", "by_start", "starts", "by_end", "ends", "left", "right")
+
+
+class IntervalTree:
+    """Intervals given as (start, end) pairs, identified by their position."""
+
+    def __init__(self, intervals=()):
+        bounds = [_bounds(start, end) for start, end in intervals]
+        self.starts = np.array([b[0] for b in bounds], dtype=float)
+        self.ends = np.array([b[1] for b in bounds], dtype=float)
+        # Sorted copies to tell whether two windows see the same active set
+        self._sorted_starts = np.sort(self.starts)
+        self._sorted_ends = np.sort(self.ends)
+        # Empty windows are never active
+        self._root = self._build(np.flatnonzero(self.starts < self.ends))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _build(self, ids):
+        if not len(ids):
+            return None
+        starts, ends = self.starts[ids], self.ends[ids]
+        # A point inside each interval, so the median one is always contained in its node
+        points = np.where(np.isfinite(starts), starts, np.where(np.isfinite(ends), ends - 1.0, 0.0))
+        node = _Node()
+        node.center = float(np.partition(points, len(points) // 2)[len(points) // 2])
+        here = (starts <= node.center) & (ends > node.center)
+        mine = ids[here]
+        order = np.argsort(self.starts[mine], kind="stable")
+        node.by_start, node.starts = mine[order], self.starts[mine][order]
+        order = np.argsort(self.ends[mine], kind="stable")
+        node.by_end, node.ends = mine[order], self.ends[mine][order]
+        node.left = self._build(ids[~here & (ends <= node.center)])
+        node.right = self._build(ids[~here & (starts > node.center)])
+        return node
+
+    def overlapping(self, t0, t1=None):
+        """Sorted ids of the intervals active at some moment of [t0, t1]."""
+        t1 = t0 if t1 is None else t1
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if t1 < node.center:
+                # Every interval here ends after the center, so only the start matters
+                found.append(node.by_start[:np.searchsorted(node.starts, t1, side="right")])
+                stack.append(node.left)
+            elif t0 >= node.center:
+                found.append(node.by_end[np.searchsorted(node.ends, t0, side="right"):])
+                stack.append(node.right)
+            else:
+                found.append(node.by_start)
+                stack.append(node.left)
+                stack.append(node.right)
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(found))
+
+    def window_key(self, t0, t1=None):
+        """Hashable key that is equal for two windows exactly when they overlap the same intervals."""
+        t1 = t0 if t1 is None else t1
+        return (int(np.searchsorted(self._sorted_ends, t0, side="right")),
+                int(np.searchsorted(self._sorted_starts, t1, side="right")))
+
+    def stable_for(self, t0, t1=None):
+        """Seconds the window [t0, t1] can slide forward before its active set changes (inf if never)."""
+        t1 = t0 if t1 is None else t1
+        seconds = INF
+        i = np.searchsorted(self._sorted_ends, t0, side="right")
+        if i < len(self._sorted_ends):
+            seconds = min(seconds, self._sorted_ends[i] - t0)
+        i = np.searchsorted(self._sorted_starts, t1, side="right")
+        if i < len(self._sorted_starts):
+            seconds = min(seconds, self._sorted_starts[i] - t1)
+        return float(seconds)
@@ -0,0 +1,117 @@
+"""Traffic signal / junction discovery along a route.
+
+Search points are spaced by distance along the route (not by vertex index),
+points whose search circle is already covered by an earlier one are dropped,
+the remaining Places queries run concurrently on the shared outbound pool and
+results are merged by place identity.
+
+The number of queries per route is capped at JUNCTION_MAX_QUERIES: on long
+routes the spacing grows to length / budget and the radius with it. That
+keeps intercity routes to a bounded number of round-trips, but a Places
+nearbysearch returns at most 20 results per call, so wider circles find
+fewer of the signals along the way.
+"""
+import numpy as np
+import requests
+
+from traffic_core import config, http_client, instrumentation
+from traffic_core.config import API_KEY
+from traffic_core.geometry import RouteGeometry
+
+PLACES_URL = config.PLACES_URL
+
+SEARCH_RADIUS_M = 100
+# Distance between consecutive search centres; < 2 * radius keeps the circles overlapping
+SAMPLE_SPACING_M = 150
+# Places API limit on a nearbysearch radius
+MAX_SEARCH_RADIUS_M = 50000
+
+
+def search_plan(length_m, spacing=SAMPLE_SPACING_M, radius=SEARCH_RADIUS_M, max_queries=None):
+    """(spacing, radius) for a route of length_m that needs at most max_queries searches.
+
+    Short routes keep the requested values; longer ones stretch the spacing to
+    fit the budget and grow the radius in proportion, so consecutive circles
+    still overlap.
+    """
+    if max_queries is None:
+        max_queries = config.JUNCTION_MAX_QUERIES
+    if max_queries > 1 and length_m / spacing + 1 > max_queries:
+        scale = length_m / (max_queries - 1) / spacing
+        spacing, radius = spacing * scale, min(radius * scale, MAX_SEARCH_RADIUS_M)
+    return spacing, radius
+
+
+def drop_covered(points, radius=SEARCH_RADIUS_M):
+    """Drop points lying within `radius` of an already kept point.
+
+    Such a point's search circle is mostly covered by the kept one, which
+    happens wherever the route doubles back or loops. A grid keyed by
+    `radius`-sized cells keeps each check to the 9 neighbouring cells.
+    """
+    if len(points) == 0:
+        return points
+    # Local equirectangular projection to meters is accurate enough at 100 m scale
+    x, y = RouteGeometry(points).projected().T
+    cells = np.floor(np.column_stack((x, y)) / radius).astype(np.int64)
+
+    grid = {}
+    keep = []
+    radius_sq = radius * radius
+    for i in range(len(points)):
+        cx, cy = cells[i]
+        covered = False
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in grid.get((cx + dx, cy + dy), ()):
+                    if (x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2 < radius_sq:
+                        covered = True
+                        break
+                if covered:
+                    break
+            if covered:
+                break
+        if not covered:
+            grid.setdefault((cx, cy), []).append(i)
+            keep.append(i)
+    return points[keep]
+
+
+def search_traffic_signals(point, radius=SEARCH_RADIUS_M):
+    """Run one Places nearbysearch around a (lat, lng) point; returns the raw results."""
+    lat, lng = point
+    params = {"location": f"{lat},{lng}", "radius": radius, "keyword": "traffic signal", "key": API_KEY}
+    try:
+        response = http_client.get("places", PLACES_URL, params=params)
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        print(f"Error searching traffic signals near {lat},{lng}: {e}")
+        return []
+    if data["status"] == "OK":
+        return data["results"]
+    return []
+
+
+@instrumentation.timed("junctions")
+def get_traffic_junctions(decoded_route, spacing=SAMPLE_SPACING_M, radius=SEARCH_RADIUS_M,
+                          search=search_traffic_signals, max_queries=None):
+    """Find traffic signals and junctions along the route using Google Places API.
+
+    decoded_route is a RouteGeometry or an (N, 2) lat/lng sequence. At most
+    max_queries (default JUNCTION_MAX_QUERIES) searches are made. Returns a
+    list of (name, lat, lng) tuples, one per distinct place.
+    """
+    if not isinstance(decoded_route, RouteGeometry):
+        decoded_route = RouteGeometry(decoded_route)
+    spacing, radius = search_plan(decoded_route.length_m, spacing, radius, max_queries)
+    points = drop_covered(decoded_route.resample(spacing), radius)
+    results = http_client.fan_out(lambda point: search(tuple(point), radius), points)
+
+    junctions = {}
+    for places in results:
+        for place in places:
+            location = place["geometry"]["location"]
+            key = place.get("place_id") or (place["name"], round(location["lat"], 6), round(location["lng"], 6))
+            if key not in junctions:
+                junctions[key] = (place["name"], location["lat"], location["lng"])
+    return list(junctions.values())
@@ -0,0 +1,384 @@
+"""Offline routing over a local road graph.
+
+The graph is loaded from a file into compressed sparse row (CSR) arrays:
+node coordinates, an indptr/indices adjacency and per-edge length and travel
+time. Supported inputs:
+
+- CSV edge list with columns from_lat, from_lng, to_lat, to_lng and optional
+  length_m, speed_kmh, oneway (1/0)
+- GeoJSON FeatureCollection of LineStrings (properties speed_kmh, oneway)
+- OSM XML extract (.osm): ways tagged highway=*, honouring oneway and maxspeed
+
+Routes are found with A* on travel time (straight-line distance at the
+graph's top speed as the heuristic). Alternatives come from re-running A*
+with the edges of earlier routes penalized. Edges touching a blocked road
+geometry active at the departure time are skipped. compute_routes() returns the same structure as the
+Google Routes API so it can stand in for routing.compute_routes.
+"""
+import csv
+import heapq
+import json
+import math
+import threading
+import time
+import xml.etree.ElementTree as ET
+from array import array
+from collections import OrderedDict
+from datetime import timezone
+
+import numpy as np
+import polyline
+
+from traffic_core import config
+from traffic_core.blocked_roads_store import get_store
+from traffic_core.geometry import EARTH_RADIUS_M, haversine_m
+
+DEFAULT_SPEED_KMH = 40.0
+# Default speeds for OSM highway classes without a maxspeed tag
+OSM_SPEEDS_KMH = {
+    "motorway": 100, "trunk": 80, "primary": 60, "secondary": 50, "tertiary": 40,
+    "unclassified": 30, "residential": 25, "service": 15, "living_street": 10,
+    "motorway_link": 60, "trunk_link": 50, "primary_link": 40, "secondary_link": 35,
+    "tertiary_link": 30,
+}
+# Travel-time multiplier applied to the edges of routes already found
+ALTERNATIVE_PENALTY = 1.4
+# An alternative sharing more than this fraction of its length with an earlier route is dropped
+MAX_ALTERNATIVE_OVERLAP = 0.8
+# Blocked-edge masks kept for distinct sets of active scheduled blocks (e.g. now and a later departure)
+BLOCKED_MASKS_KEPT = 4
+
+
+def _parse_bool(value, default=False):
+    if value is None or value == "":
+        return default
+    return str(value).strip().lower() in ("1", "true", "yes", "-1")
+
+
+def _parse_speed(value, default):
+    """Parse '50', '50 km/h' or '30 mph' into km/h."""
+    if value in (None, ""):
+        return default
+    text = str(value).strip().lower()
+    try:
+        if text.endswith("mph"):
+            return float(text[:-3]) * 1.609
+        return float(text.replace("km/h", "").strip())
+    except ValueError:
+        return default
+
+
+class RoadGraph:
+    """Directed road graph in CSR form.
+
+    Attributes:
+    - coords: (N, 2) float array of node lat/lng
+    - indptr: (N + 1,) int array; edges of node u are indptr[u]:indptr[u + 1]
+    - indices: (E,) int array of edge target nodes
+    - lengths: (E,) edge length in meters
+    - times: (E,) edge travel time in seconds
+    """
+
+    def __init__(self, coords, sources, targets, lengths, times):
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        sources = np.asarray(sources, dtype=np.int64)
+        order = np.argsort(sources, kind="stable")
+        self.coords = coords
+        self.sources = sources[order]
+        self.indices = np.asarray(targets, dtype=np.int64)[order]
+        self.lengths = np.asarray(lengths, dtype=float)[order]
+        self.times = np.asarray(times, dtype=float)[order]
+        self.indptr = np.zeros(len(coords) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.sources, minlength=len(coords)), out=self.indptr[1:])
+        speeds = self.lengths / np.maximum(self.times, 1e-9)
+        self.max_speed = float(speeds.max()) if len(speeds) else DEFAULT_SPEED_KMH / 3.6
+
+        # Flat typed arrays for the search loop: compact, and fast to index from Python
+        self._indptr = array("q", self.indptr.tobytes())
+        self._sources = array("q", self.sources.tobytes())
+        self._indices = array("q", self.indices.tobytes())
+        self._times = array("d", self.times.tobytes())
+        self._lats = array("d", np.ascontiguousarray(coords[:, 0]).tobytes())
+        self._lngs = array("d", np.ascontiguousarray(coords[:, 1]).tobytes())
+
+        self._blocked_lock = threading.Lock()
+        self._blocked_masks = OrderedDict()  # (store version, window key) -> mask
+        self._blocked = bytes(len(self.indices))
+
+    def __len__(self):
+        return len(self.coords)
+
+    @property
+    def edge_count(self):
+        """Number of directed edges."""
+        return len(self.indices)
+
+    # -- loading -----------------------------------------------------------
+
+    @classmethod
+    def from_edges(cls, edges):
+        """Build a graph from (from_lat, from_lng, to_lat, to_lng, length_m, speed_kmh, oneway) tuples.
+
+        length_m may be None to use the straight-line distance. Endpoints are
+        merged when they match to 7 decimals.
+        """
+        node_ids = {}
+        coords = []
+        sources, targets, lengths, times = [], [], [], []
+
+        def node(lat, lng):
+            key = (round(lat, 7), round(lng, 7))
+            if key not in node_ids:
+                node_ids[key] = len(coords)
+                coords.append(key)
+            return node_ids[key]
+
+        for from_lat, from_lng, to_lat, to_lng, length_m, speed_kmh, oneway in edges:
+            u, v = node(from_lat, from_lng), node(to_lat, to_lng)
+            if u == v:
+                continue
+            if length_m is None:
+                length_m = float(haversine_m(from_lat, from_lng, to_lat, to_lng))
+            seconds = length_m / (speed_kmh / 3.6)
+            pairs = ((u, v),) if oneway else ((u, v), (v, u))
+            for a, b in pairs:
+                sources.append(a)
+                targets.append(b)
+                lengths.append(length_m)
+                times.append(seconds)
+        return cls(coords, sources, targets, lengths, times)
+
+    @classmethod
+    def from_csv(cls, path):
+        """Load a CSV edge list."""
+        def edges():
+            with open(path, newline="") as file:
+                for row in csv.DictReader(file):
+                    length = row.get("length_m")
+                    yield (float(row["from_lat"]), float(row["from_lng"]),
+                           float(row["to_lat"]), float(row["to_lng"]),
+                           float(length) if length not in (None, "") else None,
+                           _parse_speed(row.get("speed_kmh"), DEFAULT_SPEED_KMH),
+                           _parse_bool(row.get("oneway")))
+        return cls.from_edges(edges())
+
+    @classmethod
+    def from_geojson(cls, path):
+        """Load LineString / MultiLineString features from a GeoJSON file."""
+        with open(path, "r") as file:
+            data = json.load(file)
+
+        def edges():
+            for feature in data.get("features", []):
+                geometry = feature.get("geometry") or {}
+                props = feature.get("properties") or {}
+                if geometry.get("type") == "LineString":
+                    lines = [geometry["coordinates"]]
+                elif geometry.get("type") == "MultiLineString":
+                    lines = geometry["coordinates"]
+                else:
+                    continue
+                speed = _parse_speed(props.get("speed_kmh", props.get("maxspeed")), DEFAULT_SPEED_KMH)
+                oneway = _parse_bool(props.get("oneway"))
+                for line in lines:
+                    # GeoJSON positions are [lng, lat]
+                    for (lng1, lat1, *_), (lng2, lat2, *_) in zip(line, line[1:]):
+                        yield lat1, lng1, lat2, lng2, None, speed, oneway
+        return cls.from_edges(edges())
+
+    @classmethod
+    def from_osm(cls, path):
+        """Load the highway ways of an OSM XML extract."""
+        nodes = {}
+        ways = []
+        for _, elem in ET.iterparse(path, events=("end",)):
+            if elem.tag == "node":
+                nodes[elem.get("id")] = (float(elem.get("lat")), float(elem.get("lon")))
+                elem.clear()
+            elif elem.tag == "way":
+                tags = {t.get("k"): t.get("v") for t in elem.findall("tag")}
+                highway = tags.get("highway")
+                if highway in OSM_SPEEDS_KMH or highway == "road":
+                    refs = [nd.get("ref") for nd in elem.findall("nd")]
+                    speed = _parse_speed(tags.get("maxspeed"), OSM_SPEEDS_KMH.get(highway, DEFAULT_SPEED_KMH))
+                    oneway = tags.get("oneway")
+                    if oneway == "-1":
+                        refs.reverse()
+                    is_oneway = _parse_bool(oneway, default=highway in ("motorway", "motorway_link"))
+                    ways.append((refs, speed, is_oneway))
+                elem.clear()
+
+        def edges():
+            for refs, speed, oneway in ways:
+                points = [nodes[r] for r in refs if r in nodes]
+                for (lat1, lng1), (lat2, lng2) in zip(points, points[1:]):
+                    yield lat1, lng1, lat2, lng2, None, speed, oneway
+        return cls.from_edges(edges())
+
+    @classmethod
+    def load(cls, path):
+        """Load a graph, picking the parser from the file extension."""
+        lower = path.lower()
+        if lower.endswith(".csv"):
+            return cls.from_csv(path)
+        if lower.endswith((".geojson", ".json")):
+            return cls.from_geojson(path)
+        if lower.endswith(".osm"):
+            return cls.from_osm(path)
+        raise ValueError(f"Unsupported road graph format: {path}")
+
+    # -- queries -----------------------------------------------------------
+
+    def nearest_node(self, lat, lng):
+        """Index of the node closest to a point (equirectangular approximation)."""
+        dlat = self.coords[:, 0] - lat
+        dlng = (self.coords[:, 1] - lng) * math.cos(math.radians(lat))
+        return int(np.argmin(dlat * dlat + dlng * dlng))
+
+    def update_blocked(self, snapshot, at=None):
+        """Return one byte per edge marking those touching a geometry blocked at `at` (epoch seconds, default now).
+
+        Only recomputed when the blocked roads or the set of active scheduled
+        blocks changed; the result also becomes shortest_path()'s default.
+        """
+        at = time.time() if at is None else at
+        key = (snapshot.version, snapshot.window_key(at))
+        with self._blocked_lock:
+            blocked = self._blocked_masks.get(key)
+            if blocked is None:
+                starts = self.coords[self.sources]
+                ends = self.coords[self.indices]
+                blocked = snapshot.index_at(at).segments_blocked(starts, ends).astype(np.uint8).tobytes()
+                self._blocked_masks[key] = blocked
+                while len(self._blocked_masks) > BLOCKED_MASKS_KEPT:
+                    self._blocked_masks.popitem(last=False)
+            else:
+                self._blocked_masks.move_to_end(key)
+            self._blocked = blocked
+            return blocked
+
+    def shortest_path(self, source, target, penalties=None, blocked=None):
+        """A* on travel time from node source to node target.
+
+        penalties: optional {edge: multiplier}; blocked: edge mask from
+        update_blocked() (default: the latest one). Returns the list of edge
+        indices along the path, or None if target is unreachable.
+        """
+        indptr, indices, times = self._indptr, self._indices, self._times
+        lats, lngs = self._lats, self._lngs
+        blocked = self._blocked if blocked is None else blocked
+        target_lat, target_lng = math.radians(lats[target]), math.radians(lngs[target])
+        cos_target = math.cos(target_lat)
+        inv_speed = 1.0 / self.max_speed
+        penalties = penalties or {}
+
+        def heuristic(u):
+            lat, lng = math.radians(lats[u]), math.radians(lngs[u])
+            a = (math.sin((target_lat - lat) / 2) ** 2 +
+                 math.cos(lat) * cos_target * math.sin((target_lng - lng) / 2) ** 2)
+            return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0))) * inv_speed
+
+        best = {source: 0.0}
+        via = {}
+        heap = [(heuristic(source), 0.0, source)]
+        while heap:
+            _, cost, u = heapq.heappop(heap)
+            if u == target:
+                path = []
+                while u != source:
+                    edge = via[u]
+                    path.append(edge)
+                    u = self._sources[edge]
+                path.reverse()
+                return path
+            if cost > best.get(u, math.inf):
+                continue
+            for edge in range(indptr[u], indptr[u + 1]):
+                if blocked[edge]:
+                    continue
+                v = indices[edge]
+                new_cost = cost + times[edge] * penalties.get(edge, 1.0)
+                if new_cost < best.get(v, math.inf):
+                    best[v] = new_cost
+                    via[v] = edge
+                    heapq.heappush(heap, (new_cost + heuristic(v), new_cost, v))
+        return None
+
+    def k_shortest(self, source, target, k=3, blocked=None):
+        """Up to k distinct paths (lists of edges), best first, via the penalty method."""
+        paths = []
+        penalties = {}
+        for _ in range(k * 2):
+            if len(paths) >= k:
+                break
+            path = self.shortest_path(source, target, penalties, blocked)
+            if path is None:
+                break
+            if not path:  # source == target
+                return [path]
+            length = self.lengths[path].sum()
+            if all(self._overlap(path, other) <= MAX_ALTERNATIVE_OVERLAP * length for other in paths):
+                paths.append(path)
+            for edge in path:
+                penalties[edge] = penalties.get(edge, 1.0) * ALTERNATIVE_PENALTY
+        return paths
+
+    def _overlap(self, path, other):
+        shared = np.intersect1d(np.asarray(path), np.asarray(other))
+        return self.lengths[shared].sum()
+
+    def path_coords(self, path, source):
+        """(M, 2) lat/lng array of the nodes along a path of edges starting at source."""
+        nodes = np.concatenate(([source], self.indices[path])) if path else np.array([source])
+        return self.coords[nodes]
+
+
+def to_api_route(graph, path, source):
+    """Format a path like a Google Routes API route."""
+    coords = graph.path_coords(path, source)
+    return {
+        "duration": f"{int(round(graph.times[path].sum()))}s",
+        "distanceMeters": int(round(graph.lengths[path].sum())),
+        "polyline": {"encodedPolyline": polyline.encode([tuple(p) for p in coords.tolist()])},
+    }
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    """Return the process-wide graph, loading ROAD_GRAPH_FILE on first use."""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = RoadGraph.load(config.ROAD_GRAPH_FILE)
+        return _graph
+
+
+def set_graph(graph):
+    """Replace the process-wide graph (e.g. with one built in memory)."""
+    global _graph
+    with _graph_lock:
+        _graph = graph
+
+
+def compute_routes(src_lat, src_lng, dest_lat, dest_lng, alternatives=True, departure_time=None, k=3):
+    """Local stand-in for routing.compute_routes.
+
+    Returns a list of API-shaped routes (empty if unreachable), or None if
+    the graph could not be loaded. departure_time (naive UTC) only selects
+    which scheduled blocks apply; the graph has no time-dependent speeds.
+    """
+    try:
+        graph = get_graph()
+    except (OSError, ValueError) as e:
+        print(" Error loading road graph:", e)
+        return None
+
+    at = None if departure_time is None else departure_time.replace(tzinfo=timezone.utc).timestamp()
+    blocked = graph.update_blocked(get_store().snapshot(), at)
+    source = graph.nearest_node(src_lat, src_lng)
+    target = graph.nearest_node(dest_lat, dest_lng)
+    paths = graph.k_shortest(source, target, k if alternatives else 1, blocked)
+    return [to_api_route(graph, path, source) for path in paths]
@@ -0,0 +1,202 @@
+"""Renderers for a RoutePlan: GeoJSON for the static client, folium HTML as a fallback.
+
+Route lines are drawn at a level of detail matched to the map zoom: the
+levels are the zooms in config.ROUTE_LOD_ZOOMS, a request at zoom z gets the
+first level >= z (at most ROUTE_LOD_PIXELS of error on screen), and zooms
+past the last level get the full polyline.
+"""
+import math
+
+import numpy as np
+
+from traffic_core import config
+from traffic_core.blocked_roads_store import route_key
+from traffic_core.geometry import haversine_m, meters_per_pixel
+from traffic_core.route_ranking import FEATURES
+from traffic_core.spatial_index import block_record, blocked_runs
+
+# Static (folium) maps cannot fetch more detail on zoom, so they carry this many extra levels
+STATIC_EXTRA_ZOOM = 3
+# Viewport assumed when picking the initial zoom of a route, in pixels
+FIT_WIDTH_PX = 1000
+FIT_HEIGHT_PX = 600
+MAX_ZOOM = 19
+# Decimal places kept in GeoJSON coordinates (5 ~ 1 m, same as the encoded polyline)
+COORD_DECIMALS = 5
+
+
+def route_style(route):
+    """Color, weight and opacity of a route line, shared by both renderers."""
+    if route.blocked:
+        return "red", 8, 0.8 if route.chosen else 0.5
+    if route.chosen:
+        return "blue", 6, 0.8
+    return "gray", 4, 0.5
+
+
+def _line(coords):
+    """GeoJSON LineString coordinates ([lng, lat] order) from an (N, 2) lat/lng array."""
+    return np.round(coords[:, ::-1], COORD_DECIMALS).tolist()
+
+
+def _point(lat, lng):
+    return {"type": "Point", "coordinates": [round(lng, COORD_DECIMALS), round(lat, COORD_DECIMALS)]}
+
+
+def lod_level(zoom):
+    """LOD level serving a zoom: the first configured level >= zoom, or None for full detail."""
+    for level in config.ROUTE_LOD_ZOOMS:
+        if level >= zoom:
+            return level
+    return None
+
+
+def lod_tolerance(zoom, lat):
+    """(level, tolerance in meters) for drawing at `zoom` around latitude `lat`."""
+    level = lod_level(zoom)
+    if level is None:
+        return None, 0.0
+    return level, meters_per_pixel(level, lat) * config.ROUTE_LOD_PIXELS
+
+
+def fit_zoom(plan, width_px=FIT_WIDTH_PX, height_px=FIT_HEIGHT_PX):
+    """Highest integer zoom at which all of the plan's routes fit in the viewport."""
+    boxes = np.array([route.geometry.bbox() for route in plan.routes])
+    min_lat, min_lng = boxes[:, :2].min(axis=0)
+    max_lat, max_lng = boxes[:, 2:].max(axis=0)
+    mid_lat = (min_lat + max_lat) / 2
+    width_m = haversine_m(mid_lat, min_lng, mid_lat, max_lng)
+    height_m = haversine_m(min_lat, min_lng, max_lat, min_lng)
+    zoom = MAX_ZOOM
+    for extent_m, pixels in ((width_m, width_px), (height_m, height_px)):
+        if extent_m > 0:
+            zoom = min(zoom, math.floor(math.log2(meters_per_pixel(0, mid_lat) * pixels / extent_m)))
+    return max(int(zoom), 0)
+
+
+def static_map_tolerance(zoom_start, lat):
+    """Tolerance for maps drawn once at zoom_start (folium HTML)."""
+    return lod_tolerance(zoom_start + STATIC_EXTRA_ZOOM, lat)[1]
+
+
+def drawing_order(plan):
+    """Routes worst-ranked first, so the chosen one is drawn on top."""
+    return sorted(plan.routes, key=lambda route: -route.rank)
+
+
+def route_tooltip(route):
+    if route.explanation is None:
+        return "Blocked Route" if route.blocked else f"Route {route.index + 1}"
+    label = "Recommended" if route.chosen else f"Route {route.index + 1}"
+    return f"{label}: {route.explanation['summary']}"
+
+
+def route_feature_collection(plan, zoom=None, tolerance_m=None):
+    """GeoJSON FeatureCollection with the routes, their blocked stretches and markers.
+
+    Lines are reduced to the LOD level for `zoom` (default: the zoom that fits
+    the routes); an explicit tolerance_m overrides the level and is not cached
+    on the route.
+    """
+    if zoom is None:
+        zoom = fit_zoom(plan)
+    level = lod_level(zoom) if tolerance_m is None else None
+
+    features = []
+    for route in drawing_order(plan):
+        if tolerance_m is None:
+            # Derived from the route's own latitude so a cached route always sees the same levels
+            tolerance, cache = lod_tolerance(zoom, route.geometry.start[0])[1], True
+        else:
+            tolerance, cache = tolerance_m, False
+        color, weight, opacity = route_style(route)
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": _line(route.geometry.lod(tolerance, cache=cache).coords)},
+            "properties": {
+                "kind": "route",
+                "index": route.index,
+                "blocked": route.blocked,
+                "duration": route.duration,
+                "distanceMeters": route.distance_m,
+                "rank": route.rank,
+                "chosen": route.chosen,
+                "explanation": route.explanation,
+                "tooltip": route_tooltip(route),
+                # How far the drawn line may stray from the real route (for client-side block checks)
+                "tolerance_m": round(tolerance, 1),
+                "color": color,
+                "weight": weight,
+                "opacity": opacity,
+            },
+        })
+        for start, stop in blocked_runs(route.blocked_mask):
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": _line(route.geometry.lod(tolerance, start, stop).coords)},
+                "properties": {"kind": "blocked", "index": route.index},
+            })
+
+    features.append({"type": "Feature", "geometry": _point(*plan.src),
+                     "properties": {"kind": "start", "name": plan.source}})
+    features.append({"type": "Feature", "geometry": _point(*plan.dest),
+                     "properties": {"kind": "end", "name": plan.destination}})
+    return {
+        "type": "FeatureCollection",
+        "features": features,
+        "source": plan.source,
+        "destination": plan.destination,
+        "route_key": route_key(plan.source, plan.destination),
+        "blocked_roads": plan.blocked_roads,
+        "blocked_version": plan.blocked_version,
+        # Epoch seconds the blocks were checked from; None means "now" (see route_planner)
+        "departure": plan.departure,
+        "blocks": [block_record(key, entry) for key, entry in plan.blocks],
+        "chosen": plan.chosen.index,
+        "cost_model": plan.ranking.model.name if plan.ranking else None,
+        # Cost of a blocked route under that model, for re-ranking after live block updates
+        "blocked_cost": float(plan.ranking.model.weights[FEATURES.index("blocked")]) if plan.ranking else None,
+        "zoom": zoom,
+        "lod": {"level": level, "levels": list(config.ROUTE_LOD_ZOOMS)},
+    }
+
+
+def render_folium(plan, zoom_start=10):
+    """Server-side folium map of a plan as an HTML fragment."""
+    import folium
+
+    route_map = folium.Map(location=list(plan.src), zoom_start=zoom_start)
+    for route in drawing_order(plan):
+        tolerance = static_map_tolerance(zoom_start, route.geometry.start[0])
+        color, weight, opacity = route_style(route)
+        folium.PolyLine(
+            route.geometry.lod(tolerance, cache=True).tolist(),
+            color=color,
+            weight=weight,
+            opacity=opacity,
+            tooltip=route_tooltip(route)
+        ).add_to(route_map)
+
+        # Highlight the blocked stretches themselves
+        for start, stop in blocked_runs(route.blocked_mask):
+            folium.PolyLine(
+                route.geometry.lod(tolerance, start, stop).tolist(),
+                color="darkred",
+                weight=10,
+                opacity=0.9,
+                tooltip="Blocked Road"
+            ).add_to(route_map)
+
+    folium.Marker(
+        list(plan.src),
+        popup=f"<b>Start: {plan.source}</b>",
+        icon=folium.Icon(color="green", icon="play")
+    ).add_to(route_map)
+
+    folium.Marker(
+        list(plan.dest),
+        popup=f"<b>End: {plan.destination}</b>",
+        icon=folium.Icon(color="red", icon="stop")
+    ).add_to(route_map)
+
+    return route_map._repr_html_()
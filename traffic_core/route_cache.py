@@ -0,0 +1,293 @@
+"""Cache of computed routes.
+
+Entries are keyed by origin/destination rounded to ROUTE_CACHE_PRECISION
+decimals, travel mode, alternatives flag and a ROUTE_DEPARTURE_BUCKET-second
+departure window, and hold each route's decoded polyline as a RouteGeometry
+(a read-only (N, 2) float array). Concurrent misses for the same key are coalesced so only
+one upstream request is made. Blocking or unblocking a road drops the entries
+whose routes pass near it. Every fresh Routes API response is also recorded
+in the traffic history.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from traffic_core import config, instrumentation
+from traffic_core.blocked_roads_store import get_store
+from traffic_core.geometry import RouteGeometry
+from traffic_core.routing import compute_routes, compute_routes_async
+from traffic_core.spatial_index import DEFAULT_BUFFER_M, BlockIndex
+from traffic_core.traffic_history import get_history
+
+# Requests are routed for a departure this far ahead of now
+DEPARTURE_LEAD = timedelta(minutes=5)
+
+
+def decode_route(route):
+    """Turn an API route into a cache record with its polyline decoded to a RouteGeometry.
+
+    The geometry's Douglas-Peucker significance is computed here, once per
+    cached route, so every zoom level drawn from the entry is a cheap mask.
+    """
+    geometry = RouteGeometry.from_encoded(route['polyline']['encodedPolyline'])
+    geometry.significance()
+    return {
+        "duration": route.get("duration"),
+        "staticDuration": route.get("staticDuration"),
+        "distanceMeters": route.get("distanceMeters", 0),
+        "geometry": geometry,
+    }
+
+
+def decode_fetched(src_lat, src_lng, dest_lat, dest_lng, routes, departure_time):
+    """Record a fresh routes response in the traffic history and decode it."""
+    history = get_history()
+    if history is not None and config.ROUTING_MODE != "local":
+        history.record_routes(src_lat, src_lng, dest_lat, dest_lng, routes, departure_time)
+    return [decode_route(route) for route in routes]
+
+
+class RouteCache:
+    """TTL + LRU cache of decoded routes with single-flight misses.
+
+    Args:
+    - ttl: seconds an entry stays valid
+    - max_entries: LRU size
+    - precision: decimals of lat/lng kept in the key
+    - bucket_seconds: width of the departure-time window in the key
+    """
+
+    def __init__(self, ttl=300, max_entries=512, precision=4, bucket_seconds=300, clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.precision = precision
+        self.bucket_seconds = bucket_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, bbox, routes)
+        self._inflight = {}  # key -> Future
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidated": 0}
+
+    def make_key(self, src_lat, src_lng, dest_lat, dest_lng, travel_mode="DRIVE",
+                 alternatives=True, departure_time=None):
+        """Quantize a request into a cache key."""
+        if departure_time is None:
+            departure_time = datetime.utcnow() + DEPARTURE_LEAD
+        bucket = int(departure_time.timestamp() // self.bucket_seconds)
+        p = self.precision
+        return (round(src_lat, p), round(src_lng, p), round(dest_lat, p), round(dest_lng, p),
+                travel_mode, bool(alternatives), bucket)
+
+    def window_end(self, key):
+        """Clock time at which requests stop falling into the departure window of key."""
+        end = datetime.fromtimestamp((key[-1] + 1) * self.bucket_seconds) - DEPARTURE_LEAD
+        return self.clock() + (end - datetime.utcnow()).total_seconds()
+
+    def _claim(self, key):
+        """Look up key; returns (hit, routes_or_future, leader)."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return True, entry[2], False
+            if entry is not None:
+                del self._entries[key]
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return False, future, False
+            future = self._inflight[key] = Future()
+            self._stats["misses"] += 1
+            return False, future, True
+
+    def _fail(self, key, future, error):
+        with self._lock:
+            del self._inflight[key]
+        future.set_exception(error)
+
+    def _insert(self, key, routes, until):
+        """Store routes under key; caller holds the lock."""
+        expires_at = self.clock() + self.ttl if until is None else until
+        if routes is not None and self.ttl > 0 and expires_at > self.clock():
+            self._entries[key] = (expires_at, self._bbox(routes), routes)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _finish(self, key, future, routes, until=None):
+        with self._lock:
+            del self._inflight[key]
+            self._insert(key, routes, until)
+        future.set_result(routes)
+        return routes
+
+    def put(self, key, routes, until=None):
+        """Store decoded routes computed elsewhere (e.g. a warm snapshot), valid until `until` or for ttl."""
+        with self._lock:
+            self._insert(key, routes, until)
+
+    def get_or_compute(self, key, compute, until=None):
+        """Return the cached routes for key, calling compute() at most once per miss.
+
+        compute() returns a list of decoded routes, or None on failure (not cached).
+        A computed entry stays valid until the clock time `until` instead of ttl.
+        """
+        hit, value, leader = self._claim(key)
+        if hit:
+            return value
+        if not leader:
+            return value.result()
+
+        try:
+            routes = compute()
+        except BaseException as e:
+            self._fail(key, value, e)
+            raise
+        return self._finish(key, value, routes, until)
+
+    async def get_or_compute_async(self, key, compute):
+        """get_or_compute for event-loop callers; compute is a coroutine function.
+
+        Misses are coalesced with sync callers too: everyone waits on the same
+        Future. The upstream fetch runs as its own task and every caller awaits
+        it through asyncio.shield, so a cancelled caller (client disconnect)
+        neither cancels the fetch nor fails the other waiters.
+        """
+        hit, value, leader = self._claim(key)
+        if hit:
+            return value
+        if not leader:
+            return await asyncio.shield(asyncio.wrap_future(value))
+
+        async def run():
+            try:
+                routes = await compute()
+            except BaseException as e:
+                self._fail(key, value, e)
+                raise
+            return self._finish(key, value, routes)
+
+        task = asyncio.ensure_future(run())
+        # Retrieve the outcome even if the leader is gone, so errors are not reported as unhandled
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _bbox(routes):
+        boxes = [r["geometry"].bbox() for r in routes if len(r["geometry"])]
+        if not boxes:
+            return None
+        boxes = np.array(boxes)
+        return np.concatenate((boxes[:, :2].min(axis=0), boxes[:, 2:].max(axis=0)))
+
+    def invalidate_bbox(self, bbox):
+        """Drop entries whose routes' bounding box intersects [min_lat, min_lng, max_lat, max_lng]."""
+        with self._lock:
+            stale = [key for key, (_, box, _) in self._entries.items()
+                     if box is not None and box[0] <= bbox[2] and box[2] >= bbox[0]
+                     and box[1] <= bbox[3] and box[3] >= bbox[1]]
+            for key in stale:
+                del self._entries[key]
+            self._stats["invalidated"] += len(stale)
+            return len(stale)
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._stats["invalidated"] += len(self._entries)
+            self._entries.clear()
+
+    def on_blocks_changed(self, changes, version=None):
+        """Blocked-roads store listener: drop entries near every changed road geometry."""
+        for _, _, entry in changes:
+            if isinstance(entry, dict) and entry.get("path"):
+                index = BlockIndex([(None, entry["road"], entry["path"], entry.get("buffer_m", DEFAULT_BUFFER_M))])
+                box = index.boxes
+                self.invalidate_bbox(np.concatenate((box[:, :2].min(axis=0), box[:, 2:].max(axis=0))))
+
+    def stats(self):
+        """Return a copy of the hit/miss counters plus the current size."""
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def _cache_metrics():
+    cache = _default_cache
+    if cache is None:
+        return []
+    stats = cache.stats()
+    size = stats.pop("size")
+    return [("route_cache_lookups_total", {"result": name}, value, "counter") for name, value in stats.items()] + \
+        [("route_cache_entries", {}, size, "gauge")]
+
+
+instrumentation.add_collector(_cache_metrics)
+
+
+def get_route_cache():
+    """Return the process-wide route cache, wired to the blocked roads store."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = RouteCache(
+                ttl=config.ROUTE_CACHE_TTL,
+                max_entries=config.ROUTE_CACHE_SIZE,
+                precision=config.ROUTE_CACHE_PRECISION,
+                bucket_seconds=config.ROUTE_DEPARTURE_BUCKET,
+            )
+            get_store().subscribe(_default_cache.on_blocks_changed)
+        return _default_cache
+
+
+def get_routes(src_lat, src_lng, dest_lat, dest_lng, alternatives=True, departure_time=None, until=None):
+    """Cached compute_routes: returns decoded routes, [] if none, or None on failure.
+
+    A fetched entry is kept until the clock time `until` if given (the warmer
+    keeps its windows for as long as requests fall into them), else for the TTL.
+    """
+    if departure_time is None:
+        departure_time = datetime.utcnow() + DEPARTURE_LEAD
+    cache = get_route_cache()
+    key = cache.make_key(src_lat, src_lng, dest_lat, dest_lng, "DRIVE", alternatives, departure_time)
+
+    def compute():
+        with instrumentation.span("compute_routes"):
+            routes = compute_routes(src_lat, src_lng, dest_lat, dest_lng, alternatives, departure_time)
+        if routes is None:
+            return None
+        with instrumentation.span("decode_routes"):
+            return decode_fetched(src_lat, src_lng, dest_lat, dest_lng, routes, departure_time)
+
+    with instrumentation.span("get_routes"):
+        return cache.get_or_compute(key, compute, until)
+
+
+async def get_routes_async(src_lat, src_lng, dest_lat, dest_lng, alternatives=True, departure_time=None):
+    """get_routes for event-loop callers: non-blocking fetch, decoding in a worker thread."""
+    if departure_time is None:
+        departure_time = datetime.utcnow() + DEPARTURE_LEAD
+    cache = get_route_cache()
+    key = cache.make_key(src_lat, src_lng, dest_lat, dest_lng, "DRIVE", alternatives, departure_time)
+
+    async def compute():
+        with instrumentation.span("compute_routes"):
+            routes = await compute_routes_async(src_lat, src_lng, dest_lat, dest_lng, alternatives, departure_time)
+        if routes is None:
+            return None
+        with instrumentation.span("decode_routes"):
+            return await asyncio.to_thread(decode_fetched, src_lat, src_lng, dest_lat, dest_lng, routes,
+                                           departure_time)
+
+    with instrumentation.span("get_routes"):
+        return await cache.get_or_compute_async(key, compute)
@@ -0,0 +1,182 @@
+"""Route planning shared by the HTML map, the JSON API and the CLIs.
+
+plan_route() geocodes both ends, fetches (cached) routes and checks every
+route against the blocked roads snapshot, then ranks the alternatives with
+route_ranking's cost model. Each route is checked against the blocks active
+while it is driven, from the departure time (default now) until its arrival,
+so a planned closure only counts for trips that reach it. The result is plain data that the renderers in
+rendering.py turn into folium HTML or GeoJSON.
+plan_route_async() does the same for the ASGI app without blocking the loop.
+"""
+import asyncio
+import math
+import time
+from datetime import datetime, timezone
+
+from traffic_core import instrumentation
+from traffic_core.blocked_roads_store import get_store, route_key as make_route_key
+from traffic_core.geocoding import get_coordinates_many, get_coordinates_many_async
+from traffic_core.route_cache import get_routes, get_routes_async
+from traffic_core.route_ranking import parse_duration, rank_planned
+from traffic_core.spatial_index import parse_time
+from traffic_core.traffic_history import corridor_key, get_history
+
+INVALID_LOCATION = "Invalid source or destination location"
+FETCH_FAILED = "Failed to fetch route data from Google Maps"
+NO_ROUTES = "No routes found for the given locations"
+INVALID_DEPARTURE = "Departure must be a future time (ISO 8601 UTC or epoch seconds)"
+# A departure this many seconds in the past (e.g. a minute-precision form field) still means "now"
+DEPARTURE_SLACK = 120
+
+
+class PlannedRoute:
+    """One alternative: its geometry, API metadata, blocked status and ranking."""
+
+    __slots__ = ("index", "geometry", "duration", "static_duration", "distance_m", "blocked_mask", "blocked",
+                 "rank", "chosen", "explanation")
+
+    def __init__(self, index, geometry, duration, static_duration, distance_m, blocked_mask):
+        self.index = index
+        self.geometry = geometry
+        self.duration = duration
+        self.static_duration = static_duration
+        self.distance_m = distance_m
+        self.blocked_mask = blocked_mask
+        self.blocked = bool(blocked_mask.any())
+        self.rank = index
+        self.chosen = index == 0
+        self.explanation = None
+
+
+class RoutePlan:
+    """Everything needed to draw the routes between two places."""
+
+    def __init__(self, source, destination, src, dest, routes, blocked_roads, blocked_version, ranking=None,
+                 blocks=(), departure=None, blocks_until=float("inf")):
+        self.source = source
+        self.destination = destination
+        self.src = src
+        self.dest = dest
+        self.routes = routes
+        self.blocked_roads = blocked_roads
+        self.blocked_version = blocked_version
+        self.ranking = ranking
+        # Geometric blocks touching any of the routes, as (route_key, entry)
+        self.blocks = list(blocks)
+        # Epoch seconds the routes were checked from (None: planned for now)
+        self.departure = departure
+        # Epoch seconds until which a scheduled block cannot start or end along any route's trip
+        self.blocks_until = blocks_until
+
+    @property
+    def chosen(self):
+        """The recommended route."""
+        return next(route for route in self.routes if route.chosen)
+
+
+def plan_route(source, destination, alternatives=True, departure_time=None):
+    """Plan routes between two place names, leaving now or at departure_time (naive UTC datetime).
+
+    Returns (plan, None) on success or (None, error message) on failure.
+    """
+    (src_lat, src_lng), (dest_lat, dest_lng) = get_coordinates_many([source, destination])
+
+    if src_lat is None or dest_lat is None:
+        return None, INVALID_LOCATION
+
+    return plan_between(source, destination, (src_lat, src_lng), (dest_lat, dest_lng), alternatives,
+                        departure_time)
+
+
+def plan_between(source, destination, src, dest, alternatives=True, departure_time=None):
+    """plan_route for places whose (lat, lng) are already resolved."""
+    routes = get_routes(*src, *dest, alternatives, departure_time)
+    return _build_plan(source, destination, src, dest, routes, departure_time)
+
+
+async def plan_route_async(source, destination, alternatives=True, departure_time=None):
+    """plan_route with non-blocking geocoding and route fetching.
+
+    The blocked-roads check reads the store and scans every route vertex, so
+    it runs in a worker thread too.
+    """
+    (src_lat, src_lng), (dest_lat, dest_lng) = await get_coordinates_many_async([source, destination])
+
+    if src_lat is None or dest_lat is None:
+        return None, INVALID_LOCATION
+
+    routes = await get_routes_async(src_lat, src_lng, dest_lat, dest_lng, alternatives, departure_time)
+    return await asyncio.to_thread(_build_plan, source, destination, (src_lat, src_lng), (dest_lat, dest_lng), routes,
+                                   departure_time)
+
+
+def parse_departure(value):
+    """Naive UTC departure datetime of a request parameter; None or "" means now.
+
+    Raises ValueError for malformed or past times.
+    """
+    try:
+        epoch = parse_time(value)
+        if epoch is None:
+            return None
+        if epoch < time.time() - DEPARTURE_SLACK:
+            raise ValueError("departure is in the past")
+        if epoch <= time.time():
+            return None
+        return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+    except (OverflowError, OSError) as e:
+        raise ValueError(str(e)) from e
+
+
+def departure_epoch(departure_time):
+    """Epoch seconds of a naive UTC departure datetime; None means now."""
+    if departure_time is None:
+        return time.time()
+    return departure_time.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _build_plan(source, destination, src, dest, routes, departure_time=None):
+    """Check fetched routes against the blocked roads; returns (plan, error message)."""
+    if routes is None:
+        return None, FETCH_FAILED
+
+    if not routes:
+        return None, NO_ROUTES
+
+    with instrumentation.span("block_check"):
+        blocked = get_store().snapshot()
+        departure = departure_epoch(departure_time)
+        blocked_roads = blocked.roads_for(make_route_key(source, destination), departure)
+
+        planned = []
+        hit = set()
+        blocks_until = float("inf")
+        for index, route in enumerate(routes):
+            geometry = route['geometry']
+            # Check which vertices of this route touch a road geometry blocked while it is driven
+            trip = parse_duration(route['duration'])
+            arrival = departure + (0.0 if math.isnan(trip) else trip)
+            blocked_mask, hit_blocks = blocked.index_at(departure, arrival).check_route(geometry.coords)
+            blocks_until = min(blocks_until, departure + blocked.stable_for(departure, arrival))
+            for block_id, road in hit_blocks:
+                hit.add(block_id)
+                if road not in blocked_roads:
+                    blocked_roads.append(road)
+            planned.append(PlannedRoute(index, geometry, route['duration'], route.get('staticDuration'),
+                                        route['distanceMeters'], blocked_mask))
+
+    history = get_history()
+    if history is not None:
+        history.label(corridor_key(*src, *dest), f"{source} → {destination}")
+
+    with instrumentation.span("ranking"):
+        ranking = rank_planned(planned)
+        for route, explanation in zip(planned, ranking.explanations()):
+            route.rank = explanation["rank"]
+            route.chosen = explanation["chosen"]
+            route.explanation = explanation
+
+    blocks = [(key, entry) for key, entries in blocked.blocked_roads.items() for entry in entries
+              if isinstance(entry, dict) and (key, entry["road"]) in hit]
+    return RoutePlan(source, destination, src, dest, planned, blocked_roads, blocked.version, ranking, blocks,
+                     None if departure_time is None else departure, blocks_until), None
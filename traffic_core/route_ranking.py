@@ -0,0 +1,190 @@
+"""Ranking of route alternatives with a pluggable cost model.
+
+Every alternative is described by the same feature row:
+
+    duration_s       traffic-aware duration from the routes response
+    traffic_delay_s  duration minus the traffic-free staticDuration (0 when unknown)
+    distance_km      route length
+    signals          traffic signals / junctions found along the route (0 when not counted;
+                     only the CLI counts them, for models that weigh them)
+    blocked          1 if the route touches a blocked road, else 0
+
+A CostModel is a weight per feature, so the costs of all alternatives are a
+single matrix-vector product and the per-feature contributions (used for the
+explanations) are the element-wise product. Models are registered by name;
+ROUTE_COST_MODEL picks the default one.
+"""
+import re
+
+import numpy as np
+
+from traffic_core import config
+
+FEATURES = ("duration_s", "traffic_delay_s", "distance_km", "signals", "blocked")
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)s\s*$")
+
+
+def parse_duration(value):
+    """Seconds from a Routes API duration string ("1234s"), or NaN."""
+    if value is None:
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _DURATION.match(value)
+    return float(match.group(1)) if match else np.nan
+
+
+def format_duration(seconds):
+    """Human-readable duration: "1 h 05 min" or "12 min"."""
+    if seconds is None or np.isnan(seconds):
+        return "unknown"
+    minutes = int(round(seconds / 60))
+    if minutes >= 60:
+        return f"{minutes // 60} h {minutes % 60:02d} min"
+    return f"{minutes} min"
+
+
+def feature_matrix(durations, static_durations, distances_m, blocked, signals=None):
+    """(R, len(FEATURES)) feature rows for R alternatives."""
+    duration = np.array([parse_duration(d) for d in durations], dtype=float)
+    static = np.array([parse_duration(d) for d in static_durations], dtype=float)
+    delay = np.where(np.isnan(static), 0.0, np.maximum(duration - static, 0.0))
+    rows = np.column_stack((
+        duration,
+        delay,
+        np.asarray(distances_m, dtype=float) / 1000,
+        np.zeros(len(duration)) if signals is None else np.asarray(signals, dtype=float),
+        np.asarray(blocked, dtype=float),
+    ))
+    # An alternative without a duration is costed at the slowest known one
+    if np.isnan(rows[:, 0]).any():
+        known = rows[~np.isnan(rows[:, 0]), 0]
+        rows[np.isnan(rows[:, 0]), 0] = known.max() if len(known) else 0.0
+    return rows
+
+
+class CostModel:
+    """Linear cost over FEATURES.
+
+    Args:
+    - name: label used in explanations
+    - weights: {feature: cost per unit}; missing features weigh 0
+    """
+
+    def __init__(self, name, weights):
+        unknown = set(weights) - set(FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown route features: {', '.join(sorted(unknown))}")
+        self.name = name
+        self.weights = np.array([float(weights.get(feature, 0.0)) for feature in FEATURES])
+
+    @property
+    def uses_signals(self):
+        return self.weights[FEATURES.index("signals")] != 0
+
+    def contributions(self, features):
+        """(R, len(FEATURES)) cost contributed by each feature of each alternative."""
+        return features * self.weights
+
+    def costs(self, features):
+        return features @ self.weights
+
+
+# Weights are in seconds of driving a unit of each feature is worth. Only the
+# traffic_map.py CLI counts signals (a Places search per alternative), so the
+# built-in models leave them out and the web app and CLI rank alike.
+COST_MODELS = {
+    "fastest": CostModel("fastest", {"duration_s": 1.0, "blocked": 86400.0}),
+    "shortest": CostModel("shortest", {"distance_km": 60.0, "blocked": 86400.0}),
+    "balanced": CostModel("balanced", {"duration_s": 1.0, "traffic_delay_s": 0.5, "distance_km": 5.0,
+                                       "blocked": 3600.0}),
+}
+
+
+def register_cost_model(model):
+    """Make a CostModel available by name (and to ROUTE_COST_MODEL)."""
+    COST_MODELS[model.name] = model
+
+
+def get_cost_model(name=None):
+    """The named model, or the ROUTE_COST_MODEL default."""
+    name = name or config.ROUTE_COST_MODEL
+    try:
+        return COST_MODELS[name]
+    except KeyError:
+        raise ValueError(f"Unknown route cost model: {name}") from None
+
+
+class Ranking:
+    """Outcome of ranking R alternatives: order, costs and explanations."""
+
+    def __init__(self, model, features, signals_counted):
+        self.model = model
+        self.features = features
+        self.signals_counted = signals_counted
+        self.contributions = model.contributions(features)
+        self.costs = self.contributions.sum(axis=1)
+        # Stable: equal costs keep the routes API order
+        self.order = np.lexsort((np.arange(len(self.costs)), self.costs))
+        self.ranks = np.empty(len(self.costs), dtype=int)
+        self.ranks[self.order] = np.arange(len(self.costs))
+        self.chosen = int(self.order[0]) if len(self.order) else None
+
+    def describe(self, index):
+        """One-line summary of an alternative's features."""
+        duration_s, delay_s, distance_km, signals, blocked = self.features[index]
+        parts = [format_duration(duration_s)]
+        if delay_s >= 60:
+            parts[0] += f" (+{format_duration(delay_s)} traffic)"
+        parts.append(f"{distance_km:.1f} km")
+        if self.signals_counted:
+            parts.append(f"{int(signals)} signals")
+        if blocked:
+            parts.append("blocked")
+        return ", ".join(parts)
+
+    def reason(self, index):
+        """Why an alternative ranks where it does, relative to the chosen one (or the runner-up)."""
+        if len(self.order) < 2:
+            return "only route"
+        other = int(self.order[1]) if index == self.chosen else self.chosen
+        delta = self.contributions[other] - self.contributions[index]
+        if index == self.chosen:
+            feature = int(np.argmax(delta))
+            return f"chosen under the {self.model.name} model; beats route {other + 1} mainly on " \
+                   f"{FEATURES[feature]} ({delta[feature]:.0f} lower)"
+        feature = int(np.argmin(delta))
+        return f"ranked {self.ranks[index] + 1}: loses to route {other + 1} mainly on " \
+               f"{FEATURES[feature]} ({-delta[feature]:.0f} higher)"
+
+    def explanations(self):
+        """JSON-ready list, in routes API order, of each alternative's rank, cost and reasons."""
+        return [{
+            "index": i,
+            "rank": int(self.ranks[i]),
+            "chosen": i == self.chosen,
+            "cost": round(float(self.costs[i]), 1),
+            "terms": {feature: round(float(value), 1) for feature, value in zip(FEATURES, self.contributions[i])},
+            "summary": self.describe(i),
+            "reason": self.reason(i),
+        } for i in range(len(self.costs))]
+
+
+def rank_routes(routes, blocked=None, signals=None, model=None):
+    """Rank route_cache route dicts (duration, staticDuration, distanceMeters).
+
+    blocked and signals are optional per-route sequences aligned with routes.
+    """
+    model = model or get_cost_model()
+    features = feature_matrix([r.get("duration") for r in routes], [r.get("staticDuration") for r in routes],
+                              [r.get("distanceMeters", 0) for r in routes],
+                              np.zeros(len(routes)) if blocked is None else blocked, signals)
+    return Ranking(model, features, signals is not None)
+
+
+def rank_planned(planned, signals=None, model=None):
+    """Rank route_planner.PlannedRoute alternatives."""
+    model = model or get_cost_model()
+    features = feature_matrix([r.duration for r in planned], [r.static_duration for r in planned],
+                              [r.distance_m for r in planned], [r.blocked for r in planned], signals)
+    return Ranking(model, features, signals is not None)
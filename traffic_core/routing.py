@@ -0,0 +1,120 @@
+"""Route computation through the Google Routes API (or the local road graph)."""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import requests
+
+from traffic_core import config, http_client
+
+ROUTES_URL = config.ROUTES_URL
+DISTANCE_MATRIX_URL = config.DISTANCE_MATRIX_URL
+FIELD_MASK = "routes.duration,routes.staticDuration,routes.distanceMeters,routes.polyline.encodedPolyline"
+
+# Distance Matrix API limits per request
+MATRIX_MAX_ORIGINS = 25
+MATRIX_MAX_DESTINATIONS = 25
+MATRIX_MAX_ELEMENTS = 100
+
+
+def build_payload(src_lat, src_lng, dest_lat, dest_lng, alternatives=True, departure_time=None):
+    """Build a computeRoutes request body; departure defaults to five minutes from now."""
+    if departure_time is None:
+        departure_time = datetime.utcnow() + timedelta(minutes=5)
+    return {
+        "origin": {"location": {"latLng": {"latitude": src_lat, "longitude": src_lng}}},
+        "destination": {"location": {"latLng": {"latitude": dest_lat, "longitude": dest_lng}}},
+        "travelMode": "DRIVE",
+        "routingPreference": "TRAFFIC_AWARE",
+        "departureTime": departure_time.isoformat() + "Z",
+        "computeAlternativeRoutes": alternatives
+    }
+
+
+def _headers():
+    return {
+        "Content-Type": "application/json",
+        "X-Goog-Api-Key": config.API_KEY,
+        "X-Goog-FieldMask": FIELD_MASK
+    }
+
+
+def _parse_response(response):
+    if response.status_code != 200:
+        print(" Error:", response.text)
+        return None
+    try:
+        return response.json().get("routes", [])
+    except (ValueError, AttributeError) as e:  # e.g. an HTML error page from a proxy
+        print(" Error: unreadable routes response:", e)
+        return None
+
+
+def compute_routes(src_lat, src_lng, dest_lat, dest_lng, alternatives=True, departure_time=None):
+    """Fetch routes between two points.
+
+    Returns the list of routes from the API response (possibly empty), or
+    None if the request failed. With ROUTING_MODE = "local" the routes come
+    from the local road graph instead, in the same shape.
+    """
+    if config.ROUTING_MODE == "local":
+        from traffic_core import local_routing  # road graph code only loads in local mode
+        return local_routing.compute_routes(src_lat, src_lng, dest_lat, dest_lng, alternatives, departure_time)
+
+    payload = build_payload(src_lat, src_lng, dest_lat, dest_lng, alternatives, departure_time)
+
+    try:
+        response = http_client.post("routes", ROUTES_URL, headers=_headers(), data=json.dumps(payload))
+    except requests.RequestException as e:
+        print(" Error:", e)
+        return None
+
+    return _parse_response(response)
+
+
+async def compute_routes_async(src_lat, src_lng, dest_lat, dest_lng, alternatives=True, departure_time=None):
+    """compute_routes on the async HTTP client; local routing runs in a worker thread."""
+    import httpx
+
+    if config.ROUTING_MODE == "local":
+        from traffic_core import local_routing
+        return await asyncio.to_thread(local_routing.compute_routes, src_lat, src_lng, dest_lat, dest_lng,
+                                       alternatives, departure_time)
+
+    payload = build_payload(src_lat, src_lng, dest_lat, dest_lng, alternatives, departure_time)
+
+    try:
+        response = await http_client.apost("routes", ROUTES_URL, headers=_headers(), content=json.dumps(payload))
+    except httpx.HTTPError as e:
+        print(" Error:", e)
+        return None
+
+    return _parse_response(response)
+
+
+def _latlngs(points):
+    return "|".join(f"{lat},{lng}" for lat, lng in points)
+
+
+def distance_matrix(origins, destinations):
+    """Traffic-aware durations between (lat, lng) origins and destinations.
+
+    One Distance Matrix request (within the MATRIX_MAX_* limits). Returns
+    one list of elements per origin, in order, or None if the request failed.
+    """
+    params = {
+        "origins": _latlngs(origins),
+        "destinations": _latlngs(destinations),
+        "departure_time": "now",
+        "traffic_model": "best_guess",
+        "key": config.API_KEY,
+    }
+    try:
+        data = http_client.get("distancematrix", DISTANCE_MATRIX_URL, params=params).json()
+    except (requests.RequestException, ValueError) as e:
+        print(" Error:", e)
+        return None
+    if data.get("status") != "OK":
+        print(" Error:", data.get("status"), data.get("error_message", ""))
+        return None
+    return [row["elements"] for row in data["rows"]]
@@ -0,0 +1,381 @@
+"""Spatial index of blocked road geometries.
+
+A blocked road entry in blocked_roads.json is either a plain road name
+(legacy, only shown for its own source_destination key) or an object with a
+geometry that is checked against every route:
+
+    {"road": "GST Road", "path": [[12.95, 80.14], [12.97, 80.15]], "buffer_m": 30}
+
+Either kind may be scheduled with "starts_at" / "ends_at" (epoch seconds,
+or ISO 8601 in blocked_roads.json); the block is then only active during
+[starts_at, ends_at), and a missing bound leaves that side open.
+
+Block paths are split into segments, each segment's buffered bounding box is
+stored in a uniform lat/lng grid, and a route's segments are joined with the
+block segments sharing a grid cell into candidate pairs. Pairs whose boxes
+overlap are then refined with the exact segment-to-segment distance in
+meters against the block's buffer_m, since a long diagonal block has a box
+far wider than its buffer. Every step is vectorized over the pairs.
+"""
+import copy
+from datetime import datetime, timezone
+
+import numpy as np
+
+DEFAULT_BUFFER_M = 30
+# Grid cell size in degrees (~5.5 km at the equator)
+CELL_DEG = 0.05
+METERS_PER_DEG_LAT = 111320.0
+# Cell (i, j) is stored under the single integer i * CELL_KEY_STRIDE + j
+CELL_KEY_STRIDE = 1 << 20
+
+
+def road_name(entry):
+    """Return the road name of a blocked road entry (plain string or geometry object)."""
+    return entry["road"] if isinstance(entry, dict) else entry
+
+
+def parse_path(text):
+    """Parse 'lat,lng; lat,lng; ...' into a list of [lat, lng] pairs.
+
+    Raises ValueError for malformed input.
+    """
+    path = []
+    for pair in text.split(";"):
+        if not pair.strip():
+            continue
+        lat, lng = (float(v) for v in pair.split(","))
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError(f"coordinate out of range: {pair.strip()}")
+        path.append([lat, lng])
+    if not path:
+        raise ValueError("no coordinates given")
+    return path
+
+
+def parse_time(value):
+    """Parse an epoch number or ISO 8601 string (naive means UTC) into epoch seconds; None stays None.
+
+    Raises ValueError for malformed input.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def make_block(road, path=None, buffer_m=DEFAULT_BUFFER_M, starts_at=None, ends_at=None):
+    """Build a blocked road entry; without a path or schedule it stays a plain road name.
+
+    Raises ValueError if the schedule ends before it starts.
+    """
+    if starts_at is not None and ends_at is not None and ends_at <= starts_at:
+        raise ValueError("block must end after it starts")
+    if not path and starts_at is None and ends_at is None:
+        return road
+    entry = {"road": road, "path": path, "buffer_m": buffer_m} if path else {"road": road}
+    if starts_at is not None:
+        entry["starts_at"] = starts_at
+    if ends_at is not None:
+        entry["ends_at"] = ends_at
+    return entry
+
+
+def block_window(entry):
+    """(starts_at, ends_at) of a blocked road entry; None bounds are open."""
+    if not isinstance(entry, dict):
+        return None, None
+    return entry.get("starts_at"), entry.get("ends_at")
+
+
+def is_active(entry, start, end=None):
+    """Whether a blocked road entry is active at some moment of [start, end] (epoch seconds)."""
+    starts_at, ends_at = block_window(entry)
+    end = start if end is None else end
+    return (starts_at is None or starts_at <= end) and (ends_at is None or ends_at > start)
+
+
+def block_record(route_key, entry):
+    """JSON form of a blocked road entry; path and buffer_m are None for name-only blocks."""
+    geometric = isinstance(entry, dict) and entry.get("path")
+    starts_at, ends_at = block_window(entry)
+    return {"route_key": route_key, "road": road_name(entry),
+            "path": entry["path"] if geometric else None,
+            "buffer_m": entry.get("buffer_m", DEFAULT_BUFFER_M) if geometric else None,
+            "starts_at": starts_at, "ends_at": ends_at}
+
+
+def segment_bboxes(coords):
+    """Return the (N-1, 4) [min_lat, min_lng, max_lat, max_lng] boxes of a polyline's segments.
+
+    A single point yields one degenerate box.
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if len(coords) == 1:
+        return np.hstack((coords, coords))
+    start, end = coords[:-1], coords[1:]
+    return np.hstack((np.minimum(start, end), np.maximum(start, end)))
+
+
+def _project_m(points, lat0_rad):
+    """Local equirectangular projection of (K, 2) lat/lng points to meters."""
+    return np.column_stack((points[:, 1] * METERS_PER_DEG_LAT * np.cos(lat0_rad),
+                            points[:, 0] * METERS_PER_DEG_LAT))
+
+
+def _point_segment_distance(p, a, b):
+    """Row-wise distance from points p to segments a-b, all (K, 2) planar arrays."""
+    ab = b - a
+    length_sq = np.einsum("ij,ij->i", ab, ab)
+    t = np.einsum("ij,ij->i", p - a, ab) / np.where(length_sq > 0, length_sq, 1.0)
+    t = np.clip(np.where(length_sq > 0, t, 0.0), 0.0, 1.0)
+    return np.hypot(*(p - a - t[:, None] * ab).T)
+
+
+def _cross(u, v):
+    return u[:, 0] * v[:, 1] - u[:, 1] * v[:, 0]
+
+
+def segment_distance_m(a1, a2, b1, b2):
+    """Row-wise minimum distance in meters between lat/lng segments a1-a2 and b1-b2.
+
+    All inputs are (K, 2) arrays; each pair is projected around its own
+    latitude, which is exact enough at the scale of a road buffer.
+    """
+    lat0 = np.radians((a1[:, 0] + a2[:, 0] + b1[:, 0] + b2[:, 0]) / 4)
+    a1, a2, b1, b2 = (_project_m(x, lat0) for x in (a1, a2, b1, b2))
+    distance = np.minimum.reduce([
+        _point_segment_distance(a1, b1, b2), _point_segment_distance(a2, b1, b2),
+        _point_segment_distance(b1, a1, a2), _point_segment_distance(b2, a1, a2),
+    ])
+    # Properly crossing segments are at distance 0 even though no endpoint is close
+    da, db = a2 - a1, b2 - b1
+    d1, d2 = _cross(db, a1 - b1), _cross(db, a2 - b1)
+    d3, d4 = _cross(da, b1 - a1), _cross(da, b2 - a1)
+    crossing = (d1 * d2 < 0) & (d3 * d4 < 0)
+    return np.where(crossing, 0.0, distance)
+
+
+def blocked_runs(mask):
+    """Turn a per-vertex boolean mask into (start, stop) index slices of blocked stretches."""
+    mask = np.asarray(mask, dtype=bool)
+    if not mask.any():
+        return []
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+class BlockIndex:
+    """Grid index over the buffered segment boxes of geometric blocks."""
+
+    def __init__(self, blocks=(), cell_deg=CELL_DEG):
+        """blocks: iterable of (block_id, road, path, buffer_m)."""
+        self.cell_deg = cell_deg
+        self.blocks = []  # (block_id, road) per indexed block
+        boxes = []
+        owners = []
+        segments = []
+        buffers = []
+        for block_id, road, path, buffer_m in blocks:
+            path = np.asarray(path, dtype=float).reshape(-1, 2)
+            boxes.append(self._buffer(segment_bboxes(path), buffer_m))
+            owners.append(np.full(len(boxes[-1]), len(self.blocks)))
+            # A single-point block is a degenerate segment
+            segments.append(np.hstack((path[:-1], path[1:])) if len(path) > 1 else np.hstack((path, path)))
+            buffers.append(np.full(len(boxes[-1]), float(buffer_m)))
+            self.blocks.append((block_id, road))
+        self.boxes = np.vstack(boxes) if boxes else np.empty((0, 4))
+        self.owners = np.concatenate(owners) if owners else np.empty(0, dtype=int)
+        # (start lat, start lng, end lat, end lng) and buffer of every indexed segment
+        self.segments = np.vstack(segments) if segments else np.empty((0, 4))
+        self.buffers = np.concatenate(buffers) if buffers else np.empty(0)
+
+        # Buffered bounding box of each block (its segments are stored contiguously)
+        if len(self.blocks):
+            firsts = np.flatnonzero(np.r_[True, np.diff(self.owners) != 0])
+            self._block_boxes = np.column_stack((np.minimum.reduceat(self.boxes[:, :2], firsts),
+                                                 np.maximum.reduceat(self.boxes[:, 2:], firsts)))
+        else:
+            self._block_boxes = np.empty((0, 4))
+
+        self._extent = None
+        # Sorted positions of the blocks a view made by only() is restricted to (None: all)
+        self._active = None
+        self._count = len(self.blocks)
+        # Grid as a sorted array of cell keys with the indexed segment of each entry
+        keys, owners_of_key = [], []
+        for i, cell in enumerate(self._cells_of(self.boxes)):
+            keys.extend(cell)
+            owners_of_key.extend([i] * len(cell))
+        order = np.argsort(np.array(keys, dtype=np.int64), kind="stable")
+        self._cell_keys = np.array(keys, dtype=np.int64)[order]
+        self._cell_segments = np.array(owners_of_key, dtype=np.int64)[order]
+
+    @classmethod
+    def from_blocked_roads(cls, blocked_roads, **kwargs):
+        """Index every geometric entry of a {source_destination: [entries]} mapping."""
+        blocks = []
+        for route_key, entries in blocked_roads.items():
+            for entry in entries:
+                if isinstance(entry, dict) and entry.get("path"):
+                    blocks.append(((route_key, entry["road"]), entry["road"], entry["path"],
+                                   entry.get("buffer_m", DEFAULT_BUFFER_M)))
+        return cls(blocks, **kwargs)
+
+    def __len__(self):
+        return self._count
+
+    def only(self, positions):
+        """View of this index restricted to the blocks at `positions` (e.g. interval tree ids).
+
+        Shares every array with this index and costs O(len(positions)) to
+        make. Queries still join against the full grid and drop the pairs of
+        other blocks before refining distances, so they pay for every block
+        in the cells they touch, active or not.
+        """
+        view = copy.copy(self)
+        view._active = np.unique(np.asarray(positions, dtype=np.int64))
+        view._count = len(view._active)
+        if view._count:
+            boxes = self._block_boxes[view._active]
+            view._extent = np.concatenate((boxes[:, :2].min(axis=0), boxes[:, 2:].max(axis=0)))
+        return view
+
+    def _is_active(self, blocks):
+        """Boolean mask of which block positions this index (or view) covers."""
+        if self._active is None:
+            return np.ones(len(blocks), dtype=bool)
+        i = np.minimum(np.searchsorted(self._active, blocks), max(len(self._active) - 1, 0))
+        return (self._active[i] == blocks) if len(self._active) else np.zeros(len(blocks), dtype=bool)
+
+    @staticmethod
+    def _buffer(boxes, buffer_m):
+        dlat = buffer_m / METERS_PER_DEG_LAT
+        mid_lat = np.radians((boxes[:, 0] + boxes[:, 2]) / 2)
+        dlng = buffer_m / (METERS_PER_DEG_LAT * np.maximum(np.cos(mid_lat), 1e-6))
+        return np.column_stack((boxes[:, 0] - dlat, boxes[:, 1] - dlng,
+                                boxes[:, 2] + dlat, boxes[:, 3] + dlng))
+
+    def _cells_of(self, boxes):
+        """Yield, for each box, the list of grid cells it overlaps."""
+        lo = np.floor(boxes[:, :2] / self.cell_deg).astype(np.int64)
+        hi = np.floor(boxes[:, 2:] / self.cell_deg).astype(np.int64)
+        for (lat0, lng0), (lat1, lng1) in zip(lo.tolist(), hi.tolist()):
+            yield [i * CELL_KEY_STRIDE + j for i in range(lat0, lat1 + 1) for j in range(lng0, lng1 + 1)]
+
+    def _query_cells(self, boxes):
+        """(box index, cell key) arrays for every grid cell each query box overlaps."""
+        lo = np.floor(boxes[:, :2] / self.cell_deg).astype(np.int64)
+        hi = np.floor(boxes[:, 2:] / self.cell_deg).astype(np.int64)
+        # Most route segments are far shorter than a cell: handle those in one pass
+        single = (lo == hi).all(axis=1)
+        rows = [np.flatnonzero(single)]
+        keys = [lo[single, 0] * CELL_KEY_STRIDE + lo[single, 1]]
+        multi = np.flatnonzero(~single)
+        for i, cell in zip(multi.tolist(), self._cells_of(boxes[multi])):
+            rows.append(np.full(len(cell), i))
+            keys.append(np.array(cell, dtype=np.int64))
+        return np.concatenate(rows), np.concatenate(keys)
+
+    def candidate_pairs(self, boxes):
+        """(query index, indexed segment) pairs that share a grid cell and whose boxes overlap."""
+        rows, keys = self._query_cells(boxes)
+        start = np.searchsorted(self._cell_keys, keys, side="left")
+        count = np.searchsorted(self._cell_keys, keys, side="right") - start
+        rows = np.repeat(rows, count)
+        # Position of every pair inside its key's run of grid entries
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(count) - count, count)
+        segments = self._cell_segments[np.repeat(start, count) + offsets]
+        if self._active is not None:
+            keep = self._is_active(self.owners[segments])
+            rows, segments = rows[keep], segments[keep]
+        a, b = boxes[rows], self.boxes[segments]
+        overlap = ((a[:, 0] <= b[:, 2]) & (a[:, 2] >= b[:, 0]) &
+                   (a[:, 1] <= b[:, 3]) & (a[:, 3] >= b[:, 1]))
+        # Boxes spanning several cells meet the same segment more than once
+        pairs = np.unique(rows[overlap] * len(self.boxes) + segments[overlap])
+        return pairs // len(self.boxes), pairs % len(self.boxes)
+
+    def _close_pairs(self, starts, ends, boxes):
+        """(query index, indexed segment) pairs whose segments are within the block's buffer."""
+        if not len(self) or not self._overlaps_extent(boxes):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        rows, segments = self.candidate_pairs(boxes)
+        block = self.segments[segments]
+        distance = segment_distance_m(starts[rows], ends[rows], block[:, :2], block[:, 2:])
+        close = distance <= self.buffers[segments]
+        return rows[close], segments[close]
+
+    def _overlaps_extent(self, route_boxes):
+        """Cheap reject: does the route's bbox touch the bbox of all indexed blocks?"""
+        if self._extent is None:
+            self._extent = np.concatenate((self.boxes[:, :2].min(axis=0), self.boxes[:, 2:].max(axis=0)))
+        lo = route_boxes[:, :2].min(axis=0)
+        hi = route_boxes[:, 2:].max(axis=0)
+        return bool((lo <= self._extent[2:]).all() and (hi >= self._extent[:2]).all())
+
+    def check_route(self, coords):
+        """Test a route against every indexed block in one pass.
+
+        Returns (mask, blocks): a boolean array marking the route vertices that
+        touch a blocked segment, and the (block_id, road) pairs that were hit.
+        """
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        mask = np.zeros(len(coords), dtype=bool)
+        if len(coords) == 0:
+            return mask, []
+        if len(coords) == 1:
+            starts = ends = coords
+        else:
+            starts, ends = coords[:-1], coords[1:]
+        rows, segments = self._close_pairs(starts, ends, segment_bboxes(coords))
+        if len(coords) == 1:
+            mask[rows] = True
+        else:
+            mask[rows] = True
+            mask[rows + 1] = True
+        owners = np.unique(self.owners[segments])
+        return mask, [self.blocks[i] for i in owners.tolist()]
+
+    def segments_blocked(self, starts, ends, chunk=65536):
+        """Return a boolean array marking which independent segments run along a blocked segment.
+
+        starts and ends are (M, 2) lat/lng arrays, e.g. the edges of a road
+        graph. A segment counts as blocked when its midpoint lies within a
+        block's buffer: edges along the blocked road qualify, while cross
+        streets that only meet it at a junction stay open.
+        """
+        starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+        blocked = np.zeros(len(starts), dtype=bool)
+        for lo in range(0, len(starts), chunk):
+            mid = (starts[lo:lo + chunk] + ends[lo:lo + chunk]) / 2
+            rows, _ = self._close_pairs(mid, mid, np.hstack((mid, mid)))
+            blocked[lo + rows] = True
+        return blocked
+
+    def touching(self, bbox):
+        """Return the (block_id, road) pairs of every block whose buffered box overlaps
+        [min_lat, min_lng, max_lat, max_lng]."""
+        box = np.asarray(bbox, dtype=float).reshape(1, 4)
+        if not len(self) or not self._overlaps_extent(box):
+            return []
+        _, segments = self.candidate_pairs(box)
+        return [self.blocks[i] for i in np.unique(self.owners[segments]).tolist()]
+
+    def blocked_vertices(self, coords):
+        """Return a boolean array marking the route vertices that touch a blocked segment."""
+        return self.check_route(coords)[0]
+
+    def blocking(self, coords):
+        """Return the (block_id, road) pairs of every block the route touches."""
+        return self.check_route(coords)[1]
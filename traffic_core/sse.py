@@ -0,0 +1,12 @@
+"""Server-Sent Events framing shared by the parking and blocked-roads streams."""
+import json
+
+# Seconds between keepalive comments on an idle event stream
+SSE_KEEPALIVE = 15.0
+KEEPALIVE = ": keepalive\n\n"
+
+
+def sse_message(event, data, event_id=None):
+    """One Server-Sent Events message with a JSON payload."""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
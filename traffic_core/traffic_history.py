@@ -0,0 +1,348 @@
+"""Historical travel times per corridor, for predictions and congestion trends.
+
+Every fresh routes response (not cache hits, not the local road graph) adds
+one observation for its corridor: the fastest alternative's traffic-aware and
+traffic-free durations in milliseconds, its length and the departure time.
+A corridor is the origin/destination pair rounded to
+TRAFFIC_HISTORY_PRECISION decimals, identified by a 64-bit hash of that key.
+
+Observations are fixed-size binary records in one file per UTC day under
+TRAFFIC_HISTORY_DIR (YYYY-MM-DD.bin). Writers buffer records and append them
+with a single O_APPEND write, so several processes can share the directory.
+Readers memory-map the day files and aggregate with NumPy: percentiles per
+hour of day and/or day of week come from one sort of the selected records,
+not a Python loop per bucket. Corridor labels (place names) are kept in
+corridors.json next to the day files.
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from traffic_core import config
+
+RECORD = np.dtype([
+    ("ts", "<i8"),           # departure time, Unix seconds
+    ("corridor", "<u8"),     # corridor_id()
+    ("duration_ms", "<u4"),  # traffic-aware duration
+    ("static_ms", "<u4"),    # traffic-free duration, 0 when unknown
+    ("distance_m", "<u4"),
+])
+GROUPINGS = ("hour", "weekday", "weekday_hour")
+DEFAULT_PERCENTILES = (50, 90)
+LABELS_FILE = "corridors.json"
+# Days read by load() when no start is given
+DEFAULT_WINDOW_DAYS = 28
+# Observations are stamped with their departure time, a few minutes ahead of the fetch;
+# responses for departures further out than this are forecasts and are not recorded
+MAX_DEPARTURE_AHEAD_S = 900
+
+
+def corridor_key(src_lat, src_lng, dest_lat, dest_lng, precision=None):
+    """Text key of the corridor between two points."""
+    p = config.TRAFFIC_HISTORY_PRECISION if precision is None else precision
+    return f"{src_lat:.{p}f},{src_lng:.{p}f}>{dest_lat:.{p}f},{dest_lng:.{p}f}"
+
+
+def corridor_id(key):
+    """Stable 64-bit id of a corridor key, the same in every process."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+
+def duration_ms(value):
+    """Milliseconds from a Routes API duration ("1234s"), or 0 when missing."""
+    if not value:
+        return 0
+    return int(round(float(str(value).rstrip("s")) * 1000))
+
+
+def grouped_percentiles(groups, values, percentiles):
+    """Percentiles of values per group id, for all groups at once.
+
+    Returns (group ids, counts, (G, len(percentiles)) array) using linear
+    interpolation like np.percentile.
+    """
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order].astype(float)
+    ids, starts, counts = np.unique(groups, return_index=True, return_counts=True)
+    q = np.asarray(percentiles, dtype=float) / 100
+    positions = starts[:, None] + q[None, :] * (counts[:, None] - 1)
+    low = np.floor(positions).astype(np.intp)
+    high = np.minimum(low + 1, (starts + counts - 1)[:, None])
+    fraction = positions - low
+    return ids, counts, values[low] * (1 - fraction) + values[high] * fraction
+
+
+class TrafficHistory:
+    """Day-partitioned observation files with buffered appends and NumPy aggregation.
+
+    Args:
+    - directory: where the day files and corridor labels live
+    - flush_records / flush_seconds: buffered records are written when either is reached
+    - utc_offset_minutes: local time used for hour-of-day / day-of-week buckets
+    """
+
+    def __init__(self, directory, flush_records=256, flush_seconds=5.0, utc_offset_minutes=None):
+        self.directory = directory
+        self.flush_records = flush_records
+        self.flush_seconds = flush_seconds
+        if utc_offset_minutes is None:
+            utc_offset_minutes = time.localtime().tm_gmtoff // 60
+        self.utc_offset_s = int(utc_offset_minutes) * 60
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._labels = None
+        self._new_labels = {}
+
+    def _flush_due(self):
+        """Whether buffered records or labels should be written; caller holds the lock."""
+        return (len(self._buffer) + len(self._new_labels) >= self.flush_records
+                or time.monotonic() - self._last_flush >= self.flush_seconds)
+
+    def record(self, key, ts, duration, static=0, distance_m=0):
+        """Buffer one observation (durations in ms) for a corridor key."""
+        with self._lock:
+            self._buffer.append((int(ts), corridor_id(key), int(duration), int(static), int(distance_m)))
+            due = self._flush_due()
+        if due:
+            self.flush()
+
+    def record_routes(self, src_lat, src_lng, dest_lat, dest_lng, routes, departure_time=None):
+        """Record the fastest of a fresh routes response (API route dicts)."""
+        observations = [(duration_ms(r.get("duration")), duration_ms(r.get("staticDuration")),
+                         r.get("distanceMeters", 0)) for r in routes if r.get("duration")]
+        if not observations:
+            return
+        ts = (departure_time or datetime.utcnow()).replace(tzinfo=timezone.utc).timestamp()
+        if ts - time.time() > MAX_DEPARTURE_AHEAD_S:
+            return
+        self.record(corridor_key(src_lat, src_lng, dest_lat, dest_lng), ts, *min(observations))
+
+    def flush(self):
+        """Append buffered records to their day files and save new corridor labels."""
+        with self._lock:
+            records, self._buffer = self._buffer, []
+            new_labels, self._new_labels = self._new_labels, {}
+            self._last_flush = time.monotonic()
+        if new_labels:
+            self._save_labels(new_labels)
+        if not records:
+            return
+        data = np.array(records, dtype=RECORD)
+        days = data["ts"] // 86400
+        os.makedirs(self.directory, exist_ok=True)
+        for day in np.unique(days):
+            chunk = data[days == day].tobytes()
+            fd = os.open(self._day_path(int(day)), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, chunk)
+            finally:
+                os.close(fd)
+
+    def label(self, key, text):
+        """Remember a readable name for a corridor key (for the admin view); saved on flush."""
+        cid = str(corridor_id(key))
+        with self._lock:
+            labels = self._load_labels()
+            if labels.get(cid) == text:
+                return
+            labels[cid] = text
+            self._new_labels[cid] = text
+            due = self._flush_due()
+        if due:
+            self.flush()
+
+    def _save_labels(self, new_labels):
+        with self._lock:
+            # Merge with labels other processes wrote since we last read the file
+            self._labels = None
+            labels = self._load_labels()
+            labels.update(new_labels)
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, LABELS_FILE)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(labels, f)
+            os.replace(tmp, path)
+            # Keep labels added since this flush started visible until their own flush
+            labels.update(self._new_labels)
+
+    def labels(self):
+        """{str(corridor id): label} (a copy)."""
+        with self._lock:
+            return dict(self._load_labels())
+
+    def _load_labels(self):
+        """The labels, read from disk on first use; caller holds the lock."""
+        if self._labels is None:
+            try:
+                with open(os.path.join(self.directory, LABELS_FILE)) as f:
+                    self._labels = json.load(f)
+            except (OSError, ValueError):
+                self._labels = {}
+        return self._labels
+
+    def _day_path(self, day):
+        date = datetime(1970, 1, 1) + timedelta(days=day)
+        return os.path.join(self.directory, f"{date:%Y-%m-%d}.bin")
+
+    def load(self, start=None, end=None, corridor=None):
+        """Records with start <= ts < end (Unix seconds), optionally for one corridor key.
+
+        Buffered records are written first, so a quiet worker's last
+        observations show up without waiting for more traffic.
+        """
+        with self._lock:
+            pending = bool(self._buffer or self._new_labels)
+        if pending:
+            self.flush()
+        end = time.time() + MAX_DEPARTURE_AHEAD_S if end is None else end
+        start = end - DEFAULT_WINDOW_DAYS * 86400 if start is None else start
+        cid = None if corridor is None else np.uint64(corridor_id(corridor))
+        parts = []
+        for day in range(int(start // 86400), int(end // 86400) + 1):
+            path = self._day_path(day)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            # A concurrent append may have left a partial trailing record
+            count = size // RECORD.itemsize
+            if count == 0:
+                continue
+            records = np.memmap(path, dtype=RECORD, mode="r", shape=(count,))
+            mask = (records["ts"] >= start) & (records["ts"] < end)
+            if cid is not None:
+                mask &= records["corridor"] == cid
+            parts.append(np.array(records[mask]))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=RECORD)
+
+    def buckets(self, ts, by):
+        """Bucket ids of timestamps: hour (0-23), weekday (0=Mon) or weekday * 24 + hour."""
+        local = ts + self.utc_offset_s
+        hour = (local // 3600) % 24
+        weekday = (local // 86400 + 3) % 7  # 1970-01-01 was a Thursday
+        return {"hour": hour, "weekday": weekday, "weekday_hour": weekday * 24 + hour}[by]
+
+    def percentiles(self, corridor, by="hour", percentiles=DEFAULT_PERCENTILES, start=None, end=None):
+        """Travel-time percentiles of a corridor key per time bucket, in milliseconds.
+
+        Returns [{"bucket", "count", "p50_ms", ...}] sorted by bucket; for
+        by="weekday_hour" the bucket is weekday * 24 + hour.
+        """
+        if by not in GROUPINGS:
+            raise ValueError(f"by must be one of {', '.join(GROUPINGS)}")
+        records = self.load(start, end, corridor)
+        if len(records) == 0:
+            return []
+        ids, counts, values = grouped_percentiles(self.buckets(records["ts"], by), records["duration_ms"],
+                                                  percentiles)
+        return [{"bucket": int(bucket), "count": int(count),
+                 **{f"p{q:g}_ms": int(round(v)) for q, v in zip(percentiles, row)}}
+                for bucket, count, row in zip(ids, counts, values)]
+
+    def predict(self, corridor, when=None, percentile=50, min_samples=None, start=None, end=None):
+        """Expected travel time (ms) of a corridor key at a departure time, or None.
+
+        Uses the same weekday and hour when that bucket has min_samples
+        observations, else the same hour on any day.
+        """
+        min_samples = config.TRAFFIC_HISTORY_MIN_SAMPLES if min_samples is None else min_samples
+        ts = (when or datetime.utcnow()).replace(tzinfo=timezone.utc).timestamp()
+        records = self.load(start, end, corridor)
+        for by in ("weekday_hour", "hour"):
+            bucket = self.buckets(np.array([int(ts)]), by)[0]
+            values = records["duration_ms"][self.buckets(records["ts"], by) == bucket]
+            if len(values) >= max(min_samples, 1):
+                return int(round(np.percentile(values, percentile)))
+        return None
+
+    def trends(self, days=None, limit=20, now=None):
+        """Congestion report per corridor: last `days` days against the `days` before.
+
+        Each row has the corridor label, sample count, p50/p90 travel time,
+        congestion index (median traffic-aware / traffic-free duration), the
+        local hour with the highest median and the change of the median
+        against the previous period. Busiest corridors first.
+        """
+        days = config.TRAFFIC_HISTORY_TREND_DAYS if days is None else days
+        now = time.time() if now is None else now
+        split = now - days * 86400
+        records = self.load(split - days * 86400, now + MAX_DEPARTURE_AHEAD_S)
+        if len(records) == 0:
+            return []
+        recent = records[records["ts"] >= split]
+        previous = records[records["ts"] < split]
+        if len(recent) == 0:
+            return []
+
+        ids, counts, values = grouped_percentiles(recent["corridor"], recent["duration_ms"], (50, 90))
+        has_static = recent["static_ms"] > 0
+        ratio = np.where(has_static, recent["duration_ms"] / np.maximum(recent["static_ms"], 1), np.nan)
+        known = ~np.isnan(ratio)
+        ratio_ids, _, ratio_p50 = grouped_percentiles(recent["corridor"][known], ratio[known], (50,))
+        congestion = dict(zip(ratio_ids.tolist(), ratio_p50[:, 0].tolist()))
+
+        # Peak hour: the (corridor, hour) group with the highest median, per corridor
+        _, inverse = np.unique(recent["corridor"], return_inverse=True)
+        pairs = inverse.ravel() * 24 + self.buckets(recent["ts"], "hour")
+        pair_ids, _, pair_p50 = grouped_percentiles(pairs, recent["duration_ms"], (50,))
+        peak = {}
+        for pair, p50 in zip(pair_ids.tolist(), pair_p50[:, 0].tolist()):
+            corridor, hour = ids[pair // 24].item(), pair % 24
+            if corridor not in peak or p50 > peak[corridor][1]:
+                peak[corridor] = (hour, p50)
+
+        before = {}
+        if len(previous):
+            prev_ids, _, prev_p50 = grouped_percentiles(previous["corridor"], previous["duration_ms"], (50,))
+            before = dict(zip(prev_ids.tolist(), prev_p50[:, 0].tolist()))
+
+        labels = self.labels()
+        rows = []
+        for cid, count, (p50, p90) in zip(ids.tolist(), counts.tolist(), values.tolist()):
+            previous_p50 = before.get(cid)
+            rows.append({
+                "corridor": labels.get(str(cid), f"{cid:016x}"),
+                "samples": count,
+                "p50_ms": int(round(p50)),
+                "p90_ms": int(round(p90)),
+                "congestion_index": round(congestion[cid], 2) if cid in congestion else None,
+                "peak_hour": peak[cid][0],
+                "change_pct": round(100 * (p50 - previous_p50) / previous_p50, 1) if previous_p50 else None,
+            })
+        rows.sort(key=lambda row: -row["samples"])
+        return rows[:limit]
+
+
+_default_history = None
+_default_history_lock = threading.Lock()
+
+
+def get_history():
+    """Return the process-wide traffic history, or None when TRAFFIC_HISTORY_ENABLED is off."""
+    global _default_history
+    if not config.TRAFFIC_HISTORY_ENABLED:
+        return None
+    with _default_history_lock:
+        if _default_history is None:
+            _default_history = TrafficHistory(
+                config.TRAFFIC_HISTORY_DIR,
+                flush_records=config.TRAFFIC_HISTORY_FLUSH_RECORDS,
+                flush_seconds=config.TRAFFIC_HISTORY_FLUSH_SECONDS,
+            )
+            atexit.register(_default_history.flush)
+        return _default_history
+
+
+def set_history(history):
+    """Replace the process-wide traffic history."""
+    global _default_history
+    with _default_history_lock:
+        _default_history = history
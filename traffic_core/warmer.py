@@ -0,0 +1,386 @@
+"""Background warming of popular corridors, with a snapshot that survives restarts.
+
+A few corridors (the place pairs of blocked_roads.json, or the list in
+WARM_CORRIDORS_FILE) get most of the requests. CorridorWarmer visits each of
+them once every WARM_INTERVAL seconds, the visits spread evenly over the
+interval, and
+- fetches routes for the current departure window and the next one, kept in
+  the route cache for as long as requests fall into them, so requests find
+  the next window already cached when they move into it,
+- renders the /api/route GeoJSON (fitted zoom) of the current window, ETAs
+  and rankings included, which the apps serve without planning again,
+- finds the traffic signals along every alternative, again only when a
+  route's geometry changes or after WARM_JUNCTION_TTL.
+
+Upstream calls are made one at a time and at most WARM_RATE per second; a
+cycle that falls behind runs late instead of catching up with a burst.
+
+After every visit the warm state is written as a snapshot: the vertices and
+Douglas-Peucker significance of all routes go to one .npy array, everything
+else to the JSON index WARM_SNAPSHOT_FILE that names the array. At startup
+the array is memory-mapped rather than read, and the route cache, geocode
+cache and warm GeoJSON are seeded from it, so the first requests after a
+deploy or restart are served warm. Seeded geometries are views into the
+mapping, so the processes serving one snapshot share its pages.
+
+Only the process holding WARM_SNAPSHOT_FILE + ".lock" warms; other workers
+reload the snapshot when it changes and take over if that process exits.
+
+    python -m traffic_core.warmer --once    # warm every corridor once and write the snapshot
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from traffic_core import config, http_client, instrumentation
+from traffic_core.blocked_roads_store import get_store
+from traffic_core.geocoding import get_cache, get_coordinates_many, normalize_key
+from traffic_core.geometry import RouteGeometry
+from traffic_core.junctions import get_traffic_junctions, search_traffic_signals
+from traffic_core.rendering import route_feature_collection
+from traffic_core.route_cache import DEPARTURE_LEAD, get_route_cache, get_routes
+from traffic_core.route_planner import plan_between
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): every process warms
+    fcntl = None
+
+SNAPSHOT_FORMAT = 1
+
+
+def load_corridors(path=None):
+    """[(source, destination)] from WARM_CORRIDORS_FILE, else from the blocked roads' route keys."""
+    path = path or config.WARM_CORRIDORS_FILE
+    if os.path.exists(path):
+        with open(path) as f:
+            return [tuple(pair) for pair in json.load(f)]
+    corridors = []
+    for key in get_store().load():
+        names = key.split("_")
+        if len(names) == 2 and all(names):
+            corridors.append(tuple(names))
+    return corridors
+
+
+def corridor_id(source, destination):
+    return normalize_key(source), normalize_key(destination)
+
+
+def geometry_fingerprint(geometry):
+    """Id of a route's exact vertices, to find its warm junctions again."""
+    return hashlib.blake2b(np.ascontiguousarray(geometry.coords).tobytes(), digest_size=16).hexdigest()
+
+
+class CorridorWarmer:
+    """Keeps corridors warm and serves what it precomputed.
+
+    Args:
+    - corridors: [(source, destination)] place names
+    - snapshot_path: JSON index of the snapshot (None: no snapshot)
+    - interval: seconds between two visits of the same corridor
+    - rate: upstream calls per second at most
+    """
+
+    def __init__(self, corridors, snapshot_path=None, interval=None, rate=None, clock=time.time):
+        self.corridors = list(corridors)
+        self.snapshot_path = snapshot_path
+        self.interval = interval or config.WARM_INTERVAL
+        self.rate = rate or config.WARM_RATE
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}  # corridor_id -> record (see warm())
+        self._junctions = {}  # geometry fingerprint -> (fetched_at, [(name, lat, lng)])
+        self._pace_lock = threading.Lock()
+        self._next_call = 0.0
+        self._loaded = None  # mtime of the snapshot last loaded or written
+        self._lock_file = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # Named like the outbound pool so fan_out() runs our searches inline, one at a time
+        self._thread = threading.Thread(target=self._run, name=f"{http_client.WORKER_PREFIX}-warmer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    @property
+    def spacing(self):
+        """Seconds between two corridor visits."""
+        return self.interval / max(len(self.corridors), 1)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if self._acquire():
+                self._warm_forever()
+                return
+            self.load()
+            self._stopped.wait(max(self.spacing / 2, 1.0))
+
+    def _acquire(self):
+        """Take the snapshot's warmer lock; False if another process holds it."""
+        if self.snapshot_path is None or fcntl is None:
+            return True
+        lock_file = open(self.snapshot_path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _warm_forever(self):
+        cycle = self.clock()
+        while not self._stopped.is_set():
+            for i, (source, destination) in enumerate(self.corridors):
+                if self._stopped.wait(max(cycle + i * self.spacing - self.clock(), 0)):
+                    return
+                try:
+                    self.warm(source, destination)
+                    self.save()
+                except Exception as e:
+                    print(f"Error warming {source} -> {destination}: {e}")
+            cycle = max(cycle + self.interval, self.clock())
+            if not self.corridors and self._stopped.wait(self.interval):
+                return
+
+    def _pace(self):
+        """Wait for the next upstream call slot."""
+        with self._pace_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_call)
+            self._next_call = slot + 1.0 / self.rate
+        if slot > now:
+            self._stopped.wait(slot - now)
+
+    def _search(self, point, radius):
+        self._pace()
+        return search_traffic_signals(point, radius)
+
+    def warm(self, source, destination):
+        """Refresh one corridor now; returns its record, or None if it could not be planned.
+
+        A record holds the resolved places, the fetched departure windows
+        ({"departure", "until", "routes"}), and the GeoJSON body of the
+        current window with the blocked roads version it was checked against.
+        """
+        with instrumentation.span("warm_corridor"):
+            src, dest = get_coordinates_many([source, destination])
+            if None in src or None in dest:
+                print(f"Cannot warm {source} -> {destination}: unknown place")
+                return None
+
+            cache = get_route_cache()
+            departure = datetime.utcnow() + DEPARTURE_LEAD
+            windows = []
+            for window in (departure, departure + timedelta(seconds=cache.bucket_seconds)):
+                until = cache.window_end(cache.make_key(*src, *dest, "DRIVE", True, window))
+                self._pace()
+                routes = get_routes(*src, *dest, True, window, until=until)
+                if not routes:
+                    print(f"Cannot warm {source} -> {destination}: no routes")
+                    return None
+                windows.append({"departure": window, "until": until, "routes": routes})
+
+            plan, error = plan_between(source, destination, src, dest)
+            if error:
+                print(f"Cannot warm {source} -> {destination}: {error}")
+                return None
+            record = {
+                "source": source, "destination": destination, "src": list(src), "dest": list(dest),
+                "windows": windows,
+                # Seeded geocodes expire with the entries they came from
+                "geocoded_until": [get_cache().expires_at(source), get_cache().expires_at(destination)],
+                "geojson": json.dumps(route_feature_collection(plan), separators=(",", ":")),
+                # Scheduled closures starting or ending along the routes make the body stale too
+                "geojson_until": min(windows[0]["until"], plan.blocks_until),
+                "blocked_version": plan.blocked_version,
+            }
+            self._warm_junctions([route.geometry for route in plan.routes])
+            with self._lock:
+                self._entries[corridor_id(source, destination)] = record
+            instrumentation.count("warm_corridors_total")
+            return record
+
+    def _warm_junctions(self, geometries):
+        """Search signals along routes not searched within WARM_JUNCTION_TTL (same budget as traffic_map.py)."""
+        if config.WARM_JUNCTION_TTL <= 0:
+            return
+        budget = max(config.JUNCTION_MAX_QUERIES // len(geometries), 2)
+        for geometry in geometries:
+            fingerprint = geometry_fingerprint(geometry)
+            with self._lock:
+                known = self._junctions.get(fingerprint)
+            if known is not None and self.clock() - known[0] < config.WARM_JUNCTION_TTL:
+                continue
+            found = get_traffic_junctions(geometry, search=self._search, max_queries=budget)
+            with self._lock:
+                self._junctions[fingerprint] = (self.clock(), found)
+
+    def geojson(self, source, destination):
+        """The warm /api/route body of a corridor, or None if it is not warm or out of date."""
+        with self._lock:
+            record = self._entries.get(corridor_id(source, destination))
+        fresh = record is not None and record["geojson_until"] > self.clock() and \
+            record["blocked_version"] == get_store().snapshot().version
+        instrumentation.count("warm_geojson_total", result="hit" if fresh else "miss")
+        return record["geojson"] if fresh else None
+
+    def junctions(self, geometry):
+        """Warm [(name, lat, lng)] signals along a route geometry, or None if it was not warmed."""
+        with self._lock:
+            known = self._junctions.get(geometry_fingerprint(geometry))
+        return None if known is None else known[1]
+
+    def save(self):
+        """Write the snapshot: the route vertices to a new .npy array, then the JSON index naming it."""
+        if self.snapshot_path is None:
+            return
+        now = self.clock()
+        with self._lock:
+            records = list(self._entries.values())
+        arrays, corridors, used, offset = [], [], set(), 0
+        for record in records:
+            windows = []
+            for window in record["windows"]:
+                if window["until"] <= now:
+                    continue
+                routes = []
+                for route in window["routes"]:
+                    geometry = route["geometry"]
+                    arrays.append(np.column_stack((geometry.coords, geometry.significance())))
+                    routes.append({"duration": route["duration"], "staticDuration": route["staticDuration"],
+                                   "distanceMeters": route["distanceMeters"],
+                                   "start": offset, "stop": offset + len(geometry)})
+                    offset += len(geometry)
+                    used.add(geometry_fingerprint(geometry))
+                windows.append({"departure": window["departure"].isoformat(), "until": window["until"],
+                                "routes": routes})
+            corridors.append(dict(record, windows=windows))
+        with self._lock:
+            # Signals of geometries no corridor uses any more are dropped
+            self._junctions = {key: value for key, value in self._junctions.items() if key in used}
+            junctions = {key: {"fetched": fetched, "junctions": found}
+                         for key, (fetched, found) in self._junctions.items()}
+
+        directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+        base = os.path.splitext(os.path.basename(self.snapshot_path))[0]
+        # A new array file per save: processes still mapping the old one keep valid pages
+        points = f"{base}-{time.time_ns()}.npy"
+        with open(os.path.join(directory, points + ".tmp"), "wb") as f:
+            np.save(f, np.concatenate(arrays) if arrays else np.empty((0, 3)))
+        os.replace(os.path.join(directory, points + ".tmp"), os.path.join(directory, points))
+        with open(self.snapshot_path + ".tmp", "w") as f:
+            json.dump({"format": SNAPSHOT_FORMAT, "saved": now, "points": points, "corridors": corridors,
+                       "junctions": junctions}, f)
+        os.replace(self.snapshot_path + ".tmp", self.snapshot_path)
+        self._loaded = os.stat(self.snapshot_path).st_mtime_ns
+        for name in os.listdir(directory):
+            if name.startswith(base + "-") and name.endswith(".npy") and name != points:
+                os.remove(os.path.join(directory, name))
+
+    def load(self):
+        """Load the snapshot if it changed and seed the route and geocode caches; True if loaded."""
+        if self.snapshot_path is None:
+            return False
+        try:
+            mtime = os.stat(self.snapshot_path).st_mtime_ns
+            if mtime == self._loaded:
+                return False
+            with open(self.snapshot_path) as f:
+                index = json.load(f)
+            if index.get("format") != SNAPSHOT_FORMAT:
+                return False
+            points = np.load(os.path.join(os.path.dirname(os.path.abspath(self.snapshot_path)), index["points"]),
+                             mmap_mode="r")
+        except FileNotFoundError:  # none yet, or replaced while we read it: next time
+            return False
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading warm snapshot {self.snapshot_path}: {e}")
+            return False
+
+        now = self.clock()
+        cache = get_route_cache()
+        geocoder = get_cache()
+        entries = {}
+        for corridor in index["corridors"]:
+            windows = []
+            for window in corridor["windows"]:
+                if window["until"] <= now:
+                    continue
+                routes = [{"duration": route["duration"], "staticDuration": route["staticDuration"],
+                           "distanceMeters": route["distanceMeters"],
+                           "geometry": RouteGeometry.wrap(np.asarray(points[route["start"]:route["stop"], :2]),
+                                                          np.asarray(points[route["start"]:route["stop"], 2]))}
+                          for route in window["routes"]]
+                departure = datetime.fromisoformat(window["departure"])
+                cache.put(cache.make_key(*corridor["src"], *corridor["dest"], "DRIVE", True, departure), routes,
+                          window["until"])
+                windows.append(dict(window, departure=departure, routes=routes))
+            src_until, dest_until = corridor.get("geocoded_until") or (None, None)
+            geocoder.seed(corridor["source"], corridor["src"], src_until)
+            geocoder.seed(corridor["destination"], corridor["dest"], dest_until)
+            entries[corridor_id(corridor["source"], corridor["destination"])] = dict(corridor, windows=windows)
+        with self._lock:
+            self._entries = entries
+            self._junctions = {key: (value["fetched"], [tuple(junction) for junction in value["junctions"]])
+                               for key, value in index["junctions"].items()}
+        self._loaded = mtime
+        return True
+
+
+_default_warmer = None
+_default_warmer_lock = threading.Lock()
+
+
+def get_warmer():
+    """Return the process-wide warmer over the configured corridors, its snapshot loaded (not started)."""
+    global _default_warmer
+    with _default_warmer_lock:
+        if _default_warmer is None:
+            _default_warmer = CorridorWarmer(load_corridors(), config.WARM_SNAPSHOT_FILE or None)
+            _default_warmer.load()
+        return _default_warmer
+
+
+def set_warmer(warmer):
+    """Replace the process-wide warmer (the caller starts it)."""
+    global _default_warmer
+    with _default_warmer_lock:
+        _default_warmer = warmer
+
+
+instrumentation.describe("warm_corridors_total", "Corridor refreshes by the warmer.")
+instrumentation.describe("warm_geojson_total", "Route API lookups of warm GeoJSON by result.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute routes, GeoJSON and signals for popular corridors.")
+    parser.add_argument("--once", action="store_true", help="warm every corridor once, write the snapshot and exit")
+    args = parser.parse_args()
+
+    warmer = get_warmer()
+    print(f"Warming {len(warmer.corridors)} corridors every {warmer.interval:.0f}s")
+    if not args.once:
+        warmer.start()
+        try:
+            warmer._thread.join()
+        except KeyboardInterrupt:
+            warmer.stop()
+        return
+    for source, destination in warmer.corridors:
+        warmer.warm(source, destination)
+    warmer.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,141 +1,113 @@
-import requests
-import json
-import polyline
-import folium
-from datetime import datetime, timedelta
-
-API_KEY = "ADD KEY"  # Replace with your API Key
-
-def get_coordinates(location_name):
-    """Fetch latitude and longitude for a given location."""
-    geo_url = f"https://maps.googleapis.com/maps/api/geocode/json?address={location_name}&key={API_KEY}"
-    response = requests.get(geo_url)
-    geo_data = response.json()
-    
-    if geo_data['status'] == "OK":
-        return geo_data['results'][0]['geometry']['location']['lat'], geo_data['results'][0]['geometry']['location']['lng']
-    return None, None
-
-def get_traffic_junctions(decoded_route):
-    """Find traffic signals and junctions along the route using Google Places API."""
-    junctions = []
-    for lat, lng in decoded_route[::5]:  # Check every 5th point to reduce API calls
-        places_url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?location={lat},{lng}&radius=100&keyword=traffic%20signal&key={API_KEY}"
-        response = requests.get(places_url)
-        data = response.json()
-        
-        if data["status"] == "OK":
-            for place in data["results"]:
-                junctions.append((place["name"], place["geometry"]["location"]["lat"], place["geometry"]["location"]["lng"]))
-    
-    return junctions
-
-def get_traffic_time(src_lat, src_lng, dest_lat, dest_lng):
-    """Fetch real-time travel duration using Google Distance Matrix API."""
-    matrix_url = f"https://maps.googleapis.com/maps/api/distancematrix/json?origins={src_lat},{src_lng}&destinations={dest_lat},{dest_lng}&departure_time=now&traffic_model=best_guess&key={API_KEY}"
-    response = requests.get(matrix_url)
-    data = response.json()
-    
-    if data["status"] == "OK":
-        return data["rows"][0]["elements"][0]["duration_in_traffic"]["text"]
-    return "Unknown"
+from traffic_core import config, instrumentation
+from traffic_core.blocked_roads_store import get_store
+from traffic_core.geocoding import get_coordinates_many
+from traffic_core import route_cache
+from traffic_core.junctions import get_traffic_junctions
+from traffic_core.rendering import static_map_tolerance
+from traffic_core.route_ranking import format_duration, get_cost_model, rank_routes
+from traffic_core.warmer import get_warmer
+
+def find_junctions(geometry, max_queries=None):
+    """Signals along a route: the warm snapshot's when it has this geometry, else from the Places API."""
+    found = get_warmer().junctions(geometry) if config.WARMER_ENABLED else None
+    return found if found is not None else get_traffic_junctions(geometry, max_queries=max_queries)
 
 def get_routes(source, destination):
-    """Fetch route, find traffic signals, and display traffic delays."""
-    src_lat, src_lng = get_coordinates(source)
-    dest_lat, dest_lng = get_coordinates(destination)
+    """Fetch routes, rank them, find traffic signals on the chosen one and save a map."""
+    import folium
+
+    (src_lat, src_lng), (dest_lat, dest_lng) = get_coordinates_many([source, destination])
 
     if src_lat is None or dest_lat is None:
         print(" Invalid source or destination. Please try again.")
         return
 
-    url = "https://routes.googleapis.com/directions/v2:computeRoutes"
-
-    headers = {
-        "Content-Type": "application/json",
-        "X-Goog-Api-Key": API_KEY,
-        "X-Goog-FieldMask": "routes.duration,routes.distanceMeters,routes.polyline.encodedPolyline"
-    }
-
-    payload = {
-        "origin": {"location": {"latLng": {"latitude": src_lat, "longitude": src_lng}}},
-        "destination": {"location": {"latLng": {"latitude": dest_lat, "longitude": dest_lng}}},
-        "travelMode": "DRIVE",
-        "routingPreference": "TRAFFIC_AWARE",
-        "departureTime": (datetime.utcnow() + timedelta(minutes=5)).isoformat() + "Z",
-        "computeAlternativeRoutes": True
-    }
-
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
-
-    if response.status_code == 200:
-        data = response.json()
-        routes = data.get("routes", [])
-
-        if not routes:
-            print(" No routes found.")
-            return
-
-        # ==========================  MAP VISUALIZATION ==========================
-        route_map = folium.Map(location=[src_lat, src_lng], zoom_start=10)
-
-        # Process each route
-        shortest_route = None
-        shortest_distance = float("inf")
-
-        for index, route in enumerate(routes):
-            encoded_polyline = route['polyline']['encodedPolyline']
-            decoded_coordinates = polyline.decode(encoded_polyline)
-            distance_km = route['distanceMeters'] / 1000
-
-            # Determine if this is the shortest route
-            if distance_km < shortest_distance:
-                shortest_distance = distance_km
-                shortest_route = decoded_coordinates
-
-            # Add the route to the map (Gray for alternative routes)
-            folium.PolyLine(decoded_coordinates, color="gray", weight=4, opacity=0.5).add_to(route_map)
-
-            # Show a label with the route distance
-            mid_point = decoded_coordinates[len(decoded_coordinates) // 2]
-            folium.Marker(mid_point, popup=f"Route {index + 1}: {distance_km:.2f} km",
-                          icon=folium.Icon(color="gray", icon="road")).add_to(route_map)
-
-        # Highlight the shortest route in Blue
-        folium.PolyLine(shortest_route, color="blue", weight=6, opacity=0.9, tooltip="Shortest Path").add_to(route_map)
-
-        # Traffic Signals & Junctions
-        junctions = get_traffic_junctions(shortest_route)
-        for name, lat, lng in junctions:
-            folium.Marker(
-                [lat, lng],
-                popup=f" {name}",
-                icon=folium.Icon(color="orange", icon="exclamation-sign")
-            ).add_to(route_map)
-
-        # ⏳ Real-Time Traffic Delay
-        travel_time = get_traffic_time(src_lat, src_lng, dest_lat, dest_lng)
-
-        # Add Start & End markers with BIG names
-        folium.Marker(shortest_route[0], 
-                      popup=f"<b style='font-size:14px'>{source} (Start)</b><br>🚗 Estimated Travel Time: {travel_time}", 
-                      icon=folium.Icon(color="green", icon="info-sign")).add_to(route_map)
-
-        folium.Marker(shortest_route[-1], 
-                      popup=f"<b style='font-size:14px'>{destination} (End)</b>", 
-                      icon=folium.Icon(color="red", icon="info-sign")).add_to(route_map)
-
-        # Save map as an HTML file
-        file_name = f"{source}_to_{destination}_traffic_routes.html".replace(" ", "_")
-        route_map.save(file_name)
-        print(f"\n Route map saved as '{file_name}'. Open it in a browser.")
-
-    else:
-        print(" Error:", response.text)
-
-# Get user input for source and destination
-source = input("Enter Source Location: ")
-destination = input("Enter Destination Location: ")
-
-# Run the function
-get_routes(source, destination)
+    if config.WARMER_ENABLED:
+        get_warmer()  # seeds the route cache from the warm snapshot
+    routes = route_cache.get_routes(src_lat, src_lng, dest_lat, dest_lng)
+
+    if routes is None:
+        return
+
+    if not routes:
+        print(" No routes found.")
+        return
+
+    # Rank all alternatives at once: durations (with traffic) come with the routes
+    # response, blocked roads from the shared store; signals from the Places API only
+    # for a registered model that weighs them (the built-in ones do not)
+    model = get_cost_model()
+    with instrumentation.span("block_check"):
+        index = get_store().snapshot().index
+        blocked = [index.check_route(route['geometry'].coords)[0].any() for route in routes]
+    junctions = {}
+    if model.uses_signals:
+        # Split the Places budget between the alternatives instead of multiplying it
+        budget = max(config.JUNCTION_MAX_QUERIES // len(routes), 2)
+        for i, route in enumerate(routes):
+            junctions[i] = find_junctions(route['geometry'], max_queries=budget)
+    with instrumentation.span("ranking"):
+        ranking = rank_routes(routes, blocked, [len(junctions[i]) for i in range(len(routes))] if junctions else None,
+                              model)
+    chosen = ranking.chosen
+    explanations = ranking.explanations()
+    for explanation in sorted(explanations, key=lambda e: e["rank"]):
+        print(f" Route {explanation['index'] + 1}: {explanation['summary']} - {explanation['reason']}")
+
+    # ==========================  MAP VISUALIZATION ==========================
+    route_map = folium.Map(location=[src_lat, src_lng], zoom_start=10)
+
+    # Alternatives in gray, worst first
+    for i in ranking.order[::-1]:
+        if i == chosen:
+            continue
+        geometry = routes[i]['geometry']
+        # Draw lines at a level of detail for the map's zoom instead of every vertex
+        tolerance = static_map_tolerance(10, geometry.start[0])
+        folium.PolyLine(geometry.lod(tolerance, cache=True).tolist(), color="gray", weight=4, opacity=0.5).add_to(route_map)
+
+        # Show a label with the route summary
+        folium.Marker(geometry.midpoint().tolist(), popup=f"Route {i + 1}: {explanations[i]['summary']}",
+                      icon=folium.Icon(color="gray", icon="road")).add_to(route_map)
+
+    # Highlight the chosen route in Blue
+    chosen_route = routes[chosen]['geometry']
+    folium.PolyLine(chosen_route.lod(static_map_tolerance(10, chosen_route.start[0]), cache=True).tolist(),
+                    color="blue", weight=6, opacity=0.9,
+                    tooltip=f"Recommended: {explanations[chosen]['summary']}").add_to(route_map)
+
+    # Traffic Signals & Junctions
+    if chosen not in junctions:
+        junctions[chosen] = find_junctions(chosen_route)
+    for name, lat, lng in junctions[chosen]:
+        folium.Marker(
+            [lat, lng],
+            popup=f" {name}",
+            icon=folium.Icon(color="orange", icon="exclamation-sign")
+        ).add_to(route_map)
+
+    # ⏳ Travel time in traffic, from the routes response
+    travel_time = format_duration(ranking.features[chosen, 0])
+
+    # Add Start & End markers with BIG names
+    folium.Marker(chosen_route.start.tolist(), 
+                  popup=f"<b style='font-size:14px'>{source} (Start)</b><br>🚗 Estimated Travel Time: {travel_time}", 
+                  icon=folium.Icon(color="green", icon="info-sign")).add_to(route_map)
+
+    folium.Marker(chosen_route.end.tolist(), 
+                  popup=f"<b style='font-size:14px'>{destination} (End)</b>", 
+                  icon=folium.Icon(color="red", icon="info-sign")).add_to(route_map)
+
+    # Save map as an HTML file
+    file_name = f"{source}_to_{destination}_traffic_routes.html".replace(" ", "_")
+    route_map.save(file_name)
+    print(f"\n Route map saved as '{file_name}'. Open it in a browser.")
+
+def main():
+    # Get user input for source and destination
+    source = input("Enter Source Location: ")
+    destination = input("Enter Destination Location: ")
+    get_routes(source, destination)
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,8 @@
-import os
-import requests
-import json
-import polyline
-import folium
-from datetime import datetime, timedelta
-
-# Google API Key (Please replace with your own)
-API_KEY = "Add your "
-
-# Blocked Roads JSON File - Use the full path provided
-BLOCKED_ROADS_FILE = r"C:\Users\HP\tamilnadiu hackton\traffic_module\blocked_roads.json"
-
-def load_blocked_roads():
-    """Load blocked roads from a JSON file with robust error handling."""
-    try:
-        # Verify file exists
-        if not os.path.exists(BLOCKED_ROADS_FILE):
-            print(f" Blocked roads file not found: {BLOCKED_ROADS_FILE}")
-            return {}
-
-        # Open and parse JSON
-        with open(BLOCKED_ROADS_FILE, "r") as file:
-            blocked_roads = json.load(file)
-            print(" Blocked roads successfully loaded.")
-            return blocked_roads
-    except json.JSONDecodeError:
-        print(f"Error: Invalid JSON format in {BLOCKED_ROADS_FILE}")
-        return {}
-    except Exception as e:
-        print(f"Unexpected error loading blocked roads: {e}")
-        return {}
+from traffic_core.geocoding import get_coordinates_many
+from traffic_core import route_cache
+from traffic_core.spatial_index import blocked_runs, road_name
+from traffic_core.blocked_roads_store import get_store
+from traffic_core.rendering import static_map_tolerance
 
 def check_road_blocked(source, destination, route_coordinates):
     """
@@ -38,12 +11,15 @@ def check_road_blocked(source, destination, route_coordinates):
     Args:
     - source: Starting location name
     - destination: Ending location name
-    - route_coordinates: List of (lat, lon) coordinates of the route
+    - route_coordinates: RouteGeometry (or (N, 2) array) of the route
     
     Returns:
-    - List of blocked road segments
+    - List of blocked road segments (names listed for this route plus any
+      road whose geometry the route passes through)
+    - Boolean array marking the route vertices that touch a blocked geometry
     """
-    blocked_roads = load_blocked_roads()
+    blocked = get_store().snapshot()
+    blocked_roads = blocked.blocked_roads
     blocked_segments = []
     
     # Create route key (case-insensitive and handle potential space variations)
@@ -56,155 +32,122 @@ def check_road_blocked(source, destination, route_coordinates):
     # Check against all possible route key variations
     for route_key in route_keys:
         if route_key in blocked_roads:
-            blocked_road_names = blocked_roads[route_key]
+            blocked_road_names = [road_name(entry) for entry in blocked_roads[route_key]]
             blocked_segments.extend(blocked_road_names)
             print(f"🚧 Blocked roads found for route {route_key}: {blocked_road_names}")
+
+    # Geometric blocks apply to every route that passes through them
+    blocked_mask, hit_blocks = blocked.index.check_route(route_coordinates)
+    for _, road in hit_blocks:
+        if road not in blocked_segments:
+            blocked_segments.append(road)
+            print(f"🚧 Route passes through blocked road: {road}")
     
-    return blocked_segments
-
-def get_coordinates(location_name):
-    """Fetch latitude and longitude for a given location using Google Geocoding API."""
-    geo_url = f"https://maps.googleapis.com/maps/api/geocode/json?address={location_name}&key={API_KEY}"
-    response = requests.get(geo_url)
-    geo_data = response.json()
-
-    if geo_data['status'] == "OK":
-        lat = geo_data['results'][0]['geometry']['location']['lat']
-        lng = geo_data['results'][0]['geometry']['location']['lng']
-        return lat, lng
-    else:
-        print(f"Error fetching coordinates for {location_name}: {geo_data['status']}")
-        return None, None
+    return blocked_segments, blocked_mask
 
 def get_routes(source, destination):
     """Advanced route visualization with blocked roads detection."""
-    src_lat, src_lng = get_coordinates(source)
-    dest_lat, dest_lng = get_coordinates(destination)
+    import folium
+
+    (src_lat, src_lng), (dest_lat, dest_lng) = get_coordinates_many([source, destination])
 
     if src_lat is None or dest_lat is None:
         print("Invalid source or destination. Please try again.")
         return
 
-    url = "https://routes.googleapis.com/directions/v2:computeRoutes"
-
-    headers = {
-        "Content-Type": "application/json",
-        "X-Goog-Api-Key": API_KEY,
-        "X-Goog-FieldMask": "routes.duration,routes.distanceMeters,routes.polyline.encodedPolyline"
-    }
-
-    # Set a future timestamp (current time + 5 minutes)
-    future_time = (datetime.utcnow() + timedelta(minutes=5)).isoformat() + "Z"
-
-    payload = {
-        "origin": {
-            "location": {
-                "latLng": {
-                    "latitude": src_lat,
-                    "longitude": src_lng
-                }
-            }
-        },
-        "destination": {
-            "location": {
-                "latLng": {
-                    "latitude": dest_lat,
-                    "longitude": dest_lng
-                }
-            }
-        },
-        "travelMode": "DRIVE",
-        "routingPreference": "TRAFFIC_AWARE",
-        "departureTime": future_time,
-        "computeAlternativeRoutes": False
-    }
-
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
-
-    if response.status_code == 200:
-        data = response.json()
-        encoded_polyline = data['routes'][0]['polyline']['encodedPolyline']
-        
-        print("\n=== Shortest Route Found ===")
-        print(f"Total Distance: {data['routes'][0]['distanceMeters'] / 1000:.2f} km")
-        print(f"Estimated Time: {data['routes'][0]['duration']}")
-
-        # Decode the polyline to get latitude and longitude coordinates
-        decoded_coordinates = polyline.decode(encoded_polyline)
-
-        # Check for blocked roads
-        blocked_segments = check_road_blocked(source, destination, decoded_coordinates)
-        
-        # ========================== 🌍 MAP VISUALIZATION ==========================
-        # Create a folium map centered at source location
-        route_map = folium.Map(location=[src_lat, src_lng], zoom_start=7)
-
-        # Visualize entire route in blue
-        folium.PolyLine(
-            decoded_coordinates, 
-            color="blue", 
-            weight=5, 
-            opacity=0.5, 
-            dash_array='10'  # Dashed line for full route
-        ).add_to(route_map)
-
-        # Highlight shortest path in green
-        folium.PolyLine(
-            decoded_coordinates, 
-            color="green", 
-            weight=7, 
-            opacity=0.8
-        ).add_to(route_map)
-
-        # Highlight blocked segments in red
-        if blocked_segments:
-            print("\n BLOCKED ROAD SEGMENTS:")
-            for segment in blocked_segments:
-                print(f" Blocked: {segment}")
-                # Add red markers or lines to indicate blocked segments
-                folium.PolyLine(
-                    decoded_coordinates, 
-                    color="red", 
-                    weight=8, 
-                    opacity=1, 
-                    dash_array='2'  # Dotted line for blocked segments
-                ).add_to(route_map)
-
-        # Add dynamic markers for Start & End
-        start_marker = folium.Marker(
-            decoded_coordinates[0], 
-            popup=f"{source} (Start)", 
-            icon=folium.Icon(color="green", icon="play")
-        )
-        end_marker = folium.Marker(
-            decoded_coordinates[-1], 
-            popup=f"{destination} (End)", 
-            icon=folium.Icon(color="red", icon="stop")
-        )
-
-        # Add pulsing effect to markers
-        start_marker.add_to(route_map)
-        end_marker.add_to(route_map)
-
-        # Save map as an HTML file with dynamic visualization
-        file_name = f"{source}_to_{destination}_route.html".replace(" ", "_")
-        route_map.save(file_name)
-        print(f"\nDynamic route map saved as '{file_name}'. Open it in a browser.")
-
-    else:
-        print(" Error:", response.text)
+    routes = route_cache.get_routes(src_lat, src_lng, dest_lat, dest_lng, alternatives=False)
+
+    if routes is None:
+        return
+
+    if not routes:
+        print("No routes found.")
+        return
+
+    route = routes[0]
+
+    print("\n=== Shortest Route Found ===")
+    print(f"Total Distance: {route['distanceMeters'] / 1000:.2f} km")
+    print(f"Estimated Time: {route['duration']}")
+
+    # Latitude and longitude coordinates of the route
+    geometry = route['geometry']
+
+    # Check for blocked roads
+    blocked_segments, blocked_mask = check_road_blocked(source, destination, geometry)
+    
+    # ========================== 🌍 MAP VISUALIZATION ==========================
+    # Create a folium map centered at source location
+    route_map = folium.Map(location=[src_lat, src_lng], zoom_start=7)
+    # Level of detail for the map's zoom; the full polyline is mostly sub-pixel here
+    tolerance = static_map_tolerance(7, geometry.start[0])
+    decoded_coordinates = geometry.lod(tolerance, cache=True).tolist()
+
+    # Visualize entire route in blue
+    folium.PolyLine(
+        decoded_coordinates, 
+        color="blue", 
+        weight=5, 
+        opacity=0.5, 
+        dash_array='10'  # Dashed line for full route
+    ).add_to(route_map)
+
+    # Highlight shortest path in green
+    folium.PolyLine(
+        decoded_coordinates, 
+        color="green", 
+        weight=7, 
+        opacity=0.8
+    ).add_to(route_map)
+
+    # Highlight blocked segments in red
+    if blocked_segments:
+        print("\n BLOCKED ROAD SEGMENTS:")
+        for segment in blocked_segments:
+            print(f" Blocked: {segment}")
+
+        # Red lines over the stretches that touch a blocked geometry; name-only
+        # blocks have no location, so the whole route is marked instead
+        runs = blocked_runs(blocked_mask) or [(0, len(geometry))]
+        for start, stop in runs:
+            folium.PolyLine(
+                geometry.lod(tolerance, start, stop).tolist(), 
+                color="red", 
+                weight=8, 
+                opacity=1, 
+                dash_array='2'  # Dotted line for blocked segments
+            ).add_to(route_map)
+
+    # Add dynamic markers for Start & End
+    start_marker = folium.Marker(
+        decoded_coordinates[0], 
+        popup=f"{source} (Start)", 
+        icon=folium.Icon(color="green", icon="play")
+    )
+    end_marker = folium.Marker(
+        decoded_coordinates[-1], 
+        popup=f"{destination} (End)", 
+        icon=folium.Icon(color="red", icon="stop")
+    )
+
+    # Add pulsing effect to markers
+    start_marker.add_to(route_map)
+    end_marker.add_to(route_map)
+
+    # Save map as an HTML file with dynamic visualization
+    file_name = f"{source}_to_{destination}_route.html".replace(" ", "_")
+    route_map.save(file_name)
+    print(f"\nDynamic route map saved as '{file_name}'. Open it in a browser.")
+
 
 # Interactive route selection
 def main():
     print("Advanced Route Visualization Tool")
     
-    # Print the actual file path being used
-    print(f" Blocked Roads File: {BLOCKED_ROADS_FILE}")
-    
-    # Verify file exists before proceeding
-    if not os.path.exists(BLOCKED_ROADS_FILE):
-        print(" Blocked roads file not found. Please check the file path.")
-        return
+    # Print the actual database path being used
+    store = get_store()
+    print(f" Blocked Roads Database: {store.path}")
+    print(f" {sum(len(roads) for roads in store.load().values())} blocked road(s) loaded.")
 
     source = input("Enter Source Location: ")
     destination = input("Enter Destination Location: ")
@@ -0,0 +1,12 @@
+"""Parking occupancy detection from camera streams.
+
+Importing the package is cheap: OpenCV and the detector load with
+vehicle_parking.pipeline, on the first call of get_pipeline().
+"""
+
+
+def get_pipeline():
+    """The process-wide parking pipeline (see vehicle_parking.pipeline.get_pipeline)."""
+    from vehicle_parking.pipeline import get_pipeline
+
+    return get_pipeline()
@@ -0,0 +1,91 @@
+"""Cheap motion gate in front of ParkingDetector.
+
+Each frame is downscaled and blurred, then compared with references at low
+resolution:
+- Slot reference: each slot's pixels as they were the last time that slot
+  was evaluated. A slot is re-evaluated only when enough of its pixels moved
+  past the reference. Slow drifts (dusk, clouds) therefore add up until they
+  trigger too, instead of slipping through frame-to-frame differences.
+- Scene reference: the whole frame as last encoded. The caller re-encodes
+  only when something visible changed; otherwise it reuses the last JPEG.
+
+The per-slot moved-pixel counts use the same flat index plus np.bincount
+layout as the detector, at the reduced resolution.
+"""
+import cv2
+import numpy as np
+
+from vehicle_parking.parking_detector import rasterize_slots, slot_ranges
+
+DEFAULT_SCALE = 0.25
+# Gray-level difference (0-255) for a downscaled pixel to count as moved
+DEFAULT_PIXEL_THRESHOLD = 20
+# Fraction of a slot's (or the scene's) pixels that must move
+DEFAULT_MOTION_FRACTION = 0.02
+# Every this many frames all slots are re-evaluated regardless
+DEFAULT_FULL_REFRESH = 250
+
+
+class MotionGate:
+    """Decides, per frame, which slots need re-evaluation and whether to re-encode.
+
+    Args:
+    - detector: the ParkingDetector whose slots are gated
+    - scale: downscale factor of the comparison images
+    - pixel_threshold: gray-level change counted as motion
+    - motion_fraction: share of moved pixels that marks a slot (or the scene) as changed
+    - full_refresh: frames between unconditional full evaluations (0 disables)
+    """
+
+    def __init__(self, detector, scale=DEFAULT_SCALE, pixel_threshold=DEFAULT_PIXEL_THRESHOLD,
+                 motion_fraction=DEFAULT_MOTION_FRACTION, full_refresh=DEFAULT_FULL_REFRESH):
+        self.scale = scale
+        self.pixel_threshold = pixel_threshold
+        self.motion_fraction = motion_fraction
+        self.full_refresh = full_refresh
+        width, height = detector.frame_size
+        self.size = (max(int(round(width * scale)), 1), max(int(round(height * scale)), 1))
+        xs, ys, self._labels, self._offsets = rasterize_slots(detector.polygons, detector.frame_size, scale)
+        self._index = ys * self.size[0] + xs
+        self._areas = np.maximum(np.diff(self._offsets), 1)
+        self._slot_reference = None
+        self._scene_reference = None
+        self._frames = 0
+        self.stats = {"frames": 0, "slots_evaluated": 0, "full_refreshes": 0}
+
+    def _small(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def check(self, frame):
+        """(slot indices to re-evaluate, whether to re-encode) for a new frame.
+
+        The references of the returned slots (and of the scene, when a re-encode
+        is requested) are moved to this frame: the caller is expected to act on it.
+        """
+        small = self._small(frame)
+        self._frames += 1
+        self.stats["frames"] += 1
+        refresh = self.full_refresh and self._frames % self.full_refresh == 0
+        if self._slot_reference is None or refresh:
+            self._slot_reference = small.copy()
+            self._scene_reference = small
+            self.stats["full_refreshes"] += 1
+            dirty = np.arange(len(self._areas))
+            self.stats["slots_evaluated"] += len(dirty)
+            return dirty, True
+
+        moved = cv2.absdiff(small, self._slot_reference).ravel()[self._index] > self.pixel_threshold
+        fractions = np.bincount(self._labels[moved], minlength=len(self._areas)) / self._areas
+        dirty = np.flatnonzero(fractions > self.motion_fraction)
+        if len(dirty):
+            pixels = self._index[slot_ranges(self._offsets, dirty)]
+            self._slot_reference.ravel()[pixels] = small.ravel()[pixels]
+            self.stats["slots_evaluated"] += len(dirty)
+
+        scene_moved = np.count_nonzero(cv2.absdiff(small, self._scene_reference) > self.pixel_threshold)
+        redraw = scene_moved > self.motion_fraction * small.size
+        if redraw:
+            self._scene_reference = small
+        return dirty, redraw
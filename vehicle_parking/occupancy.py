@@ -0,0 +1,81 @@
+"""Stable per-slot occupancy from noisy per-frame edge ratios.
+
+A passing pedestrian, a shadow or compression noise can push a slot's edge
+ratio over the threshold for a frame or two. The tracker only flips a slot
+when its ratio is clearly past the threshold (hysteresis: above
+threshold + margin to become occupied, below threshold - margin to become
+free) for `debounce` processed frames in a row. Everything is done on whole
+arrays, so the cost per frame does not depend on the number of slots.
+"""
+import time
+
+import numpy as np
+
+DEFAULT_HYSTERESIS = 0.03
+DEFAULT_DEBOUNCE_FRAMES = 5
+
+
+class OccupancyTracker:
+    """Debounced, hysteresis-filtered occupancy of the slots of one camera.
+
+    Args:
+    - slot_ids: slot names, aligned with the ratio arrays passed to update()
+    - threshold: edge ratio separating free from occupied
+    - hysteresis: half-width of the band around threshold where a slot keeps its state
+    - debounce: consecutive frames a new state must hold before it is accepted
+    """
+
+    def __init__(self, slot_ids, threshold, hysteresis=DEFAULT_HYSTERESIS, debounce=DEFAULT_DEBOUNCE_FRAMES):
+        self.slot_ids = list(slot_ids)
+        self.threshold = threshold
+        self.low = threshold - hysteresis
+        self.high = threshold + hysteresis
+        self.debounce = max(int(debounce), 1)
+        self.occupied = None
+        self._streak = np.zeros(len(self.slot_ids), dtype=np.int32)
+        self.version = 0
+        self.updated_at = None
+
+    def update(self, ratios):
+        """Feed one frame's ratios; returns the indices of slots whose state changed."""
+        ratios = np.asarray(ratios)
+        if self.occupied is None:
+            # The first frame sets the initial state without debouncing
+            self.occupied = ratios > self.threshold
+            self.version = 1
+            self.updated_at = time.time()
+            return np.empty(0, dtype=np.intp)
+        wanted = np.where(ratios > self.high, True, np.where(ratios < self.low, False, self.occupied))
+        differs = wanted != self.occupied
+        self._streak = np.where(differs, self._streak + 1, 0)
+        changed = np.flatnonzero(self._streak >= self.debounce)
+        if len(changed):
+            self.occupied[changed] = ~self.occupied[changed]
+            self._streak[changed] = 0
+            self.version += 1
+            self.updated_at = time.time()
+        return changed
+
+    def counts(self):
+        total = len(self.slot_ids)
+        occupied = int(self.occupied.sum()) if self.occupied is not None else 0
+        return {"total": total, "occupied": occupied, "free": total - occupied}
+
+    def snapshot(self):
+        """JSON-ready state of every slot."""
+        occupied = self.occupied if self.occupied is not None else np.zeros(len(self.slot_ids), dtype=bool)
+        return {
+            "version": self.version,
+            "updated_at": self.updated_at,
+            **self.counts(),
+            "slots": [{"id": slot_id, "occupied": bool(state)} for slot_id, state in zip(self.slot_ids, occupied)],
+        }
+
+    def change_event(self, changed):
+        """JSON-ready description of the slots in `changed` after an update()."""
+        return {
+            "version": self.version,
+            "updated_at": self.updated_at,
+            **self.counts(),
+            "changes": [{"id": self.slot_ids[i], "occupied": bool(self.occupied[i])} for i in changed],
+        }
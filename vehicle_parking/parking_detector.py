@@ -0,0 +1,190 @@
+"""Parking-slot occupancy for a fixed camera.
+
+Slots are rectangles or polygons in frame pixels, loaded from a JSON file:
+
+    {"slots": [{"id": "A1", "rect": [x, y, w, h]},
+               {"id": "A2", "polygon": [[x, y], [x, y], ...]}]}
+
+At construction every slot pixel is flattened once into two aligned arrays:
+the pixel's index in the (cropped) frame and the slot it belongs to. Each
+frame is thresholded once (adaptive threshold, the usual edge-density test
+for a parked car) and the set pixels of every slot are counted in a single
+np.bincount, so the cost per frame barely depends on the number of slots.
+"""
+import json
+
+import cv2
+import numpy as np
+
+
+# Fraction of a slot's pixels that must be edges for it to count as occupied
+DEFAULT_OCCUPIED_RATIO = 0.12
+FREE_COLOR = (0, 200, 0)
+OCCUPIED_COLOR = (0, 0, 255)
+# Extra pixels around a slot when thresholding it alone: half the adaptive
+# threshold block plus the median and dilation windows
+ROI_MARGIN = 12 + 2 + 1
+
+
+def slot_polygon(slot):
+    """(K, 2) int32 vertices of a slot given as {"rect": [x, y, w, h]} or {"polygon": [...]}."""
+    if "rect" in slot:
+        x, y, w, h = slot["rect"]
+        return np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], dtype=np.int32)
+    return np.asarray(slot["polygon"], dtype=np.int32).reshape(-1, 2)
+
+
+def load_slots(path):
+    """Read the slot list of a slots JSON file."""
+    with open(path) as f:
+        return json.load(f)["slots"]
+
+
+def rasterize_slots(polygons, frame_size, scale=1.0):
+    """Pixels of every slot, slot after slot.
+
+    Returns (xs, ys, labels, offsets): pixel coordinates in a frame of
+    frame_size scaled by `scale`, the slot of each pixel, and offsets such
+    that slot i owns pixels offsets[i]:offsets[i + 1].
+    """
+    width, height = (int(round(v * scale)) for v in frame_size)
+    xs, ys = [], []
+    for polygon in polygons:
+        polygon = np.round(polygon * scale).astype(np.int32)
+        # Rasterize the slot inside its own bounding box only
+        bx, by, bw, bh = cv2.boundingRect(polygon)
+        mask = np.zeros((bh, bw), dtype=np.uint8)
+        cv2.fillPoly(mask, [polygon - (bx, by)], 1)
+        py, px = np.nonzero(mask)
+        px, py = px + bx, py + by
+        inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+        xs.append(px[inside])
+        ys.append(py[inside])
+    sizes = np.array([len(x) for x in xs], dtype=np.intp)
+    offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.intp)
+    labels = np.repeat(np.arange(len(polygons), dtype=np.intp), sizes)
+    if not xs:
+        return np.empty(0, np.intp), np.empty(0, np.intp), labels, offsets
+    return np.concatenate(xs).astype(np.intp), np.concatenate(ys).astype(np.intp), labels, offsets
+
+
+def slot_ranges(offsets, slots):
+    """Indices into the rasterized pixel arrays of the given slots."""
+    return np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in slots]) if len(slots) else \
+        np.empty(0, np.intp)
+
+
+class ParkingDetector:
+    """Occupancy of every slot of one camera view, computed in one pass per frame.
+
+    Args:
+    - slots: list of {"id", "rect" | "polygon"} dicts in frame pixel coordinates
+    - frame_size: (width, height) of the frames that will be processed
+    - occupied_ratio: edge-pixel fraction above which a slot is occupied
+    """
+
+    def __init__(self, slots, frame_size, occupied_ratio=DEFAULT_OCCUPIED_RATIO):
+        width, height = frame_size
+        self.slot_ids = [str(slot.get("id", i)) for i, slot in enumerate(slots)]
+        self.polygons = [slot_polygon(slot) for slot in slots]
+        self.occupied_ratio = occupied_ratio
+        self.frame_size = (width, height)
+
+        self._xs, self._ys, self._pixel_slot, self._offsets = rasterize_slots(self.polygons, self.frame_size)
+        # Per-slot pixel bounding boxes (x0, y0, x1, y1) for ROI-only evaluation
+        self.boxes = np.zeros((len(self.polygons), 4), dtype=np.intp)
+        for i in range(len(self.polygons)):
+            xs = self._xs[self._offsets[i]:self._offsets[i + 1]]
+            ys = self._ys[self._offsets[i]:self._offsets[i + 1]]
+            if len(xs):
+                self.boxes[i] = xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+
+        # Only the region covering the slots is thresholded
+        if len(self._xs):
+            x0, y0, x1, y1 = self._xs.min(), self._ys.min(), self._xs.max() + 1, self._ys.max() + 1
+        else:
+            x0 = y0 = x1 = y1 = 0
+        self.crop = (int(x0), int(y0), int(x1), int(y1))
+        self._pixel_index = (self._ys - y0) * (x1 - x0) + (self._xs - x0)
+        self.areas = np.maximum(np.diff(self._offsets), 1)
+
+    @classmethod
+    def from_file(cls, path, frame_size, **kwargs):
+        return cls(load_slots(path), frame_size, **kwargs)
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def preprocess(self, frame):
+        """Binary edge image of the slot region of a BGR (or gray) frame."""
+        x0, y0, x1, y1 = self.crop
+        return self._binary(frame[y0:y1, x0:x1])
+
+    def _binary(self, region):
+        gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY) if region.ndim == 3 else region
+        blurred = cv2.GaussianBlur(gray, (3, 3), 1)
+        binary = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                       cv2.THRESH_BINARY_INV, 25, 16)
+        binary = cv2.medianBlur(binary, 5)
+        return cv2.dilate(binary, np.ones((3, 3), np.uint8), iterations=1)
+
+    def ratios(self, binary):
+        """Edge-pixel fraction of every slot from a preprocessed binary image."""
+        hits = binary.ravel()[self._pixel_index] != 0
+        counts = np.bincount(self._pixel_slot[hits], minlength=len(self.polygons))
+        return counts / self.areas
+
+    def ratios_of(self, frame, slots):
+        """Edge-pixel fraction of only the given slots (indices), thresholding just their region.
+
+        The region is the union of the slots' boxes plus a margin covering the
+        threshold and filter windows, so the result matches ratios() on the full frame.
+        """
+        slots = np.asarray(slots, dtype=np.intp)
+        if len(slots) == 0:
+            return np.empty(0)
+        if 2 * len(slots) > len(self.polygons):
+            return self.ratios(self.preprocess(frame))[slots]
+        width, height = self.frame_size
+        boxes = self.boxes[slots]
+        x0, y0 = np.maximum(boxes[:, :2].min(axis=0) - ROI_MARGIN, 0)
+        x1, y1 = np.minimum(boxes[:, 2:].max(axis=0) + ROI_MARGIN, (width, height))
+        binary = self._binary(frame[y0:y1, x0:x1])
+        pixels = slot_ranges(self._offsets, slots)
+        index = (self._ys[pixels] - y0) * (x1 - x0) + (self._xs[pixels] - x0)
+        hits = binary.ravel()[index] != 0
+        labels = np.repeat(np.arange(len(slots)), np.diff(self._offsets)[slots])
+        return np.bincount(labels[hits], minlength=len(slots)) / self.areas[slots]
+
+    def occupancy(self, frame):
+        """Boolean array of occupied slots and their edge ratios for one frame."""
+        ratios = self.ratios(self.preprocess(frame))
+        return ratios > self.occupied_ratio, ratios
+
+    def annotate(self, frame, occupied):
+        """Draw every slot outline (two polylines calls in total) and the free count on a copy."""
+        out = frame.copy()
+        occupied = np.asarray(occupied, dtype=bool)
+        for state, color in ((False, FREE_COLOR), (True, OCCUPIED_COLOR)):
+            polygons = [p for p, o in zip(self.polygons, occupied) if o == state]
+            if polygons:
+                cv2.polylines(out, polygons, True, color, 2)
+        free = int((~occupied).sum())
+        cv2.putText(out, f"Free: {free}/{len(occupied)}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX,
+                    1.2, FREE_COLOR if free else OCCUPIED_COLOR, 3)
+        return out
+
+    def process(self, frame):
+        """(annotated frame, occupied mask) for one frame."""
+        occupied, _ = self.occupancy(frame)
+        return self.annotate(frame, occupied), occupied
+
+
+def open_capture(source):
+    """cv2.VideoCapture for a camera index ("0") or a file/stream URL."""
+    return cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+
+
+def frame_size_of(capture):
+    return int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
@@ -0,0 +1,346 @@
+"""Shared capture -> detection -> JPEG pipeline for every parking camera.
+
+Each camera has exactly one capture thread, however many browsers watch it.
+Captured frames go into a one-slot mailbox where the newest frame replaces
+an unprocessed older one (stale frames are dropped, never queued). A small
+detection pool shared by all cameras runs ParkingDetector on the newest
+frame, with at most one frame per camera in flight, and encodes the
+annotated result to JPEG once. Viewers only wait for the next published
+JPEG and write the same bytes, so CPU cost grows with cameras, not viewers.
+
+The same detection pass feeds an OccupancyTracker per camera. Its debounced
+slot states are what the annotated frames show and what the occupancy API
+serves. Every change is kept as a versioned event so Server-Sent-Event
+clients get only the slots that changed.
+
+With PARKING_MOTION_GATING on, a MotionGate sits in front of the detector:
+only slots whose pixels moved are re-evaluated, and when nothing visible
+changed the frame is not annotated or encoded at all (viewers keep the last
+JPEG). The "skipped" counter and the gate's "slots_evaluated" show the saving.
+
+Cameras come from PARKING_CAMERAS_FILE:
+
+    {"cameras": [{"id": "north", "source": "rtsp://...", "slots_file": "north_slots.json"},
+                 {"id": "lot-b", "source": "0"}]}
+
+or, when that file does not exist, a single "default" camera on
+PARKING_VIDEO_SOURCE with PARKING_SLOTS_FILE.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from traffic_core import config
+from traffic_core.sse import KEEPALIVE, SSE_KEEPALIVE, sse_message
+from vehicle_parking.motion import MotionGate
+from vehicle_parking.occupancy import OccupancyTracker
+from vehicle_parking.parking_detector import ParkingDetector, frame_size_of, open_capture
+
+DEFAULT_CAMERA = "default"
+# Seconds between reconnect attempts of a camera that failed
+RECONNECT_DELAY = 2.0
+# Change events kept per camera for clients resuming with Last-Event-ID
+EVENT_HISTORY = 256
+
+
+def mjpeg_part(jpeg):
+    """One part of a multipart/x-mixed-replace stream."""
+    return b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
+
+
+class Camera:
+    """One camera: capture thread, latest-frame mailbox and the last published JPEG.
+
+    Args:
+    - camera_id: name used in URLs
+    - source: camera index ("0") or video file / stream URL
+    - slots_file: slot layout JSON for this view
+    - pool: executor the detection runs on, shared between cameras
+    - motion_gating: put a MotionGate in front of the detector (default PARKING_MOTION_GATING)
+    """
+
+    def __init__(self, camera_id, source, slots_file, pool, occupied_ratio=None, jpeg_quality=None,
+                 motion_gating=None):
+        self.camera_id = camera_id
+        self.source = source
+        self.slots_file = slots_file
+        self.occupied_ratio = occupied_ratio or config.PARKING_OCCUPIED_RATIO
+        self.jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality or config.PARKING_JPEG_QUALITY]
+        self.motion_gating = config.PARKING_MOTION_GATING if motion_gating is None else motion_gating
+        self.detector = None
+        self.tracker = None
+        self.motion = None
+        self._ratios = None
+        self.events = deque(maxlen=EVENT_HISTORY)
+        self._pool = pool
+        self._lock = threading.Lock()
+        self._pending = None
+        self._scheduled = False
+        self._published = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.jpeg = None
+        self.sequence = 0
+        self.stats = {"captured": 0, "dropped": 0, "processed": 0, "viewers": 0, "errors": 0, "skipped": 0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._capture_loop, name=f"camera-{self.camera_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        with self._published:
+            self._published.notify_all()
+
+    def _capture_loop(self):
+        while not self._stopped.is_set():
+            capture = open_capture(self.source)
+            if not capture.isOpened():
+                print(f"Camera {self.camera_id}: cannot open {self.source}")
+                self._stopped.wait(RECONNECT_DELAY)
+                continue
+            try:
+                self._read_frames(capture)
+            finally:
+                capture.release()
+
+    def prepare(self, frame_size):
+        """Build the detector, occupancy tracker and motion gate for frames of frame_size."""
+        self.detector = ParkingDetector.from_file(self.slots_file, frame_size, occupied_ratio=self.occupied_ratio)
+        self.tracker = OccupancyTracker(self.detector.slot_ids, self.occupied_ratio,
+                                        hysteresis=config.PARKING_HYSTERESIS,
+                                        debounce=config.PARKING_DEBOUNCE_FRAMES)
+        if self.motion_gating:
+            self.motion = MotionGate(self.detector, scale=config.PARKING_MOTION_SCALE,
+                                     pixel_threshold=config.PARKING_MOTION_THRESHOLD,
+                                     motion_fraction=config.PARKING_MOTION_FRACTION,
+                                     full_refresh=config.PARKING_FULL_REFRESH_FRAMES)
+
+    def _read_frames(self, capture):
+        if self.detector is None:
+            self.prepare(frame_size_of(capture))
+        # Recorded files are played back in real time instead of as fast as they decode
+        is_file = capture.get(cv2.CAP_PROP_FRAME_COUNT) > 0
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        interval = 1.0 / fps if is_file else 0.0
+        next_frame = time.monotonic()
+        while not self._stopped.is_set():
+            ok, frame = capture.read()
+            if not ok:
+                if is_file:
+                    capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                print(f"Camera {self.camera_id}: stream ended, reconnecting")
+                self._stopped.wait(RECONNECT_DELAY)
+                return
+            self._offer(frame)
+            if interval:
+                next_frame += interval
+                delay = next_frame - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame = time.monotonic()
+
+    def _offer(self, frame):
+        """Put a frame in the mailbox, replacing an unprocessed one, and schedule detection."""
+        with self._lock:
+            self.stats["captured"] += 1
+            if self._pending is not None:
+                self.stats["dropped"] += 1
+            self._pending = frame
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._pool.submit(self._detect)
+
+    def _detect(self):
+        """Process the newest frame until the mailbox is empty; runs on the shared pool."""
+        while True:
+            with self._lock:
+                frame, self._pending = self._pending, None
+                if frame is None:
+                    self._scheduled = False
+                    return
+            try:
+                jpeg = self.process_frame(frame)
+            except cv2.error as e:
+                print(f"Camera {self.camera_id}: detection failed: {e}")
+                with self._lock:
+                    self.stats["errors"] += 1
+                continue
+            if jpeg is not None:
+                self.publish(jpeg)
+
+    def process_frame(self, frame):
+        """Detect, record occupancy changes and encode one frame.
+
+        Returns the JPEG bytes, or None when the frame was skipped because the
+        scene is static (viewers keep the last JPEG).
+        """
+        ratios, redraw = self._evaluate(frame)
+        with self._published:
+            changed = self.tracker.update(ratios)
+            occupied = self.tracker.occupied.copy()
+            if len(changed):
+                self.events.append(self.tracker.change_event(changed))
+                self._published.notify_all()
+        if not redraw and not len(changed):
+            with self._lock:
+                self.stats["skipped"] += 1
+            return None
+        ok, jpeg = cv2.imencode(".jpg", self.detector.annotate(frame, occupied), self.jpeg_params)
+        return jpeg.tobytes() if ok else None
+
+    def _evaluate(self, frame):
+        """Slot edge ratios for a frame and whether it needs to be re-encoded."""
+        if self.motion is None:
+            _, ratios = self.detector.occupancy(frame)
+            return ratios, True
+        dirty, redraw = self.motion.check(frame)
+        ratios = self._ratios.copy() if self._ratios is not None else np.zeros(len(self.detector))
+        if len(dirty):
+            ratios[dirty] = self.detector.ratios_of(frame, dirty)
+        self._ratios = ratios
+        return ratios, redraw
+
+    def publish(self, jpeg):
+        """Make a new encoded frame visible to every viewer."""
+        with self._published:
+            self.jpeg = jpeg
+            self.sequence += 1
+            self.stats["processed"] += 1
+            self._published.notify_all()
+
+    def wait_for_frame(self, after, timeout=None):
+        """Block until a frame newer than sequence `after` is published; returns (sequence, jpeg)."""
+        with self._published:
+            self._published.wait_for(lambda: self.sequence > after or self._stopped.is_set(), timeout)
+            return self.sequence, self.jpeg
+
+    def snapshot(self):
+        """Current occupancy of every slot, or None before the first frame was processed."""
+        with self._published:
+            if self.tracker is None or self.tracker.occupied is None:
+                return None
+            return {"camera": self.camera_id, **self.tracker.snapshot()}
+
+    def _version(self):
+        return self.tracker.version if self.tracker is not None else 0
+
+    def wait_for_events(self, after, timeout=None):
+        """Wait for occupancy changes past version `after`.
+
+        Returns (events, complete); complete is False when the kept history
+        does not reach back to `after` and the caller needs a snapshot instead.
+        """
+        with self._published:
+            self._published.wait_for(lambda: self._version() > after or self._stopped.is_set(), timeout)
+            events = [event for event in self.events if event["version"] > after]
+            complete = after > 0 and (not events or events[0]["version"] == after + 1)
+            return events, complete
+
+    def occupancy_stream(self, last_version=None):
+        """Server-Sent Events: a snapshot, then one "change" event per occupancy change."""
+        version = last_version or 0
+        while not self._stopped.is_set():
+            events, complete = self.wait_for_events(version, timeout=SSE_KEEPALIVE)
+            if not complete and self._version() > version:
+                snapshot = self.snapshot()
+                version = snapshot["version"]
+                yield sse_message("snapshot", snapshot, version)
+            elif events:
+                for event in events:
+                    version = event["version"]
+                    yield sse_message("change", {"camera": self.camera_id, **event}, version)
+            else:
+                yield KEEPALIVE
+
+    def summary(self):
+        """Camera id, slot counts and pipeline counters."""
+        with self._published:
+            counts = self.tracker.counts() if self.tracker is not None else None
+            version = self._version()
+        with self._lock:
+            stats = dict(self.stats)
+        if self.motion is not None:
+            stats.update(self.motion.stats)
+        return {"camera": self.camera_id, "version": version, "occupancy": counts, "stats": stats}
+
+    def mjpeg(self):
+        """Multipart MJPEG chunks for one viewer, reusing the shared encoded frames."""
+        with self._lock:
+            self.stats["viewers"] += 1
+        try:
+            sequence = 0
+            while not self._stopped.is_set():
+                new_sequence, jpeg = self.wait_for_frame(sequence, timeout=5.0)
+                if new_sequence > sequence and jpeg is not None:
+                    sequence = new_sequence
+                    yield mjpeg_part(jpeg)
+        finally:
+            with self._lock:
+                self.stats["viewers"] -= 1
+
+
+def load_cameras(path=None):
+    """[{"id", "source", "slots_file"}] from PARKING_CAMERAS_FILE, or the single default camera."""
+    path = path or config.PARKING_CAMERAS_FILE
+    if os.path.exists(path):
+        with open(path) as f:
+            cameras = json.load(f)["cameras"]
+        return [{"id": str(c["id"]), "source": str(c["source"]),
+                 "slots_file": c.get("slots_file", config.PARKING_SLOTS_FILE)} for c in cameras]
+    return [{"id": DEFAULT_CAMERA, "source": config.PARKING_VIDEO_SOURCE,
+             "slots_file": config.PARKING_SLOTS_FILE}]
+
+
+class ParkingPipeline:
+    """All cameras of the process and the detection pool they share."""
+
+    def __init__(self, cameras, workers=None):
+        self._pool = ThreadPoolExecutor(max_workers=workers or config.PARKING_DETECTION_WORKERS,
+                                        thread_name_prefix="parking-detect")
+        self.cameras = {c["id"]: Camera(c["id"], c["source"], c["slots_file"], self._pool) for c in cameras}
+
+    def start(self):
+        for camera in self.cameras.values():
+            camera.start()
+
+    def stop(self):
+        for camera in self.cameras.values():
+            camera.stop()
+        self._pool.shutdown(wait=False)
+
+    def camera(self, camera_id=None):
+        """Camera by id (the first one when None), or None if unknown."""
+        if camera_id is None:
+            return next(iter(self.cameras.values()), None)
+        return self.cameras.get(camera_id)
+
+
+_default_pipeline = None
+_default_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    """Return the process-wide pipeline, starting its capture threads on first use."""
+    global _default_pipeline
+    with _default_pipeline_lock:
+        if _default_pipeline is None:
+            _default_pipeline = ParkingPipeline(load_cameras())
+            _default_pipeline.start()
+        return _default_pipeline
+
+
+def set_pipeline(pipeline):
+    """Replace the process-wide pipeline (the caller starts it)."""
+    global _default_pipeline
+    with _default_pipeline_lock:
+        _default_pipeline = pipeline